@@ -31,6 +31,7 @@ release = about['__version__']
 
 extensions = [
 	'myst_parser',
+	'sphinx.ext.autodoc',
 	'sphinxarg.ext'
 ]
 
@@ -9,6 +9,12 @@ def lint(session):
 	session.run('flake8', 'src/')
 
 
+@nox.session(reuse_venv=True)
+def test(session):
+	session.install('-U', '.[test]')
+	session.run('pytest')
+
+
 @nox.session(reuse_venv=True)
 def doc(session):
 	shutil.rmtree('docs/_build', ignore_errors=True)
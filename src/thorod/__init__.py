@@ -1,5 +1,13 @@
 """A set of useful torrent scripts."""
 
 from .__about__ import *
+from .api import (
+	StreamSource,
+	create_torrent,
+)
 
-__all__ = [*__about__.__all__]
+__all__ = [
+	*__about__.__all__,
+	'StreamSource',
+	'create_torrent',
+]
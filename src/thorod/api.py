@@ -0,0 +1,173 @@
+"""Create torrents from Python without any console output."""
+
+import os
+from pathlib import Path, PurePath
+
+from .__about__ import __title__, __version__
+from .constants import PIECE_SIZE_VALUES
+from .core import (
+	create_dir_info_dict,
+	create_file_info_dict,
+	create_metainfo,
+	create_stream_info_dict,
+	write_torrent_file,
+)
+from .dedupe import find_duplicates
+from .discovery import discover_files
+from .hashing import (
+	BLOCK_SIZE,
+	StreamSource,
+)
+from .utils import (
+	is_relative_file_path,
+	plan_piece_size,
+)
+
+
+def _stream_sources(data):
+	sources = []
+	for path, size, chunks in data:
+		path = PurePath(path)
+
+		if not is_relative_file_path(path):
+			raise ValueError(f"'{path}' is not a valid relative file path.")
+
+		sources.append(StreamSource(path, size, chunks))
+
+	if not sources:
+		raise ValueError("No files to create a torrent from.")
+
+	return sources
+
+
+def create_torrent(
+	data,
+	*,
+	name=None,
+	output=None,
+	trackers=None,
+	piece_size=None,
+	private=False,
+	source=None,
+	comment=None,
+	created_by=f"{__title__} {__version__}",
+	include_md5=False,
+	align=False,
+	on_progress=None,
+	io_mode='buffered',
+	device_workers=1,
+	max_read_rate=None,
+	max_cpu_workers=None,
+	low_priority=False,
+):
+	"""Create a torrent from a file or directory path, or from streamed files.
+
+	data is either a path or an iterable of (relative path, size, chunks) tuples,
+	like :class:`StreamSource`, where chunks is an iterable of bytes-like objects.
+	Streamed files are hashed in order as chunks are produced into a multi-file torrent,
+	and need a name.
+	Files at a path are hashed with the given I/O mode and throttling options,
+	as with the create command, reading at most one piece's worth of data at a time.
+
+	trackers is a list of tracker URLs, each its own tier, or lists of URLs sharing a tier.
+	piece_size is chosen automatically when not set.
+	on_progress is called with :class:`~thorod.progress.ProgressEvent` while hashing.
+
+	Nothing is written to the console.
+	Returns the torrent's metainfo, also writing it to output if given.
+	"""
+
+	if (
+		piece_size is not None
+		and piece_size not in PIECE_SIZE_VALUES
+	):
+		raise ValueError(f"{piece_size} is not a valid piece size.")
+
+	if isinstance(data, (str, os.PathLike)):
+		path = Path(data).resolve()
+
+		if not path.exists():
+			raise ValueError(f"'{path}' does not exist.")
+
+		files = list(discover_files(path))
+
+		if not files:
+			raise ValueError(f"No files found in '{path}'.")
+
+		base_path = path if path.is_dir() else None
+		piece_size = plan_piece_size(files, base_path=base_path, piece_size=piece_size).piece_size
+		options = {
+			'show_progress': False,
+			'on_progress': on_progress,
+			'io_mode': io_mode,
+			'block_size': min(BLOCK_SIZE, piece_size),
+			'max_memory': piece_size,
+			'device_workers': {None: device_workers},
+			'max_read_rate': max_read_rate,
+			'max_cpu_workers': max_cpu_workers,
+			'low_priority': low_priority,
+		}
+
+		if base_path is not None:
+			info_dict = create_dir_info_dict(
+				base_path,
+				files,
+				sum(f.size for f in files),
+				piece_size,
+				private,
+				source,
+				include_md5,
+				align=align,
+				duplicates=find_duplicates(files),
+				**options,
+			)
+		else:
+			info_dict = create_file_info_dict(
+				files,
+				files[0].size,
+				piece_size,
+				private,
+				source,
+				include_md5,
+				**options,
+			)
+
+		if name is not None:
+			info_dict['name'] = name
+	else:
+		if name is None:
+			raise ValueError("A name is required for streamed files.")
+
+		sources = _stream_sources(data)
+		piece_size = plan_piece_size(
+			[s._replace(path=PurePath(name, s.path)) for s in sources],
+			base_path=PurePath(name),
+			piece_size=piece_size,
+		).piece_size
+
+		info_dict = create_stream_info_dict(
+			name,
+			sources,
+			piece_size,
+			private,
+			source,
+			include_md5,
+			show_progress=False,
+			on_progress=on_progress,
+			align=align,
+		)
+
+	torrent_info = create_metainfo(
+		info_dict,
+		trackers=[
+			[tier] if isinstance(tier, str) else list(tier)
+			for tier in trackers or []
+		],
+		created_by=created_by,
+		comment=comment,
+	)
+
+	if output is not None:
+		write_torrent_file(Path(output), torrent_info)
+
+	return torrent_info
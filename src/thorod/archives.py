@@ -0,0 +1,121 @@
+"""Read the members of tar and zip archives as files to hash, without extracting them."""
+
+import contextlib
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+
+from .hashing import (
+	BLOCK_SIZE,
+	StreamSource,
+)
+from .utils import is_relative_file_path
+
+ARCHIVE_SUFFIXES = [
+	'.tar',
+	'.tar.bz2',
+	'.tar.gz',
+	'.tar.xz',
+	'.tbz2',
+	'.tgz',
+	'.txz',
+	'.zip',
+]
+
+
+def _read_chunks(open_member, block_size):
+	with open_member() as f:
+		while True:
+			chunk = f.read(block_size)
+
+			if not chunk:
+				return
+
+			yield chunk
+
+
+def archive_name(filepath):
+	"""Get the name of an archive without its archive suffix."""
+
+	name = filepath.name
+
+	for suffix in sorted(ARCHIVE_SUFFIXES, key=len, reverse=True):
+		if name.lower().endswith(suffix):
+			return name[:-len(suffix)]
+
+	return filepath.stem
+
+
+@contextlib.contextmanager
+def open_archive(filepath, *, block_size=BLOCK_SIZE):
+	"""Open a tar or zip archive as a torrent name and a source for each file, in archive order.
+
+	Hard links in tar archives are included as files.
+	Members are read as their sources' chunks are consumed, so they must be used in order
+	within the context.
+	If all members are in one top-level directory, it's used as the name.
+	Otherwise, the name is the archive's name without its suffix.
+
+	Listing a compressed tar archive's members decompresses it,
+	so its data is decompressed again when hashed.
+	"""
+
+	if zipfile.is_zipfile(filepath):
+		archive = zipfile.ZipFile(filepath)
+		members = [
+			(info.filename, info.file_size, lambda info=info: archive.open(info))
+			for info in archive.infolist()
+			if not info.is_dir()
+		]
+	elif tarfile.is_tarfile(filepath):
+		archive = tarfile.open(filepath)
+		members = []
+
+		for info in archive.getmembers():
+			if info.isreg():
+				size = info.size
+			elif info.islnk():
+				# Hard links are read as the member they link to.
+				try:
+					size = archive.getmember(info.linkname).size
+				except KeyError:
+					raise ValueError(
+						f"'{info.name}' in '{filepath}' links to missing '{info.linkname}'."
+					)
+			else:
+				continue
+
+			members.append((info.name, size, lambda info=info: archive.extractfile(info)))
+	else:
+		raise ValueError(f"'{filepath}' is not a tar or zip archive.")
+
+	with archive:
+		if not members:
+			raise ValueError(f"'{filepath}' has no files.")
+
+		paths = []
+		for member_name, _, _ in members:
+			path = PurePosixPath(member_name)
+
+			if not is_relative_file_path(path):
+				raise ValueError(f"'{member_name}' in '{filepath}' is not a valid relative file path.")
+
+			paths.append(path)
+
+		top_dirs = {path.parts[0] for path in paths}
+
+		if (
+			len(top_dirs) == 1
+			and all(len(path.parts) > 1 for path in paths)
+		):
+			name = top_dirs.pop()
+			paths = [path.relative_to(name) for path in paths]
+		else:
+			name = archive_name(filepath)
+
+		sources = [
+			StreamSource(path, size, _read_chunks(open_member, block_size))
+			for path, (_, size, open_member) in zip(paths, members)
+		]
+
+		yield name, sources
@@ -0,0 +1,259 @@
+"""Benchmark hashing throughput on generated datasets."""
+
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+	import resource
+except ImportError:  # Windows.
+	resource = None
+
+from .__about__ import __title__, __version__
+from .constants import (
+	KIB,
+	MIB,
+	PIECE_SIZES,
+)
+from .core import (
+	create_dir_info_dict,
+	create_file_info_dict,
+)
+from .discovery import discover_files
+from .output import (
+	generate_bench_outputs,
+	render,
+)
+from .stats import get_peak_rss
+
+DATASETS = [
+	'small',
+	'large',
+	'mixed',
+	'sparse',
+]
+
+# Files in each directory of generated datasets.
+FILES_PER_DIR = 256
+
+# Data written to sparse files every SPARSE_STRIDE bytes.
+SPARSE_EXTENT = 1 * MIB
+SPARSE_STRIDE = 16 * MIB
+
+BenchResult = namedtuple(
+	'BenchResult',
+	[
+		'dataset',
+		'io_mode',
+		'workers',
+		'piece_size',
+		'files',
+		'size',
+		'elapsed',
+		'bytes_per_second',
+		'files_per_second',
+		'peak_rss',
+		'cpu_utilization',
+	]
+)
+
+
+def _dataset_sizes(name, size):
+	rng = random.Random(name)
+
+	if name == 'large':
+		return [size // 4] * 3 + [size - size // 4 * 3]
+
+	sizes = []
+	total = 0
+	while total < size:
+		if name == 'small':
+			file_size = rng.randint(1, 16 * KIB)
+		else:
+			file_size = min(int(rng.paretovariate(0.5) * 4 * KIB), size // 4 or 1)
+
+		sizes.append(file_size)
+		total += file_size
+
+	return sizes
+
+
+def _write_data(f, size, data):
+	while size > 0:
+		size -= f.write(data[:size])
+
+
+def generate_dataset(name, path, size):
+	"""Generate a dataset of about size bytes at path unless it already exists.
+
+	small has many files up to 16 KiB, large has 4 files,
+	mixed has file sizes spanning several orders of magnitude,
+	and sparse is a single sparse file.
+	"""
+
+	if path.exists():
+		return
+
+	temp_path = path.with_name(path.name + '.tmp')
+	data = os.urandom(MIB)
+
+	if name == 'sparse':
+		with temp_path.open('wb') as f:
+			for offset in range(0, size, SPARSE_STRIDE):
+				f.seek(offset)
+				_write_data(f, min(SPARSE_EXTENT, size - offset), data)
+
+			f.truncate(size)
+	else:
+		shutil.rmtree(temp_path, ignore_errors=True)
+
+		for index, file_size in enumerate(_dataset_sizes(name, size)):
+			dirpath = temp_path / f'{index // FILES_PER_DIR:04d}'
+			dirpath.mkdir(parents=True, exist_ok=True)
+
+			with (dirpath / f'{index:08d}.bin').open('wb') as f:
+				_write_data(f, file_size, data)
+
+	os.replace(temp_path, path)
+
+
+def run_case(path, piece_size, io_mode, workers, align):
+	"""Hash a dataset, returning its file count and size, elapsed time, peak RSS, and CPU time."""
+
+	files = list(discover_files(path))
+	size = sum(f.size for f in files)
+	options = {
+		'show_progress': False,
+		'io_mode': io_mode,
+		'device_workers': {None: workers},
+	}
+
+	if resource is not None:
+		start_usage = resource.getrusage(resource.RUSAGE_SELF)
+
+	start = time.perf_counter()
+
+	if path.is_dir():
+		create_dir_info_dict(path, files, size, piece_size, False, None, False, align=align, **options)
+	else:
+		create_file_info_dict(files, size, piece_size, False, None, False, **options)
+
+	elapsed = time.perf_counter() - start
+
+	cpu_time = None
+	if resource is not None:
+		usage = resource.getrusage(resource.RUSAGE_SELF)
+		cpu_time = (
+			usage.ru_utime - start_usage.ru_utime
+			+ usage.ru_stime - start_usage.ru_stime
+		)
+
+	return len(files), size, elapsed, get_peak_rss(), cpu_time
+
+
+def bench_hashing(
+	dataset_dir,
+	*,
+	datasets=DATASETS,
+	dataset_size=256 * MIB,
+	io_modes=('buffered',),
+	workers=(1,),
+	piece_sizes=(MIB,),
+	align=False,
+):
+	"""Hash generated datasets with each combination of settings.
+
+	Each case runs in a new process so peak RSS is measured per case.
+	Generated data is usually still in the page cache,
+	so results reflect hashing more than disk throughput.
+	"""
+
+	results = []
+
+	for dataset in datasets:
+		path = dataset_dir / f'{dataset}-{dataset_size}'
+
+		if not path.exists():
+			render(f" Generating {dataset} dataset", style="yellow")
+			generate_dataset(dataset, path, dataset_size)
+
+		for io_mode, worker_count, piece_size in itertools.product(io_modes, workers, piece_sizes):
+			with ProcessPoolExecutor(max_workers=1) as executor:
+				files, size, elapsed, peak_rss, cpu_time = executor.submit(
+					run_case,
+					path,
+					piece_size,
+					io_mode,
+					worker_count,
+					align,
+				).result()
+
+			results.append(
+				BenchResult(
+					dataset,
+					io_mode,
+					worker_count,
+					piece_size,
+					files,
+					size,
+					elapsed,
+					size / elapsed,
+					files / elapsed,
+					peak_rss,
+					None if cpu_time is None else cpu_time / elapsed,
+				)
+			)
+
+	return results
+
+
+def bench(args):
+	piece_sizes = [PIECE_SIZES[piece_size] for piece_size in args.piece_sizes]
+
+	render("\n Benchmarking Hashing\n", style="bold yellow")
+
+	with contextlib.ExitStack() as stack:
+		if args.dataset_dir is None:
+			dataset_dir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix=f'{__title__}-bench-')))
+		else:
+			dataset_dir = args.dataset_dir
+			dataset_dir.mkdir(parents=True, exist_ok=True)
+
+		results = bench_hashing(
+			dataset_dir,
+			datasets=args.datasets,
+			dataset_size=args.dataset_size,
+			io_modes=args.io_modes,
+			workers=args.workers,
+			piece_sizes=piece_sizes,
+			align=args.align,
+		)
+
+	render(generate_bench_outputs(results))
+
+	if args.json is not None:
+		report = json.dumps(
+			{
+				'version': f"{__title__} {__version__}",
+				'python': platform.python_version(),
+				'platform': platform.platform(),
+				'cpus': os.cpu_count(),
+				'align': args.align,
+				'results': [result._asdict() for result in results],
+			},
+			indent=2,
+		)
+
+		if args.json == '-':
+			print(report)
+		else:
+			Path(args.json).write_text(report + '\n')
@@ -78,35 +78,125 @@ def _bdecode(data):
 		return _bdecode_dict(data)
 
 
-def _bencode(data):
+def _bencode(data, parts):
+	"""Append the bencoded chunks of data to parts.
+
+	Byte strings are appended as-is rather than copied,
+	so large values like ``pieces`` are never re-encoded.
+	"""
+
 	if isinstance(data, int):
-		return _bytes(f'i{data}e')
+		parts.append(_bytes(f'i{int(data)}e'))
 	elif isinstance(data, str):
-		length = len(_bytes(data))
-		return _bytes(f'{length}:{data}')
+		encoded = _bytes(data)
+		parts.append(_bytes(len(encoded)) + b':' + encoded)
 	elif isinstance(data, (bytes, bytearray)):
-		return _bytes(len(data)) + b':' + data
+		parts.append(_bytes(len(data)) + b':')
+		parts.append(data)
 	elif isinstance(data, list):
-		return b'l' + b''.join(_bencode(d) for d in data) + b'e'
+		parts.append(b'l')
+
+		for d in data:
+			_bencode(d, parts)
+
+		parts.append(b'e')
 	elif isinstance(data, Mapping):
-		enc_dict = bytes()
+		parts.append(b'd')
 
 		for key in sorted(data):
-			enc_dict += _bencode(key) + _bencode(data[key])
+			_bencode(key, parts)
+			_bencode(data[key], parts)
 
-		return b'd' + enc_dict + b'e'
+		parts.append(b'e')
 	else:
 		raise TypeError(
 			f"{type(data)} is not a valid type for bencoding."
 		)
 
+	return parts
+
+
+def _skip(data, pos):
+	"""Return the position after the bencoded value starting at pos."""
+
+	type_char = data[pos:pos + 1]
+
+	if type_char == b'i':
+		return data.index(b'e', pos) + 1
+	elif type_char.isdigit():
+		colon = data.index(b':', pos)
+		return colon + 1 + int(data[pos:colon])
+	elif type_char in [b'l', b'd']:
+		pos += 1
+
+		while data[pos:pos + 1] != b'e':
+			pos = _skip(data, pos)
+
+		return pos + 1
+
+	raise ValueError(f"Invalid bencoded data at position {pos}.")
+
+
+def _splice(data, view, pos, changes, parts):
+	if data[pos:pos + 1] != b'd':
+		raise ValueError(f"Expected bencoded dict at position {pos}.")
+
+	nested = {}
+	for key, value in changes.items():
+		if isinstance(key, tuple):
+			nested.setdefault(key[0], {})[key[1:] if len(key) > 2 else key[1]] = value
+
+	changes = {
+		_bytes(key): value
+		for key, value in changes.items()
+		if not isinstance(key, tuple)
+	}
+	nested = {
+		_bytes(key): value
+		for key, value in nested.items()
+	}
+
+	items = []
+	pos += 1
+	while data[pos:pos + 1] != b'e':
+		key_start = pos
+		colon = data.index(b':', pos)
+		value_start = colon + 1 + int(data[pos:colon])
+		key = data[colon + 1:value_start]
+		pos = _skip(data, value_start)
+
+		if key in changes:
+			continue
+		elif key in nested:
+			item = [view[key_start:value_start]]
+			_splice(data, view, value_start, nested.pop(key), item)
+		else:
+			item = [view[key_start:pos]]
+
+		items.append((key, item))
+
+	if nested:
+		missing = b', '.join(nested).decode('utf8', 'replace')
+		raise ValueError(f"Keys for nested changes not found: {missing}.")
+
+	for key, value in changes.items():
+		if value is not None:
+			items.append((key, _bencode(value, _bencode(key, []))))
+
+	parts.append(b'd')
+	for key, item in sorted(items, key=lambda i: i[0]):
+		parts.extend(item)
+	parts.append(b'e')
+
+	return parts
+
 
 def dump(obj, fp):
-	fp.write(_bencode(obj))
+	fp.writelines(_bencode(obj, []))
 
 
 def dumps(obj):
-	return _bencode(obj)
+	return b''.join(_bencode(obj, []))
 
 
 def load(fp):
@@ -118,3 +208,23 @@ def loads(data):
 		data = data.encode()
 
 	return _bdecode(BytesIO(data))
+
+
+def splice(data, changes, fp):
+	"""Write a bencoded dict with some of its keys changed without decoding it.
+
+	Keys in changes are replaced by their bencoded values,
+	or removed if the value is ``None``.
+	Tuple keys change keys of nested dicts, e.g. ``('info', 'salt')``.
+	All other values are copied as-is from data.
+	"""
+
+	data = bytes(data)
+
+	fp.writelines(_splice(data, memoryview(data), 0, changes, []))
+
+
+def splices(data, changes):
+	data = bytes(data)
+
+	return b''.join(_splice(data, memoryview(data), 0, changes, []))
@@ -1,5 +1,9 @@
 import argparse
+import contextlib
 import math
+import os
+import re
+import threading
 from pathlib import Path
 
 import colorama
@@ -16,32 +20,119 @@ from tbm_utils import (
 	merge_defaults,
 	parse_args
 )
+from tomlkit.toml_file import TOMLFile
 
 from . import __title__, __version__
+from .bench import DATASETS
 from .commands import (
 	do_abbrs,
+	do_bench,
 	do_create,
+	do_diff,
 	do_info,
 	do_magnet,
+	do_match,
+	do_serve,
+	do_watch,
 	do_xseed,
+	run_command,
 )
 from .config import ABBRS, read_config_file
 from .constants import (
+	B,
 	DEFAULT_ABBRS,
 	DEFAULT_TRACKERS,
+	GIB,
+	KIB,
+	MATCH_CHECK_SIZE,
+	MAX_TORRENT_SIZE,
+	MIB,
 	PIECE_SIZE_STRINGS,
+	REUSE_CHECK_SIZE,
+	TIB,
 )
+from .hashing import (
+	BLOCK_SIZE,
+	CHECKPOINT_INTERVAL,
+	IO_MODES,
+)
+from .metrics import METRICS_INTERVAL
+from .trackers import TRACKER_TIMEOUT, usable_trackers
 
 COMMAND_KEYS = {
 	'abbrs',
+	'bench',
 	'create',
+	'diff',
 	'info',
 	'magnet',
+	'match',
+	'serve',
+	'watch',
 	'xseed',
 }
 
+SIZE_UNITS = {
+	'': B,
+	'k': KIB,
+	'm': MIB,
+	'g': GIB,
+	't': TIB,
+}
+
+XSEED_PROFILE_KEYS = {
+	'comment',
+	'created_by',
+	'name',
+	'output',
+	'private',
+	'source',
+	'trackers',
+}
+
 colorama.init()
 
+# Whether parsers raise their messages in the current thread, as when parsing server jobs.
+_parser_state = threading.local()
+
+
+class ArgumentParser(argparse.ArgumentParser):
+	"""Argument parser raising ValueError with its messages instead of printing them and exiting
+	within :func:`raise_parser_errors`.
+
+	Only the parsing thread is affected, so the process's streams are left alone.
+	"""
+
+	def _print_message(self, message, file=None):
+		if getattr(_parser_state, 'raise_errors', False):
+			raise ValueError(message.strip())
+
+		super()._print_message(message, file=file)
+
+	def error(self, message):
+		if getattr(_parser_state, 'raise_errors', False):
+			raise ValueError(f"{self.format_usage()}{self.prog}: error: {message}")
+
+		super().error(message)
+
+	def exit(self, status=0, message=None):  # noqa: A003
+		if getattr(_parser_state, 'raise_errors', False):
+			raise ValueError((message or '').strip())
+
+		super().exit(status=status, message=message)
+
+
+@contextlib.contextmanager
+def raise_parser_errors():
+	"""Raise ValueError for parser errors, help, and version output in the current thread."""
+
+	_parser_state.raise_errors = True
+
+	try:
+		yield
+	finally:
+		_parser_state.raise_errors = False
+
 
 #########
 # Utils #
@@ -56,33 +147,122 @@ def is_usable_abbr(value):
 	return value
 
 
+def parse_device_workers(value):
+	"""Parse a number of readers, optionally for the device of a path, e.g. '/mnt/ssd=4'."""
+
+	path, _, count = value.rpartition('=')
+
+	try:
+		count = int(count)
+	except ValueError:
+		count = 0
+
+	if count < 1:
+		raise argparse.ArgumentTypeError(f"'{value}' is not a valid number of device workers.")
+
+	return (custom_path(path).resolve() if path else None, count)
+
+
+def parse_size(value):
+	"""Parse a size in bytes with an optional k, m, g, or t suffix, e.g. '512k'."""
+
+	match = re.match(r'^(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?$', value.strip().lower())
+
+	if match is None:
+		raise argparse.ArgumentTypeError(f"'{value}' is not a valid size.")
+
+	number, unit = match.groups()
+
+	return int(float(number) * SIZE_UNITS[unit])
+
+
 def replace_abbreviations(value):
 	announce_list = []
 
+	# Trackers found unreachable by abbrs check are left out.
+	default_trackers = usable_trackers(DEFAULT_TRACKERS)
+
 	def process_trackers(trackers):
-		random_trackers = DEFAULT_TRACKERS.copy()
+		random_trackers = default_trackers.copy()
 
 		tier_list = []
 		for item in trackers:
 			if isinstance(item, list):
 				process_trackers(item)
 			elif item == 'open':
-				for tracker in DEFAULT_TRACKERS:
+				for tracker in default_trackers:
 					announce_list.append([tracker])
 			elif item == 'random':
-
-				tier_list.append(random_trackers.pop())
+				# Fewer trackers may be left than asked for.
+				if random_trackers:
+					tier_list.append(random_trackers.pop())
 			else:
 				tier_list.append(ABBRS.get(item, item))
 
 		if tier_list:
 			announce_list.append(tier_list)
 
-	process_trackers([tier.split('^') for tier in value])
+	process_trackers(
+		[
+			list(tier) if isinstance(tier, list) else tier.split('^')
+			for tier in value
+		]
+	)
 
 	return announce_list
 
 
+def get_xseed_output(torrent, suffix):
+	if torrent.is_dir():
+		return torrent.with_name(f'{torrent.name}-{suffix}')
+
+	return torrent.with_name(
+		str(torrent.name).replace('.torrent', '') + f'-{suffix}.torrent'
+	)
+
+
+def get_xseed_targets(args):
+	if 'profile' not in args:
+		return [args]
+
+	profile = TOMLFile(args.profile).read()
+
+	targets = []
+	for i, target_options in enumerate(profile.get('targets', []), start=1):
+		target = Namespace(args)
+
+		for key, value in target_options.items():
+			key = key.replace('-', '_')
+
+			if key not in XSEED_PROFILE_KEYS:
+				raise ValueError(f"'{key}' is not a valid xseed profile key.")
+
+			if key == 'private':
+				target.private = bool(value)
+			elif key == 'trackers':
+				# Converted from TOML items, with a nested list being one tier.
+				target.trackers = replace_abbreviations(
+					[str(value)] if isinstance(value, str) else [
+						[str(tracker) for tracker in tier] if isinstance(tier, list) else str(tier)
+						for tier in value
+					]
+				)
+			elif key == 'output':
+				target.output = custom_path(str(value)).resolve()
+			else:
+				target[key] = str(value)
+
+		if 'output' not in target_options:
+			target.output = get_xseed_output(args.torrent, target.get('name', i))
+
+		targets.append(target)
+
+	if not targets:
+		raise ValueError(f"No targets found in '{args.profile}'.")
+
+	return targets
+
+
 ########
 # Meta #
 ########
@@ -159,6 +339,7 @@ torrent_options = torrent.add_argument_group("Torrent")
 torrent_options.add_argument(
 	'--piece-size',
 	metavar='SIZE',
+	choices=PIECE_SIZE_STRINGS,
 	help=(
 		"Set piece size.\n"
 		"Defaults to automatic calculation.\n"
@@ -174,6 +355,20 @@ torrent_options.add_argument(
 		"Defaults to 2000."
 	)
 )
+torrent_options.add_argument(
+	'--max-torrent-size',
+	metavar='SIZE',
+	type=parse_size,
+	help=(
+		"Set torrent file size limit for automatic piece size calculation.\n"
+		f"Defaults to {MAX_TORRENT_SIZE // MIB}m."
+	)
+)
+torrent_options.add_argument(
+	'--explain',
+	action='store_true',
+	help="Show how the piece size was chosen."
+)
 torrent_options.add_argument(
 	'--created-by',
 	metavar='CREATOR',
@@ -207,6 +402,166 @@ torrent_options.add_argument(
 	action='store_true',
 	help="Add md5 hash to info dict."
 )
+torrent_options.add_argument(
+	'--align',
+	action='store_true',
+	help=(
+		"Add BEP 47 padding files so each file starts on a piece boundary.\n"
+		"Files are then hashed independently."
+	)
+)
+
+
+###############
+# Performance #
+###############
+
+performance = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+performance_options = performance.add_argument_group("Performance")
+performance_options.add_argument(
+	'--io-mode',
+	metavar='MODE',
+	choices=IO_MODES,
+	help=(
+		"Set how files are read for hashing.\n"
+		"fadvise and direct avoid evicting other data from the page cache.\n"
+		f"({', '.join(IO_MODES)})\n"
+		"Defaults to buffered."
+	)
+)
+performance_options.add_argument(
+	'--block-size',
+	metavar='SIZE',
+	type=parse_size,
+	help=(
+		"Set size of reads when hashing, e.g. 4m.\n"
+		"Defaults to 1 MiB."
+	)
+)
+performance_options.add_argument(
+	'--max-memory',
+	metavar='SIZE',
+	type=parse_size,
+	help=(
+		"Set maximum memory used for read buffers when hashing, e.g. 64m.\n"
+		"Readers wait for a free buffer once reached,\n"
+		"and small files are only read ahead with memory left over.\n"
+		"Defaults to one buffer per reader."
+	)
+)
+performance_options.add_argument(
+	'--device-workers',
+	metavar='[PATH=]READERS',
+	action='append',
+	type=parse_device_workers,
+	help=(
+		"Set number of concurrent readers per device.\n"
+		"Readers a device's files can't be split between read its small files ahead.\n"
+		"With PATH, applies only to the device PATH is on.\n"
+		"Can be given multiple times.\n"
+		"Defaults to 1 per device."
+	)
+)
+performance_options.add_argument(
+	'--max-read-rate',
+	metavar='SIZE',
+	type=parse_size,
+	help=(
+		"Set maximum bytes read per second when hashing, e.g. 50m.\n"
+		"Defaults to no limit."
+	)
+)
+performance_options.add_argument(
+	'--max-cpu-workers',
+	metavar='WORKERS',
+	type=int,
+	help=(
+		"Set maximum number of readers hashing at once.\n"
+		"Defaults to no limit."
+	)
+)
+performance_options.add_argument(
+	'--low-priority',
+	action='store_true',
+	help=(
+		"Hash with the lowest CPU priority and idle I/O priority,\n"
+		"like running under nice and ionice."
+	)
+)
+performance_options.add_argument(
+	'--dedupe-content',
+	action='store_true',
+	help=(
+		"Also hash files with the same content once.\n"
+		"Files with the same size and sampled content are read whole to confirm it.\n"
+		"Hardlinks are always hashed once.\n"
+		"Duplicates are only skipped where their data lines up with pieces\n"
+		"the same way as the original's, which --align guarantees."
+	)
+)
+performance_options.add_argument(
+	'--resume',
+	action='store_true',
+	help=(
+		"Continue hashing from the checkpoint left by an interrupted run.\n"
+		"Checkpoints are saved next to the output as NAME.checkpoint."
+	)
+)
+performance_options.add_argument(
+	'--checkpoint-interval',
+	metavar='SECONDS',
+	type=float,
+	help=(
+		"Set seconds between saving hashing checkpoints.\n"
+		"Defaults to 60."
+	)
+)
+performance_options.add_argument(
+	'--scan-threads',
+	metavar='THREADS',
+	type=int,
+	help=(
+		"Set number of threads used to scan directories.\n"
+		"Useful for network filesystems.\n"
+		"Defaults to scanning in the main thread."
+	)
+)
+
+
+#########
+# Reuse #
+#########
+
+reuse = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+reuse_options = reuse.add_argument_group("Reuse")
+reuse_options.add_argument(
+	'--reuse-from',
+	metavar='PATH',
+	type=lambda p: custom_path(p).resolve(),
+	help=(
+		"Reuse piece hashes from a torrent or directory of torrents for the same files.\n"
+		"Files are matched by path and length.\n"
+		"With an automatic piece size, uses the piece size reusing the most data."
+	)
+)
+reuse_options.add_argument(
+	'--reuse-check',
+	metavar='PIECES',
+	type=int,
+	help=(
+		"Set number of reused pieces checked against the files.\n"
+		"Nothing is reused if any don't match.\n"
+		f"Defaults to {REUSE_CHECK_SIZE}."
+	)
+)
 
 
 ##########
@@ -261,6 +616,122 @@ torrent_input_options.add_argument(
 )
 
 
+##########
+# Server #
+##########
+
+server = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+server_options = server.add_argument_group("Server")
+server_options.add_argument(
+	'--socket',
+	metavar='PATH',
+	type=lambda p: custom_path(p).resolve(),
+	help=(
+		"Listen on a Unix socket.\n"
+		"Defaults to listening on localhost HTTP."
+	)
+)
+server_options.add_argument(
+	'--host',
+	metavar='HOST',
+	help=(
+		"Set host to listen on.\n"
+		"Requests must name it in their Host header.\n"
+		"Defaults to 127.0.0.1."
+	)
+)
+server_options.add_argument(
+	'--port',
+	metavar='PORT',
+	type=int,
+	help=(
+		"Set port to listen on.\n"
+		"Defaults to 8694."
+	)
+)
+server_options.add_argument(
+	'--max-jobs',
+	metavar='JOBS',
+	type=int,
+	help=(
+		"Set maximum number of jobs run concurrently.\n"
+		"Defaults to the number of CPUs."
+	)
+)
+server_options.add_argument(
+	'--cache-size',
+	metavar='SIZE',
+	type=int,
+	help=(
+		"Set number of decoded torrents kept in memory.\n"
+		"Defaults to 128."
+	)
+)
+
+
+###############
+# Diagnostics #
+###############
+
+diagnostics = argparse.ArgumentParser(
+	argument_default=argparse.SUPPRESS,
+	add_help=False
+)
+
+diagnostics_options = diagnostics.add_argument_group("Diagnostics")
+diagnostics_options.add_argument(
+	'--stats',
+	action='store_true',
+	help=(
+		"Output the time and bytes of each stage of the command\n"
+		"and the peak memory used when it finishes.\n"
+		"Times of stages run by several readers are summed."
+	)
+)
+diagnostics_options.add_argument(
+	'--trace',
+	metavar='FILE',
+	type=Path,
+	help=(
+		"Write the stages of the command to FILE in the Chrome trace format.\n"
+		"View it in Perfetto or chrome://tracing."
+	)
+)
+diagnostics_options.add_argument(
+	'--cprofile',
+	metavar='FILE',
+	type=Path,
+	help=(
+		"Profile the command with cProfile, writing the stats to FILE.\n"
+		"View them with python -m pstats FILE.\n"
+		"Only the main thread is profiled."
+	)
+)
+diagnostics_options.add_argument(
+	'--metrics',
+	metavar='FILE',
+	type=Path,
+	help=(
+		"Periodically write metrics to FILE for the Prometheus node exporter's\n"
+		"textfile collector, e.g. /var/lib/node_exporter/thorod.prom.\n"
+		"Includes bytes and files hashed, throughput, ETA, errors, and time per stage."
+	)
+)
+diagnostics_options.add_argument(
+	'--metrics-interval',
+	metavar='SECONDS',
+	type=float,
+	help=(
+		"Set seconds between writing metrics.\n"
+		"Defaults to 15."
+	)
+)
+
+
 ############
 # Trackers #
 ############
@@ -288,7 +759,7 @@ trackers_options.add_argument(
 ##########
 
 
-thorod = argparse.ArgumentParser(
+thorod = ArgumentParser(
 	prog='thorod',
 	description="Collection of torrent utilities.",
 	usage=argparse.SUPPRESS,
@@ -310,8 +781,8 @@ subcommands = thorod.add_subparsers(
 
 abbrs_command = subcommands.add_parser(
 	'abbrs',
-	description="List/Add/Remove tracker abbreviations.",
-	help="List/Add/Remove tracker abbreviations.",
+	description="List/Add/Remove/Check tracker abbreviations.",
+	help="List/Add/Remove/Check tracker abbreviations.",
 	usage=argparse.SUPPRESS,
 	parents=[
 		meta
@@ -380,6 +851,148 @@ abbrs_remove_command.add_argument(
 )
 
 
+abbrs_check_command = abbrs_subcommands.add_parser(
+	'check',
+	description=(
+		"Check trackers are reachable.\n"
+		"UDP trackers are sent a BEP 15 connect request, and HTTP trackers an announce.\n"
+		"Default trackers found unreachable are left out of open and random for a day."
+	),
+	help="Check trackers are reachable.",
+	usage="thorod abbrs check [OPTIONS] [ABBREVIATIONS|TRACKERS]...",
+	parents=[
+		meta
+	],
+	formatter_class=UsageHelpFormatter,
+	add_help=False
+)
+abbrs_check_command.add_argument(
+	'--timeout',
+	metavar='SECONDS',
+	type=float,
+	default=TRACKER_TIMEOUT,
+	help=(
+		"Set time to wait for each tracker to respond.\n"
+		f"Defaults to {TRACKER_TIMEOUT}."
+	)
+)
+abbrs_check_command.add_argument(
+	'trackers',
+	metavar='ABBREVIATIONS|TRACKERS',
+	nargs='*',
+	help=(
+		"Abbreviations or tracker URLs to check.\n"
+		"Defaults to all abbreviations."
+	)
+)
+
+#########
+# Bench #
+#########
+
+bench_command = subcommands.add_parser(
+	'bench',
+	description=(
+		"Benchmark hashing throughput on generated datasets.\n"
+		"Each combination of datasets, I/O modes, workers, and piece sizes is hashed\n"
+		"in a new process, reporting throughput, peak RSS, and CPU utilization."
+	),
+	help="Benchmark hashing throughput.",
+	formatter_class=UsageHelpFormatter,
+	usage="thorod bench [OPTIONS]",
+	parents=[
+		meta,
+		diagnostics
+	],
+	add_help=False
+)
+bench_command.set_defaults(func=do_bench)
+
+bench_options = bench_command.add_argument_group("Bench")
+bench_options.add_argument(
+	'--datasets',
+	metavar='DATASET',
+	nargs='+',
+	choices=DATASETS,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set datasets to generate and hash.\n"
+		f"({', '.join(DATASETS)})\n"
+		"Defaults to all."
+	)
+)
+bench_options.add_argument(
+	'--size',
+	dest='dataset_size',
+	metavar='SIZE',
+	type=parse_size,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set size of each dataset, e.g. 1g.\n"
+		"Defaults to 256m."
+	)
+)
+bench_options.add_argument(
+	'--io-modes',
+	metavar='MODE',
+	nargs='+',
+	choices=IO_MODES,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set I/O modes to hash with.\n"
+		f"({', '.join(IO_MODES)})\n"
+		"Defaults to all."
+	)
+)
+bench_options.add_argument(
+	'--workers',
+	metavar='READERS',
+	nargs='+',
+	type=int,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set numbers of readers per device to hash with.\n"
+		"Readers only run concurrently on one device with --align.\n"
+		"Defaults to 1."
+	)
+)
+bench_options.add_argument(
+	'--piece-sizes',
+	metavar='SIZE',
+	nargs='+',
+	choices=PIECE_SIZE_STRINGS[:-1],
+	default=argparse.SUPPRESS,
+	help=(
+		"Set piece sizes to hash with.\n"
+		"Defaults to 256k 1m 4m."
+	)
+)
+bench_options.add_argument(
+	'--align',
+	action='store_true',
+	default=argparse.SUPPRESS,
+	help="Hash with BEP 47 padding files, as with create --align."
+)
+bench_options.add_argument(
+	'--dir',
+	dest='dataset_dir',
+	metavar='DIR',
+	type=lambda p: custom_path(p).resolve(),
+	default=argparse.SUPPRESS,
+	help=(
+		"Set directory to generate datasets in and keep them for later runs.\n"
+		"Use a directory on the disk to benchmark.\n"
+		"Defaults to a temporary directory."
+	)
+)
+bench_options.add_argument(
+	'--json',
+	metavar='FILE',
+	default=argparse.SUPPRESS,
+	help="Also write results as JSON to FILE, or - for stdout."
+)
+
+
 ##########
 # Create #
 ##########
@@ -397,14 +1010,66 @@ create_command = subcommands.add_parser(
 		local,
 		filter_dates,
 		torrent,
+		performance,
+		reuse,
 		output,
 		input_,
+		diagnostics,
 		trackers
 	],
 	add_help=False
 )
 create_command.set_defaults(func=do_create)
 
+archive_options = create_command.add_argument_group("Archive")
+archive_options.add_argument(
+	'--archive',
+	action='store_true',
+	default=argparse.SUPPRESS,
+	help=(
+		"Create the torrent from the files in a tar or zip archive without extracting it.\n"
+		"Members are hashed in archive order as they're read.\n"
+		"Filtering, reuse, and resume options don't apply."
+	)
+)
+
+
+########
+# Diff #
+########
+
+diff_command = subcommands.add_parser(
+	'diff',
+	description=(
+		"Compare the files and pieces of two torrents without their data.\n"
+		"Reports how much of the new torrent's data can be reused from the old torrent's."
+	),
+	help="Compare the files and pieces of two torrents.",
+	formatter_class=UsageHelpFormatter,
+	usage="thorod diff [OPTIONS] OLD NEW",
+	parents=[
+		meta,
+		show_files,
+		diagnostics
+	],
+	add_help=False
+)
+diff_command.set_defaults(func=do_diff)
+
+diff_input_options = diff_command.add_argument_group("Input")
+diff_input_options.add_argument(
+	'old',
+	metavar='OLD',
+	type=lambda p: custom_path(p).resolve(),
+	help="Old torrent file."
+)
+diff_input_options.add_argument(
+	'new',
+	metavar='NEW',
+	type=lambda p: custom_path(p).resolve(),
+	help="New torrent file."
+)
+
 
 ########
 # Info #
@@ -419,6 +1084,7 @@ info_command = subcommands.add_parser(
 	parents=[
 		meta,
 		show_files,
+		diagnostics,
 		torrent_input
 	],
 	add_help=False
@@ -438,6 +1104,7 @@ magnet_command = subcommands.add_parser(
 	usage="thorod magnet [OPTIONS] [TORRENT]",
 	parents=[
 		meta,
+		diagnostics,
 		torrent_input
 	],
 	add_help=False
@@ -445,20 +1112,218 @@ magnet_command = subcommands.add_parser(
 magnet_command.set_defaults(func=do_magnet)
 
 
+#########
+# Match #
+#########
+
+match_command = subcommands.add_parser(
+	'match',
+	description=(
+		"Find torrents matching data on disk for cross-seeding.\n"
+		"Candidates are found by the sizes and relative paths of their files,\n"
+		"then confirmed by hashing a few pieces from the middle of their largest files."
+	),
+	help="Find torrents matching data on disk.",
+	formatter_class=UsageHelpFormatter,
+	usage="thorod match [OPTIONS] --data DIR --torrents DIR",
+	parents=[
+		meta,
+		diagnostics
+	],
+	add_help=False
+)
+match_command.set_defaults(func=do_match)
+
+match_options = match_command.add_argument_group("Match")
+match_options.add_argument(
+	'--data',
+	metavar='DIR',
+	action='append',
+	required=True,
+	type=lambda p: custom_path(p).resolve(),
+	default=argparse.SUPPRESS,
+	help=(
+		"Set directory of data to match torrents to.\n"
+		"Can be given multiple times."
+	)
+)
+match_options.add_argument(
+	'--torrents',
+	metavar='DIR',
+	required=True,
+	type=lambda p: custom_path(p).resolve(),
+	default=argparse.SUPPRESS,
+	help="Set directory of torrents to match."
+)
+match_options.add_argument(
+	'--check',
+	dest='match_check',
+	metavar='PIECES',
+	type=int,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set number of pieces hashed to confirm a match.\n"
+		f"Defaults to {MATCH_CHECK_SIZE}."
+	)
+)
+match_options.add_argument(
+	'--max-jobs',
+	metavar='JOBS',
+	type=int,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set maximum number of torrents checked concurrently.\n"
+		"Defaults to the number of CPUs."
+	)
+)
+match_options.add_argument(
+	'--scan-threads',
+	metavar='THREADS',
+	type=int,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set number of threads used to scan data directories.\n"
+		"Defaults to scanning in the main thread."
+	)
+)
+
+
+#########
+# Serve #
+#########
+
+serve_command = subcommands.add_parser(
+	'serve',
+	description=(
+		"Run a server accepting create, info, magnet, and xseed jobs.\n\n"
+		"Jobs are submitted as JSON over HTTP:\n"
+		"  POST /jobs {\"argv\": [\"create\", \"/path\"], \"wait\": false}\n"
+		"  GET /jobs\n"
+		"  GET /jobs/ID\n"
+		"  DELETE /jobs/ID"
+	),
+	help="Run a server accepting create, info, magnet, and xseed jobs.",
+	formatter_class=UsageHelpFormatter,
+	usage="thorod serve [OPTIONS]",
+	parents=[
+		meta,
+		server,
+		diagnostics
+	],
+	add_help=False
+)
+serve_command.set_defaults(func=do_serve)
+
+
+#########
+# Watch #
+#########
+
+watch_command = subcommands.add_parser(
+	'watch',
+	description=(
+		"Create torrents for directories added to a directory.\n"
+		"Each subdirectory is queued for creation once it has stopped changing.\n"
+		"Takes the same options as create."
+	),
+	help="Create torrents for directories added to a directory.",
+	formatter_class=UsageHelpFormatter,
+	usage="thorod watch [OPTIONS] [PATH] [TRACKERS]...",
+	parents=[
+		meta,
+		local,
+		filter_dates,
+		torrent,
+		performance,
+		reuse,
+		input_,
+		diagnostics,
+		trackers
+	],
+	add_help=False
+)
+watch_command.set_defaults(func=do_watch)
+
+watch_options = watch_command.add_argument_group("Watch")
+watch_options.add_argument(
+	'--settle',
+	metavar='SECONDS',
+	type=float,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set time a subdirectory must stop changing before creation.\n"
+		"Defaults to 60."
+	)
+)
+watch_options.add_argument(
+	'--interval',
+	metavar='SECONDS',
+	type=float,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set time between checks for changes.\n"
+		"Defaults to 5."
+	)
+)
+watch_options.add_argument(
+	'--polling',
+	action='store_true',
+	default=argparse.SUPPRESS,
+	help=(
+		"Poll for changes instead of using inotify.\n"
+		"Polling is used automatically where inotify is unavailable."
+	)
+)
+watch_options.add_argument(
+	'--max-jobs',
+	metavar='JOBS',
+	type=int,
+	default=argparse.SUPPRESS,
+	help=(
+		"Set maximum number of torrents created concurrently.\n"
+		"Defaults to 1."
+	)
+)
+watch_options.add_argument(
+	'--output-dir',
+	metavar='DIR',
+	type=lambda p: custom_path(p).resolve(),
+	default=argparse.SUPPRESS,
+	help=(
+		"Set directory to write torrent files to.\n"
+		"Defaults to NAME-torrents next to the watched directory NAME."
+	)
+)
+watch_options.add_argument(
+	'--state',
+	metavar='FILE',
+	type=lambda p: custom_path(p).resolve(),
+	default=argparse.SUPPRESS,
+	help=(
+		"Set file used to persist the queue across restarts.\n"
+		"Defaults to .thorod-watch.json in the output directory."
+	)
+)
+
+
 #########
 # xseed #
 #########
 
 xseed_command = subcommands.add_parser(
 	'xseed',
-	description="Copy a torrent for cross-seeding.",
+	description=(
+		"Copy a torrent for cross-seeding.\n"
+		"Given a directory, copies each torrent in it to an output directory."
+	),
 	help="Copy a torrent for cross-seeding.",
 	formatter_class=UsageHelpFormatter,
-	usage="thorod xseed [OPTIONS] [TORRENT]",
+	usage="thorod xseed [OPTIONS] [TORRENT|DIRECTORY] [TRACKERS]...",
 	parents=[
 		meta,
 		torrent,
 		output,
+		diagnostics,
 		torrent_input,
 		trackers
 	],
@@ -466,6 +1331,29 @@ xseed_command = subcommands.add_parser(
 )
 xseed_command.set_defaults(func=do_xseed)
 
+xseed_options = xseed_command.add_argument_group("Xseed")
+xseed_options.add_argument(
+	'--splice',
+	action='store_true',
+	default=argparse.SUPPRESS,
+	help=(
+		"Rewrite changed keys in place without decoding the torrent.\n"
+		"All other data is copied as-is."
+	)
+)
+xseed_options.add_argument(
+	'--profile',
+	metavar='FILE',
+	default=argparse.SUPPRESS,
+	type=lambda p: custom_path(p).resolve(),
+	help=(
+		"Create a torrent for each target in a TOML profile.\n"
+		"Targets are [[targets]] tables with any of the keys:\n"
+		f"{', '.join(sorted(XSEED_PROFILE_KEYS))}\n"
+		"Command line options are used for keys not set by a target."
+	)
+)
+
 
 def check_args(args):
 	if all(
@@ -498,13 +1386,34 @@ def check_args(args):
 	):
 		raise ValueError(f"'{args.input}' does not exist.")
 
+	for option in ['old', 'new']:
+		if (
+			option in args
+			and not args[option].exists()
+		):
+			raise ValueError(f"'{args[option]}' does not exist.")
+
+	for dirpath in args.get('data', []) + [args.get('torrents')]:
+		if (
+			dirpath is not None
+			and not dirpath.is_dir()
+		):
+			raise ValueError(f"'{dirpath}' is not a directory.")
+
+	if 'profile' in args:
+		if 'output' in args:
+			raise ValueError("Use one of --output/--profile, not both.")
+
+		if not args.profile.exists():
+			raise ValueError(f"'{args.profile}' does not exist.")
+
 	if 'trackers' not in args:
 		args.trackers = []
 	else:
 		args.trackers = replace_abbreviations(args.trackers)
 
 
-def default_args(args):
+def default_args(args, conf=None):
 	defaults = Namespace()
 
 	if 'hide_progress' in args:
@@ -536,21 +1445,67 @@ def default_args(args):
 
 	defaults.piece_size = 'auto'
 	defaults.piece_threshold = 2000
+	defaults.max_torrent_size = MAX_TORRENT_SIZE
+	defaults.explain = False
 	defaults.created_by = f"{__title__} {__version__}"
 	defaults.comment = None
 	defaults.source = None
 	defaults.md5 = False
+	defaults.align = False
+	defaults.archive = False
+	defaults.reuse_from = None
+	defaults.reuse_check = REUSE_CHECK_SIZE
+	defaults.match_check = MATCH_CHECK_SIZE
+	defaults.splice = False
+	defaults.scan_threads = None
+	defaults.io_mode = 'buffered'
+	defaults.block_size = BLOCK_SIZE
+	defaults.max_memory = None
+	defaults.device_workers = []
+	defaults.max_read_rate = None
+	defaults.max_cpu_workers = None
+	defaults.low_priority = False
+	defaults.dedupe_content = False
+	defaults.resume = False
+	defaults.checkpoint_interval = CHECKPOINT_INTERVAL
+
+	defaults.datasets = DATASETS
+	defaults.dataset_size = 256 * MIB
+	defaults.io_modes = IO_MODES
+	defaults.workers = [1]
+	defaults.piece_sizes = ['256k', '1m', '4m']
+	defaults.dataset_dir = None
+	defaults.json = None
+
+	defaults.stats = False
+	defaults.trace = None
+	defaults.cprofile = None
+	defaults.metrics = None
+	defaults.metrics_interval = METRICS_INTERVAL
+
+	defaults.settle = 60
+	defaults.interval = 5
+	defaults.polling = False
+	defaults.output_dir = None
+	defaults.state = None
+
+	defaults.socket = None
+	defaults.host = '127.0.0.1'
+	defaults.port = 8694
+	defaults.max_jobs = 1 if args._command == 'watch' else os.cpu_count()
+	defaults.cache_size = 128
 
 	if 'input' in args:
 		defaults.output = Path(args.input.name + '.torrent').resolve()
 	elif 'torrent' in args:
-		defaults.output = args.torrent.with_name(
-			str(args.torrent.name).replace('.torrent', '') + '-xseed.torrent'
-		)
+		defaults.output = get_xseed_output(args.torrent, 'xseed')
+
+	if conf is None:
+		conf = read_config_file()
 
 	config_defaults = get_defaults(
 		args._command,
-		read_config_file(),
+		conf,
 		command_keys=COMMAND_KEYS
 	)
 
@@ -590,6 +1545,20 @@ def default_args(args):
 	return defaults
 
 
+def process_args(parsed, conf=None):
+	check_args(parsed)
+	defaults = default_args(parsed, conf=conf)
+	args = merge_defaults(defaults, parsed)
+
+	if args.get('no_recursion'):
+		args.max_depth = 0
+
+	if args._command == 'xseed':
+		args.targets = get_xseed_targets(args)
+
+	return args
+
+
 def run():
 	try:
 		parsed = parse_args(thorod)
@@ -599,13 +1568,7 @@ def run():
 		elif parsed._command == 'abbrs':
 			parsed.func(parsed)
 		else:
-			check_args(parsed)
-			defaults = default_args(parsed)
-			args = merge_defaults(defaults, parsed)
-
-			if args.get('no_recursion'):
-				args.max_depth = 0
-
-			args.func(args)
+			args = process_args(parsed)
+			run_command(args)
 	except KeyboardInterrupt:
 		thorod.exit(130, "\nInterrupted by user")
@@ -1,37 +1,67 @@
-import sys
-
-import pendulum
-from sortedcontainers import SortedDict
-from tbm_utils import (
-	filter_filepaths_by_dates,
-	get_filepaths,
-)
+import contextlib
+import cProfile
 
+from .bench import bench
 from .config import (
+	ABBRS,
 	read_config_file,
 	write_config_file,
 )
 from .core import (
-	create_dir_info_dict,
-	create_file_info_dict,
+	create_torrent_info,
 	read_torrent_file,
 	write_torrent_file,
+	xseed_torrents,
+)
+from .diff import diff_torrents
+from .discovery import discover_files
+from .match import (
+	LocalFiles,
+	match_torrents,
 )
+from .metrics import MetricsWriter
 from .output import (
 	generate_abbreviations_outputs,
+	generate_diff_outputs,
 	generate_magnet_link,
 	generate_magnet_outputs,
+	generate_match_outputs,
+	generate_skipped_outputs,
+	generate_stats_outputs,
 	generate_summary_outputs,
+	generate_tracker_check_outputs,
 	render,
 )
-from .utils import (
-	calculate_data_size,
-	calculate_piece_size,
-	generate_unique_string,
+from .server import serve
+from .stats import (
+	add_error,
+	collect_stats,
+	stage,
 )
+from .trackers import (
+	check_trackers,
+	write_tracker_cache,
+)
+from .watch import watch
 
 
 def do_abbrs(args):
+	if args._subcommand == 'check':
+		trackers = [
+			ABBRS.get(tracker, tracker)
+			for tracker in args.trackers
+		]
+		checks = check_trackers(
+			trackers or sorted(set(ABBRS.values())),
+			timeout=args.timeout,
+		)
+		write_tracker_cache(checks)
+
+		outputs = generate_tracker_check_outputs(checks)
+		render(outputs)
+
+		return
+
 	conf = read_config_file()
 
 	if args._subcommand == 'add':
@@ -48,101 +78,27 @@ def do_abbrs(args):
 	render(outputs)
 
 
-def do_create(args):
-	torrent_info = SortedDict()
-
-	filepaths = get_filepaths(
-		args.input,
-		max_depth=args.max_depth,
-		exclude_paths=args.exclude_paths,
-		exclude_regexes=args.exclude_regexes,
-		exclude_globs=args.exclude_globs
-	)
-
-	creation_dates = [
-		args[option]
-		for option in [
-			'created_in',
-			'created_on',
-			'created_before',
-			'created_after',
-		]
-		if option in args
-	]
-
-	modification_dates = [
-		args[option]
-		for option in [
-			'modified_in',
-			'modified_on',
-			'modified_before',
-			'modified_after',
-		]
-		if option in args
-	]
-
-	filepaths = filter_filepaths_by_dates(
-		filepaths,
-		creation_dates=creation_dates,
-		modification_dates=modification_dates,
-	)
+def do_bench(args):
+	bench(args)
 
-	filepaths = list(filepaths)
-
-	if not filepaths:
-		sys.exit("\nNo files matching criteria found.")
-
-	data_size = calculate_data_size(filepaths)
-	piece_size = calculate_piece_size(data_size, threshold=args.piece_threshold)
-
-	if not args.trackers:
-		private = False
-	else:
-		private = args.private
-
-	if args.input.is_dir():
-		info_dict = create_dir_info_dict(
-			args.input,
-			filepaths,
-			data_size,
-			piece_size,
-			private,
-			args.source,
-			args.md5,
-			show_progress=args.show_progress,
-		)
-	elif args.input.is_file():
-		info_dict = create_file_info_dict(
-			filepaths,
-			data_size,
-			piece_size,
-			private,
-			args.source,
-			args.md5,
-			show_progress=args.show_progress,
-		)
-
-	torrent_info['info'] = info_dict
-
-	if args.trackers:
-		torrent_info['announce'] = args.trackers[0][0]
 
-		if len(args.trackers) > 1 or len(args.trackers[0]) > 1:
-			torrent_info['announce-list'] = args.trackers
+def do_create(args):
+	torrent_info = create_torrent_info(args)
 
-	if args.created_by is not None:
-		torrent_info['created by'] = args.created_by
+	write_torrent_file(args.output, torrent_info)
 
-	if args.comment is not None:
-		torrent_info['comment'] = args.comment
+	outputs = generate_summary_outputs(torrent_info, show_files=args.show_files)
+	render(outputs)
 
-	torrent_info['creation date'] = pendulum.now('utc').int_timestamp
 
-	torrent_info['encoding'] = 'UTF-8'
+def do_diff(args):
+	old_info = read_torrent_file(args.old)
+	new_info = read_torrent_file(args.new)
 
-	write_torrent_file(args.output, torrent_info)
+	with stage('diff'):
+		diff = diff_torrents(old_info['info'], new_info['info'])
 
-	outputs = generate_summary_outputs(torrent_info, show_files=args.show_files)
+	outputs = generate_diff_outputs(diff, show_files=args.show_files)
 	render(outputs)
 
 
@@ -161,51 +117,91 @@ def do_magnet(args):
 	render(outputs)
 
 
-def do_xseed(args):
-	torrent_info = read_torrent_file(args.torrent)
-
-	if (
-		not isinstance(torrent_info, dict)
-		or 'info' not in torrent_info
-	):
-		raise ValueError(
-			f"{args.torrent} is not a valid torrent file."
+def do_match(args):
+	with stage('scan'):
+		local_files = LocalFiles(
+			f
+			for data_dir in args.data
+			for f in discover_files(data_dir, threads=args.scan_threads)
 		)
 
-	for k in ['announce-list', 'comment']:
-		torrent_info.pop(k, None)
+	results = match_torrents(
+		sorted(args.torrents.glob('*.torrent')),
+		local_files,
+		check_size=args.match_check,
+		max_jobs=args.max_jobs,
+	)
 
-	torrent_info['info']['salt'] = generate_unique_string()
+	outputs = generate_match_outputs(results)
+	render(outputs)
 
-	if not args.trackers:
-		torrent_info['info']['private'] = 0
-	elif args.private is not None:
-		torrent_info['info']['private'] = 1 if args.private else 0
 
-	torrent_info['info'].pop('source', None)
-	if args.source is not None:
-		torrent_info['info']['source'] = args.source
+def do_serve(args):
+	serve(args)
 
-	if args.trackers:
-		torrent_info['announce'] = args.trackers[0][0]
 
-		if len(args.trackers) > 1 or len(args.trackers[0]) > 1:
-			torrent_info['announce-list'] = args.trackers
-	else:
-		torrent_info.pop('announce', None)
-		torrent_info.pop('announce-list', None)
+def do_watch(args):
+	watch(args)
 
-	if args.created_by is not None:
-		torrent_info['created by'] = args.created_by
 
-	if args.comment is not None:
-		torrent_info['comment'] = args.comment
+def do_xseed(args):
+	count = 0
+	skipped = []
+	for _, output, xseed_info in xseed_torrents(args, skipped=skipped):
+		count += 1
 
-	torrent_info['creation date'] = pendulum.now('utc').int_timestamp
+		if not args.torrent.is_dir():
+			if xseed_info is None:
+				xseed_info = read_torrent_file(output)
 
-	torrent_info['encoding'] = 'UTF-8'
+			outputs = generate_summary_outputs(xseed_info)
+			render(outputs)
 
-	write_torrent_file(args.output, torrent_info)
+	if args.torrent.is_dir():
+		if skipped:
+			render(generate_skipped_outputs(skipped))
 
-	outputs = generate_summary_outputs(torrent_info)
-	render(outputs)
+		render(f"\n Wrote {count} torrents.\n", style="bold yellow")
+
+
+def run_command(args):
+	"""Run a command, timing its stages for --stats, --trace, and --metrics and profiling it for --cprofile."""
+
+	stats = None
+
+	try:
+		with contextlib.ExitStack() as stack:
+			if args.cprofile is not None:
+				profiler = cProfile.Profile()
+				profiler.enable()
+				stack.callback(profiler.dump_stats, args.cprofile)
+				stack.callback(profiler.disable)
+
+			if (
+				args.stats
+				or args.trace is not None
+				or args.metrics is not None
+			):
+				stats = stack.enter_context(collect_stats(trace=args.trace is not None))
+
+			if args.metrics is not None:
+				labels = {'command': args._command}
+				if 'input' in args:
+					labels['input'] = args.input
+
+				stack.enter_context(
+					MetricsWriter(args.metrics, stats, labels=labels, interval=args.metrics_interval)
+				)
+
+			try:
+				args.func(args)
+			except (Exception, SystemExit):
+				add_error()
+				raise
+	finally:
+		if stats is not None:
+			if args.trace is not None:
+				stats.write_trace(args.trace)
+
+			if args.stats:
+				render(generate_stats_outputs(stats))
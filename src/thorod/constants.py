@@ -55,6 +55,8 @@ PIECE_SIZE_VALUES = [
 	8 * MIB,
 	16 * MIB,
 	32 * MIB,
+	64 * MIB,
+	128 * MIB,
 ]
 
 PIECE_SIZE_STRINGS = [
@@ -70,7 +72,22 @@ PIECE_SIZE_STRINGS = [
 	'8m',
 	'16m',
 	'32m',
+	'64m',
+	'128m',
 	'auto',
 ]
 
 PIECE_SIZES = dict(zip(PIECE_SIZE_STRINGS, PIECE_SIZE_VALUES))
+
+# Rough costs used to plan piece sizes.
+HASHING_RATE = 1 * GIB  # Bytes per second.
+COPYING_RATE = 4 * GIB  # Bytes per second.
+PIECE_OVERHEAD = 0.000005  # Seconds per piece.
+
+MAX_TORRENT_SIZE = 10 * MIB
+
+# Number of reused pieces checked against the files.
+REUSE_CHECK_SIZE = 16
+
+# Number of pieces hashed to confirm a torrent matches local data.
+MATCH_CHECK_SIZE = 4
@@ -1,21 +1,74 @@
-from hashlib import md5, sha1
+import contextlib
+import sys
+from pathlib import PurePath
 
+import pendulum
 from sortedcontainers import SortedDict
 
 from . import bencode
+from .archives import open_archive
+from .constants import (
+	PIECE_SIZES,
+	REUSE_CHECK_SIZE,
+)
+from .dedupe import find_duplicates
+from .discovery import (
+	discover_files,
+	filter_files_by_dates,
+)
+from .hashing import (
+	BLOCK_SIZE,
+	CHECKPOINT_INTERVAL,
+	hash_pieces,
+	hash_streams,
+	piece_padding,
+)
 from .output import (
 	PROGRESS,
+	ProgressBar,
+	generate_piece_size_outputs,
 	render,
 )
+from .reuse import (
+	check_pieces,
+	file_layout,
+	find_reusable_pieces,
+)
+from .stats import (
+	add_error,
+	stage,
+)
 from .utils import (
 	generate_unique_string,
 	get_file_path,
+	plan_piece_size,
 )
 
 
+class JobCancelled(Exception):
+	"""Raised by a progress listener to stop hashing."""
+
+
+def create_file_infos(paths, lengths, md5sums, padding, include_md5):
+	"""Create the file list of a multi-file torrent, with BEP 47 padding files."""
+
+	# Plain dicts, as bencoding sorts keys, are much cheaper than SortedDicts for many files.
+	file_infos = []
+	for path, length, md5sum, pad in zip(paths, lengths, md5sums, padding):
+		if include_md5:
+			file_infos.append({'length': length, 'md5sum': md5sum, 'path': path})
+		else:
+			file_infos.append({'length': length, 'path': path})
+
+		if pad:
+			file_infos.append({'attr': 'p', 'length': pad, 'path': ['.pad', str(pad)]})
+
+	return file_infos
+
+
 def create_dir_info_dict(
 	base_path,
-	filepaths,
+	files,
 	data_size,
 	piece_size,
 	private,
@@ -23,64 +76,60 @@ def create_dir_info_dict(
 	include_md5,
 	*,
 	show_progress=True,
+	on_progress=None,
+	io_mode='buffered',
+	block_size=BLOCK_SIZE,
+	max_memory=None,
+	device_workers=None,
+	max_read_rate=None,
+	max_cpu_workers=None,
+	low_priority=False,
+	align=False,
+	known_pieces=None,
+	duplicates=None,
+	checkpoint=None,
+	checkpoint_interval=CHECKPOINT_INTERVAL,
+	resume=False,
 ):
-	def hash_files(progress=None, task=None):
-		data = bytes()
-		file_infos = []
-		pieces = bytearray()
-
-		for filepath in filepaths:
-			file_dict = SortedDict()
-			length = 0
-
-			md5sum = md5() if include_md5 else None
-
-			with open(filepath, 'rb') as f:
-				while True:
-					piece = f.read(piece_size)
-
-					if not piece:
-						break
-
-					length += len(piece)
-
-					data += piece
-
-					if len(data) >= piece_size:
-						pieces += sha1(data[:piece_size]).digest()
-						data = data[piece_size:]
-
-					if include_md5:
-						md5sum.update(piece)
-
-					if progress:
-						progress.update(
-							task,
-							advance=len(piece),
-						)
-
-			file_dict['length'] = length
-			file_dict['path'] = get_file_path(filepath, base_path)
-
-			if include_md5:
-				file_dict['md5sum'] = md5sum.hexdigest()
-
-			file_infos.append(file_dict)
+	def hash_files(on_progress=None):
+		with stage('hash', data_size):
+			pieces, lengths, md5sums = hash_pieces(
+				files,
+				piece_size,
+				include_md5=include_md5,
+				io_mode=io_mode,
+				block_size=block_size,
+				max_memory=max_memory,
+				device_workers=device_workers,
+				max_read_rate=max_read_rate,
+				max_cpu_workers=max_cpu_workers,
+				low_priority=low_priority,
+				align=align,
+				known_pieces=known_pieces,
+				duplicates=duplicates,
+				checkpoint=checkpoint,
+				checkpoint_interval=checkpoint_interval,
+				resume=resume,
+				on_progress=on_progress,
+			)
 
-		if len(data) > 0:
-			pieces += sha1(data).digest()
+		file_infos = create_file_infos(
+			[get_file_path(f.path, base_path) for f in files],
+			lengths,
+			md5sums,
+			piece_padding(files, piece_size) if align else [0] * len(files),
+			include_md5,
+		)
 
 		return file_infos, pieces
 
-	if show_progress:
+	if on_progress is not None:
+		file_infos, pieces = hash_files(on_progress)
+	elif show_progress:
 		render("\n Hashing Files\n\n", style="bold yellow")
 
 		with PROGRESS:
-			task = PROGRESS.add_task(
-				"Hashing",
-				total=data_size,
-			)
-			file_infos, pieces = hash_files(PROGRESS, task)
+			file_infos, pieces = hash_files(ProgressBar())
 	else:
 		file_infos, pieces = hash_files()
 
@@ -100,56 +149,63 @@ def create_dir_info_dict(
 
 
 def create_file_info_dict(
-	filepaths,
+	files,
 	data_size,
 	piece_size,
 	private,
 	source,
 	include_md5,
 	show_progress=True,
+	on_progress=None,
+	io_mode='buffered',
+	block_size=BLOCK_SIZE,
+	max_memory=None,
+	device_workers=None,
+	max_read_rate=None,
+	max_cpu_workers=None,
+	low_priority=False,
+	known_pieces=None,
+	checkpoint=None,
+	checkpoint_interval=CHECKPOINT_INTERVAL,
+	resume=False,
 ):
-	def hash_file(progress=None, task=None):
-		pieces = bytearray()
-		length = 0
-		md5sum = md5() if include_md5 else None
-
-		with open(filepaths[0], 'rb') as f:
-			while True:
-				piece = f.read(piece_size)
-
-				if not piece:
-					break
-
-				length += len(piece)
-
-				pieces += sha1(piece).digest()
-
-				if include_md5:
-					md5sum.update(piece)
+	def hash_file(on_progress=None):
+		with stage('hash', data_size):
+			pieces, lengths, md5sums = hash_pieces(
+				files,
+				piece_size,
+				include_md5=include_md5,
+				io_mode=io_mode,
+				block_size=block_size,
+				max_memory=max_memory,
+				device_workers=device_workers,
+				max_read_rate=max_read_rate,
+				max_cpu_workers=max_cpu_workers,
+				low_priority=low_priority,
+				known_pieces=known_pieces,
+				checkpoint=checkpoint,
+				checkpoint_interval=checkpoint_interval,
+				resume=resume,
+				on_progress=on_progress,
+			)
 
-				if progress:
-					progress.update(
-						task,
-						advance=len(piece),
-					)
+		length = lengths[0]
+		md5sum = md5sums[0]
 
 		return pieces, length, md5sum
 
-	if show_progress:
+	if on_progress is not None:
+		pieces, length, md5sum = hash_file(on_progress)
+	elif show_progress:
 		render("\n Hashing Files\n\n", style="bold yellow")
 
 		with PROGRESS:
-			task = PROGRESS.add_task(
-				"Hashing",
-				total=data_size,
-			)
-
-			pieces, length, md5sum = hash_file(PROGRESS, task)
+			pieces, length, md5sum = hash_file(ProgressBar())
 	else:
 		pieces, length, md5sum = hash_file()
 
 	info_dict = SortedDict()
-	info_dict['name'] = filepaths[0].name
+	info_dict['name'] = files[0].path.name
 	info_dict['length'] = length
 	info_dict['pieces'] = pieces
 	info_dict['piece length'] = piece_size
@@ -161,16 +217,397 @@ def create_file_info_dict(
 		info_dict['source'] = source
 
 	if include_md5:
-		info_dict['md5sum'] = md5sum.hexdigest()
+		info_dict['md5sum'] = md5sum
+
+	return info_dict
+
+
+def create_stream_info_dict(
+	name,
+	sources,
+	piece_size,
+	private,
+	source,
+	include_md5,
+	*,
+	show_progress=True,
+	on_progress=None,
+	align=False,
+):
+	"""Create a multi-file info dict from sources with path, size, and chunks attributes."""
+
+	def hash_sources(on_progress=None):
+		with stage('hash', sum(s.size for s in sources)):
+			return hash_streams(
+				sources,
+				piece_size,
+				include_md5=include_md5,
+				align=align,
+				on_progress=on_progress,
+			)
+
+	if on_progress is not None:
+		pieces, lengths, md5sums = hash_sources(on_progress)
+	elif show_progress:
+		render("\n Hashing Files\n\n", style="bold yellow")
+
+		with PROGRESS:
+			pieces, lengths, md5sums = hash_sources(ProgressBar())
+	else:
+		pieces, lengths, md5sums = hash_sources()
+
+	info_dict = SortedDict()
+	info_dict['files'] = create_file_infos(
+		[list(s.path.parts) for s in sources],
+		lengths,
+		md5sums,
+		piece_padding(sources, piece_size) if align else [0] * len(sources),
+		include_md5,
+	)
+	info_dict['name'] = name
+	info_dict['pieces'] = pieces
+	info_dict['piece length'] = piece_size
+	info_dict['salt'] = generate_unique_string()
+
+	info_dict['private'] = 1 if private else 0
+
+	if source:
+		info_dict['source'] = source
 
 	return info_dict
 
 
+def create_archive_info_dict(args, *, on_progress=None):
+	"""Create an info dict for the members of a tar or zip archive, hashed as they're read."""
+
+	if args.piece_size == 'auto':
+		piece_size = None
+	else:
+		try:
+			piece_size = PIECE_SIZES[args.piece_size]
+		except KeyError:
+			raise ValueError(f"'{args.piece_size}' is not a valid piece size.")
+
+	with open_archive(args.input, block_size=args.block_size) as (name, sources):
+		plan = plan_piece_size(
+			[s._replace(path=PurePath(name, s.path)) for s in sources],
+			base_path=PurePath(name),
+			threshold=args.piece_threshold,
+			max_torrent_size=args.max_torrent_size,
+			piece_size=piece_size,
+		)
+
+		if (
+			args.explain
+			and on_progress is None
+		):
+			render(generate_piece_size_outputs(plan))
+
+		return create_stream_info_dict(
+			name,
+			sources,
+			plan.piece_size,
+			args.private if args.trackers else False,
+			args.source,
+			args.md5,
+			show_progress=args.show_progress,
+			on_progress=on_progress,
+			align=args.align,
+		)
+
+
+def create_torrent_info(args, *, on_progress=None):
+	if args.archive:
+		return create_metainfo(
+			create_archive_info_dict(args, on_progress=on_progress),
+			trackers=args.trackers,
+			created_by=args.created_by,
+			comment=args.comment,
+		)
+
+	files = discover_files(
+		args.input,
+		max_depth=args.max_depth,
+		exclude_paths=args.exclude_paths,
+		exclude_regexes=args.exclude_regexes,
+		exclude_globs=args.exclude_globs,
+		threads=args.scan_threads,
+	)
+
+	creation_dates = [
+		args[option]
+		for option in [
+			'created_in',
+			'created_on',
+			'created_before',
+			'created_after',
+		]
+		if option in args
+	]
+
+	modification_dates = [
+		args[option]
+		for option in [
+			'modified_in',
+			'modified_on',
+			'modified_before',
+			'modified_after',
+		]
+		if option in args
+	]
+
+	files = filter_files_by_dates(
+		files,
+		creation_dates=creation_dates,
+		modification_dates=modification_dates,
+	)
+
+	with stage('scan'):
+		files = list(files)
+
+	if not files:
+		sys.exit("\nNo files matching criteria found.")
+
+	base_path = args.input if args.input.is_dir() else None
+	align = args.align and base_path is not None
+
+	reuse_torrents = []
+	if args.reuse_from is not None:
+		reuse_torrents = read_reuse_torrents(args.reuse_from)
+
+	if args.piece_size == 'auto':
+		piece_size = None
+
+		if reuse_torrents:
+			piece_size = choose_reuse_piece_size(files, base_path, align, reuse_torrents)
+	else:
+		try:
+			piece_size = PIECE_SIZES[args.piece_size]
+		except KeyError:
+			raise ValueError(f"'{args.piece_size}' is not a valid piece size.")
+
+	with stage('plan'):
+		plan = plan_piece_size(
+			files,
+			base_path=base_path,
+			threshold=args.piece_threshold,
+			max_torrent_size=args.max_torrent_size,
+			piece_size=piece_size,
+		)
+
+	if (
+		args.explain
+		and on_progress is None
+	):
+		render(generate_piece_size_outputs(plan))
+
+	data_size = plan.data_size
+	piece_size = plan.piece_size
+
+	duplicates = None
+	if base_path is not None:
+		with stage('dedupe'):
+			duplicates = find_duplicates(files, by_content=args.dedupe_content)
+
+		if (
+			duplicates
+			and on_progress is None
+		):
+			render(f"\n Found {len(duplicates)} duplicate files.", style="cyan")
+
+	device_workers = {
+		(None if path is None else path.stat().st_dev): count
+		for path, count in args.device_workers
+	}
+
+	known_pieces = None
+	if reuse_torrents:
+		with stage('reuse'):
+			known_pieces = reuse_pieces(
+				files,
+				base_path,
+				piece_size,
+				align,
+				reuse_torrents,
+				sample_size=args.reuse_check,
+				show_output=on_progress is None,
+			)
+
+	checkpoint = args.output.with_name(args.output.name + '.checkpoint')
+
+	if not args.trackers:
+		private = False
+	else:
+		private = args.private
+
+	if args.input.is_dir():
+		info_dict = create_dir_info_dict(
+			args.input,
+			files,
+			data_size,
+			piece_size,
+			private,
+			args.source,
+			args.md5,
+			show_progress=args.show_progress,
+			on_progress=on_progress,
+			io_mode=args.io_mode,
+			block_size=args.block_size,
+			max_memory=args.max_memory,
+			device_workers=device_workers,
+			max_read_rate=args.max_read_rate,
+			max_cpu_workers=args.max_cpu_workers,
+			low_priority=args.low_priority,
+			align=align,
+			known_pieces=known_pieces,
+			duplicates=duplicates,
+			checkpoint=checkpoint,
+			checkpoint_interval=args.checkpoint_interval,
+			resume=args.resume,
+		)
+	elif args.input.is_file():
+		info_dict = create_file_info_dict(
+			files,
+			data_size,
+			piece_size,
+			private,
+			args.source,
+			args.md5,
+			show_progress=args.show_progress,
+			on_progress=on_progress,
+			io_mode=args.io_mode,
+			block_size=args.block_size,
+			max_memory=args.max_memory,
+			device_workers=device_workers,
+			max_read_rate=args.max_read_rate,
+			max_cpu_workers=args.max_cpu_workers,
+			low_priority=args.low_priority,
+			known_pieces=known_pieces,
+			checkpoint=checkpoint,
+			checkpoint_interval=args.checkpoint_interval,
+			resume=args.resume,
+		)
+
+	return create_metainfo(
+		info_dict,
+		trackers=args.trackers,
+		created_by=args.created_by,
+		comment=args.comment,
+	)
+
+
+def create_metainfo(info_dict, *, trackers=None, created_by=None, comment=None):
+	"""Wrap an info dict in a torrent's metainfo.
+
+	trackers is a list of tiers, each a list of tracker URLs.
+	"""
+
+	torrent_info = SortedDict()
+	torrent_info['info'] = info_dict
+
+	if trackers:
+		torrent_info['announce'] = trackers[0][0]
+
+		if len(trackers) > 1 or len(trackers[0]) > 1:
+			torrent_info['announce-list'] = trackers
+
+	if created_by is not None:
+		torrent_info['created by'] = created_by
+
+	if comment is not None:
+		torrent_info['comment'] = comment
+
+	torrent_info['creation date'] = pendulum.now('utc').int_timestamp
+
+	torrent_info['encoding'] = 'UTF-8'
+
+	return torrent_info
+
+
+def read_reuse_torrents(path):
+	"""Read a torrent, or the torrents in a directory, to reuse piece hashes from."""
+
+	if path.is_dir():
+		filepaths = sorted(path.glob('*.torrent'))
+	else:
+		filepaths = [path]
+
+	return [
+		read_torrent_file(filepath)
+		for filepath in filepaths
+	]
+
+
+def choose_reuse_piece_size(files, base_path, align, torrent_infos):
+	"""Choose the piece size of existing torrents that reuses the most data, or None."""
+
+	best_piece_size = None
+	best_size = 0
+
+	for piece_size in sorted({info['info']['piece length'] for info in torrent_infos}):
+		layout, total_size = file_layout(files, piece_size, base_path=base_path, align=align)
+		known_pieces = find_reusable_pieces(layout, total_size, piece_size, torrent_infos)
+
+		if len(known_pieces) * piece_size > best_size:
+			best_piece_size = piece_size
+			best_size = len(known_pieces) * piece_size
+
+	return best_piece_size
+
+
+def reuse_pieces(
+	files,
+	base_path,
+	piece_size,
+	align,
+	torrent_infos,
+	*,
+	sample_size=REUSE_CHECK_SIZE,
+	show_output=True,
+):
+	"""Find piece digests to reuse from existing torrents, spot-checking a sample against the files.
+
+	Nothing is reused if any sampled piece doesn't match.
+	"""
+
+	layout, total_size = file_layout(files, piece_size, base_path=base_path, align=align)
+	known_pieces = find_reusable_pieces(layout, total_size, piece_size, torrent_infos)
+
+	if not known_pieces:
+		if show_output:
+			render("\n No pieces found to reuse.", style="yellow")
+
+		return None
+
+	mismatched = check_pieces(files, layout, total_size, piece_size, known_pieces, sample_size)
+
+	if mismatched:
+		if show_output:
+			render(
+				f"\n {len(mismatched)} of {min(sample_size, len(known_pieces))} checked pieces didn't match. "
+				"Hashing all pieces.",
+				style="bold red",
+			)
+
+		return None
+
+	if show_output:
+		num_pieces = -(-total_size // piece_size)
+		render(f"\n Reusing {len(known_pieces)} of {num_pieces} pieces.", style="cyan")
+
+	return known_pieces
+
+
 def read_torrent_file(filepath):
 	try:
-		torrent_info = bencode.load(filepath.open('rb'))
+		with stage('read torrent'):
+			data = filepath.read_bytes()
 	except FileNotFoundError:
 		raise FileNotFoundError(f"{filepath} not found.")
+
+	try:
+		with stage('decode', len(data)):
+			torrent_info = bencode.loads(data)
 	except TypeError:
 		raise TypeError(f"Could not parse {filepath}.")
 
@@ -178,4 +615,154 @@ def read_torrent_file(filepath):
 
 
 def write_torrent_file(filepath, torrent_info):
-	bencode.dump(torrent_info, filepath.open('wb'))
+	with stage('encode'):
+		data = bencode.dumps(torrent_info)
+
+	with stage('write torrent', len(data)):
+		filepath.write_bytes(data)
+
+
+def xseed_changes(args):
+	"""Get the changes made to a torrent for cross-seeding.
+
+	Tuple keys are keys of the info dict. ``None`` values remove keys.
+	"""
+
+	changes = {
+		'announce': None,
+		'announce-list': None,
+		'comment': args.comment,
+		'creation date': pendulum.now('utc').int_timestamp,
+		'encoding': 'UTF-8',
+		('info', 'salt'): generate_unique_string(),
+		('info', 'source'): args.source,
+	}
+
+	if not args.trackers:
+		changes['info', 'private'] = 0
+	elif args.private is not None:
+		changes['info', 'private'] = 1 if args.private else 0
+
+	if args.trackers:
+		changes['announce'] = args.trackers[0][0]
+
+		if len(args.trackers) > 1 or len(args.trackers[0]) > 1:
+			changes['announce-list'] = args.trackers
+
+	if args.created_by is not None:
+		changes['created by'] = args.created_by
+
+	return changes
+
+
+def xseed_torrent_info(torrent_info, args):
+	# Only the top-level and info dicts are modified,
+	# so other values like ``pieces`` are shared with the original.
+	torrent_info = torrent_info.copy()
+	torrent_info['info'] = torrent_info['info'].copy()
+
+	for key, value in xseed_changes(args).items():
+		if isinstance(key, tuple):
+			d = torrent_info['info']
+			key = key[1]
+		else:
+			d = torrent_info
+
+		if value is None:
+			d.pop(key, None)
+		else:
+			d[key] = value
+
+	return torrent_info
+
+
+def write_xseed_torrents(filepath, targets, *, splice=False, output_dir=False, read=read_torrent_file):
+	"""Write the xseed torrents of a torrent for each target, removing those written if one fails.
+
+	With output_dir, each target's output is a directory to write to under the torrent's filename.
+	Returns the output path and torrent info of each, with torrent info ``None`` when splicing.
+	"""
+
+	if splice:
+		data = filepath.read_bytes()
+	else:
+		torrent_info = read(filepath)
+
+		if not (
+			isinstance(torrent_info, dict)
+			and isinstance(torrent_info.get('info'), dict)
+		):
+			raise ValueError(f"{filepath} is not a valid torrent file.")
+
+	written = []
+
+	try:
+		for target in targets:
+			output = target.output / filepath.name if output_dir else target.output
+
+			if splice:
+				try:
+					with output.open('wb') as f:
+						bencode.splice(data, xseed_changes(target), f)
+				except ValueError as e:
+					output.unlink()
+					raise ValueError(f"Could not splice {filepath}: {e}")
+
+				written.append((output, None))
+			else:
+				xseed_info = xseed_torrent_info(torrent_info, target)
+				write_torrent_file(output, xseed_info)
+
+				written.append((output, xseed_info))
+	except BaseException:
+		for output, _ in written:
+			with contextlib.suppress(FileNotFoundError):
+				output.unlink()
+
+		raise
+
+	return written
+
+
+def xseed_torrents(args, *, read=read_torrent_file, skipped=None):
+	"""Write the xseed torrents for each input torrent and target.
+
+	Yields the input path, output path, and torrent info of each written torrent.
+	Torrent info is ``None`` when splicing.
+
+	For a directory of torrents, a torrent that can't be read or cross-seeded
+	is skipped and counted as an error, with its path and the error added to skipped.
+	"""
+
+	is_dir = args.torrent.is_dir()
+
+	if is_dir:
+		filepaths = sorted(args.torrent.glob('*.torrent'))
+
+		for target in args.targets:
+			target.output.mkdir(parents=True, exist_ok=True)
+	else:
+		filepaths = [args.torrent]
+
+	for filepath in filepaths:
+		try:
+			written = write_xseed_torrents(
+				filepath,
+				args.targets,
+				splice=args.splice,
+				output_dir=is_dir,
+				read=read,
+			)
+		except (OSError, TypeError, ValueError, KeyError) as e:
+			if not is_dir:
+				raise
+
+			add_error()
+
+			if skipped is not None:
+				skipped.append((filepath, str(e)))
+
+			continue
+
+		for output, xseed_info in written:
+			yield filepath, output, xseed_info
@@ -0,0 +1,111 @@
+"""Find files with the same content so it's only hashed once."""
+
+from collections import Counter
+from hashlib import sha1
+
+# Bytes read from each sampled position when fingerprinting content.
+SAMPLE_SIZE = 64 * 1024
+
+# Number of evenly spaced positions sampled, including the start and end.
+SAMPLE_COUNT = 4
+
+# Bytes read at a time when hashing whole files.
+CONTENT_BLOCK_SIZE = 1024 * 1024
+
+
+def sample_fingerprint(filepath, size):
+	"""Hash blocks sampled from the start, end, and evenly spaced positions of a file."""
+
+	fingerprint = sha1()
+
+	with open(filepath, 'rb') as f:
+		for position in sorted({
+			max(size - SAMPLE_SIZE, 0) * i // (SAMPLE_COUNT - 1)
+			for i in range(SAMPLE_COUNT)
+		}):
+			f.seek(position)
+			fingerprint.update(f.read(SAMPLE_SIZE))
+
+	return fingerprint.digest()
+
+
+def content_digest(filepath):
+	"""Hash the whole content of a file."""
+
+	digest = sha1()
+	buffer = bytearray(CONTENT_BLOCK_SIZE)
+	view = memoryview(buffer)
+
+	with open(filepath, 'rb', buffering=0) as f:
+		while True:
+			size = f.readinto(buffer)
+
+			if not size:
+				return digest.digest()
+
+			digest.update(view[:size])
+
+
+def find_duplicates(files, *, by_content=False):
+	"""Map the indexes of files with the same content as an earlier file to that file's index.
+
+	Hardlinks are found by device and inode.
+	With by_content, files with the same size and sampled content are candidates,
+	confirmed by hashing their whole content.
+	"""
+
+	duplicates = {}
+	originals = {}
+
+	for index, f in enumerate(files):
+		# Windows doesn't report inodes for directory entries.
+		if (
+			not f.size
+			or not f.ino
+		):
+			continue
+
+		original = originals.setdefault((f.dev, f.ino), index)
+
+		if original != index:
+			duplicates[index] = original
+
+	if by_content:
+		size_counts = Counter(
+			f.size
+			for index, f in enumerate(files)
+			if index not in duplicates
+		)
+		candidates = {}
+
+		for index, f in enumerate(files):
+			if (
+				index in duplicates
+				or not f.size
+				or size_counts[f.size] < 2
+			):
+				continue
+
+			candidates.setdefault((f.size, sample_fingerprint(f.path, f.size)), []).append(index)
+
+		# Files can differ outside the samples, so only whole content decides.
+		for indexes in candidates.values():
+			if len(indexes) < 2:
+				continue
+
+			originals = {}
+
+			for index in indexes:
+				original = originals.setdefault(content_digest(files[index].path), index)
+
+				if original != index:
+					duplicates[index] = original
+
+		# Hardlinks of a content duplicate map to its original.
+		for index, original in duplicates.items():
+			while original in duplicates:
+				original = duplicates[original]
+
+			duplicates[index] = original
+
+	return duplicates
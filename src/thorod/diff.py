@@ -0,0 +1,192 @@
+"""Compare the files and pieces of two torrents without their data."""
+
+from collections import namedtuple
+
+from .reuse import (
+	piece_digests,
+	torrent_file_layout,
+)
+
+TorrentDiff = namedtuple(
+	'TorrentDiff',
+	[
+		'unchanged_files',
+		'unverified_files',
+		'changed_files',
+		'added_files',
+		'removed_files',
+		'identical_pieces',
+		'total_pieces',
+		'reusable_bytes',
+		'unverified_bytes',
+		'total_bytes',
+	]
+)
+TorrentDiff.__doc__ = """Differences from an old torrent to a new one.
+
+File lists hold paths as tuples of parts, relative to the torrent's name.
+Unverified files have the same path and length, but not all of their pieces could be compared.
+Reusable bytes are the bytes of unchanged files, whose pieces were all compared equal.
+Unverified bytes are the bytes of unverified files, which may or may not have changed.
+"""
+
+
+def _path_key(path):
+	"""Sort key for a path, as parts that aren't valid UTF-8 are decoded as bytes."""
+
+	return tuple(
+		part.encode('utf8') if isinstance(part, str) else part
+		for part in path
+	)
+
+
+def _diff_layout(info_dict):
+	layout = torrent_file_layout(info_dict)
+
+	# Single file torrents are compared by name.
+	if 'files' not in info_dict:
+		_, length, offset = layout[0]
+		layout = [((info_dict['name'],), length, offset)]
+
+	# Files are in data order, so the last one ends the data.
+	_, length, offset = layout[-1] if layout else (None, 0, 0)
+
+	return sorted(layout, key=lambda f: _path_key(f[0])), offset + length
+
+
+def _compare_pieces(old, new, old_offset, new_offset, length):
+	"""Compare the pieces overlapping a file at the same position within pieces in both torrents.
+
+	The file is unchanged if all of them are equal, and changed if a piece entirely within it differs.
+	Pieces shared with other files differing, or without a counterpart, leave it unverified.
+	"""
+
+	piece_size = new.piece_size
+	status = 'unchanged'
+
+	for new_index in range(new_offset // piece_size, -(-(new_offset + length) // piece_size)):
+		start = new_index * piece_size - new_offset
+		end = min(start + new_offset + piece_size, new.data_size) - new_offset
+		old_index = (old_offset + start) // piece_size
+
+		if (
+			old_offset + start < 0
+			or min(old_index * piece_size + piece_size, old.data_size) - old_offset != end
+		):
+			# The last piece of either torrent may be shorter.
+			status = 'unverified'
+		elif old.digests[old_index] != new.digests[new_index]:
+			if (
+				start >= 0
+				and end <= length
+			):
+				return 'changed'
+
+			status = 'unverified'
+
+	return status
+
+
+class _Pieces:
+	def __init__(self, info_dict, data_size):
+		pieces = piece_digests(info_dict)
+
+		self.digests = [
+			pieces[start:start + 20]
+			for start in range(0, len(pieces), 20)
+		]
+		self.piece_size = info_dict['piece length']
+		self.piece_count = len(self.digests)
+		self.data_size = data_size
+
+
+def diff_torrents(old_info, new_info):
+	"""Compare the info dicts of two torrents by their file lists and piece digests.
+
+	Files are matched by path and length with a merge of the sorted file lists.
+	Pieces of the new torrent with a digest in the old one are identical.
+	Matched files starting at the same position within a piece in both torrents
+	have their pieces compared.
+	"""
+
+	old_layout, old_size = _diff_layout(old_info)
+	new_layout, new_size = _diff_layout(new_info)
+	old = _Pieces(old_info, old_size)
+	new = _Pieces(new_info, new_size)
+
+	identical_pieces = sum(map(set(old.digests).__contains__, new.digests))
+
+	unchanged_files = []
+	unverified_files = []
+	changed_files = []
+	added_files = []
+	removed_files = []
+	reusable_bytes = 0
+	unverified_bytes = 0
+
+	old_index = new_index = 0
+	while (
+		old_index < len(old_layout)
+		or new_index < len(new_layout)
+	):
+		if (
+			new_index == len(new_layout)
+			or (
+				old_index < len(old_layout)
+				and _path_key(old_layout[old_index][0]) < _path_key(new_layout[new_index][0])
+			)
+		):
+			removed_files.append(old_layout[old_index][0])
+			old_index += 1
+			continue
+
+		if (
+			old_index == len(old_layout)
+			or _path_key(new_layout[new_index][0]) < _path_key(old_layout[old_index][0])
+		):
+			added_files.append(new_layout[new_index][0])
+			new_index += 1
+			continue
+
+		path, old_length, old_offset = old_layout[old_index]
+		_, length, new_offset = new_layout[new_index]
+		old_index += 1
+		new_index += 1
+
+		if old_length != length:
+			changed_files.append(path)
+			continue
+
+		status = 'unverified'
+		if not length:
+			# Empty files have no pieces to compare.
+			status = 'unchanged'
+		elif (
+			old.piece_size == new.piece_size
+			and (old_offset - new_offset) % new.piece_size == 0
+		):
+			status = _compare_pieces(old, new, old_offset, new_offset, length)
+
+		if status == 'changed':
+			changed_files.append(path)
+			continue
+
+		if status == 'unchanged':
+			unchanged_files.append(path)
+			reusable_bytes += length
+		else:
+			unverified_files.append(path)
+			unverified_bytes += length
+
+	return TorrentDiff(
+		unchanged_files,
+		unverified_files,
+		changed_files,
+		added_files,
+		removed_files,
+		identical_pieces,
+		new.piece_count,
+		reusable_bytes,
+		unverified_bytes,
+		sum(length for _, length, _ in new_layout),
+	)
@@ -0,0 +1,189 @@
+import math
+import os
+import platform
+import re
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path, PurePath
+
+import pendulum
+
+FileEntry = namedtuple(
+	'FileEntry',
+	[
+		'path',
+		'size',
+		'modified',
+		'created',
+		'dev',
+		'ino',
+		'allocated',
+	]
+)
+
+
+def _created_timestamp(stat_result):
+	if platform.system() == 'Windows':
+		return stat_result.st_ctime
+
+	try:
+		return stat_result.st_birthtime
+	except AttributeError:
+		# Settle for modified time on *nix systems
+		# not supporting birth time.
+		return stat_result.st_mtime
+
+
+def _file_entry(path, stat_result):
+	return FileEntry(
+		path,
+		stat_result.st_size,
+		stat_result.st_mtime,
+		_created_timestamp(stat_result),
+		stat_result.st_dev,
+		stat_result.st_ino,
+		# Not available on Windows.
+		stat_result.st_blocks * 512 if hasattr(stat_result, 'st_blocks') else None,
+	)
+
+
+def _scan_dir(dirpath):
+	"""Scan a directory, returning its file entries and subdirectories sorted by name."""
+
+	files = []
+	subdirs = []
+
+	try:
+		it = os.scandir(dirpath)
+	except OSError:
+		# Unreadable or removed directories are skipped.
+		return files, subdirs
+
+	with it:
+		for entry in it:
+			try:
+				# Symlinks to directories aren't followed, so no data is found twice.
+				if entry.is_dir(follow_symlinks=False):
+					subdirs.append((entry.name, entry.stat(follow_symlinks=False)))
+				elif entry.is_file():
+					files.append(_file_entry(Path(entry.path), entry.stat()))
+			except OSError:
+				# Removed or unreadable while scanning.
+				continue
+
+	files.sort(key=lambda f: f.path.name)
+	subdirs.sort(key=lambda d: d[0])
+
+	return files, [
+		(dirpath / name, (stat_result.st_dev, stat_result.st_ino))
+		for name, stat_result in subdirs
+	]
+
+
+def discover_files(
+	path,
+	*,
+	max_depth=math.inf,
+	exclude_paths=None,
+	exclude_regexes=None,
+	exclude_globs=None,
+	threads=None,
+):
+	"""Find files under path, stat-ing each file only once.
+
+	Files in a directory are yielded before those in its subdirectories.
+	Symlinks to directories aren't followed, and unreadable directories are skipped.
+	Directories are scanned concurrently when threads is greater than 1,
+	which helps on high-latency network filesystems.
+	"""
+
+	path = Path(path).resolve()
+	exclude_paths = [str(PurePath(p)) for p in exclude_paths or []]
+	exclude_regexes = [re.compile(regex) for regex in exclude_regexes or []]
+	exclude_globs = exclude_globs or []
+
+	def _is_excluded(filepath):
+		filepath_str = str(filepath)
+
+		return (
+			any(p in filepath_str for p in exclude_paths)
+			or any(regex.search(filepath_str) for regex in exclude_regexes)
+		)
+
+	if not path.is_dir():
+		if (
+			path.is_file()
+			and not _is_excluded(path)
+		):
+			yield _file_entry(path, path.stat())
+
+		return
+
+	def _submit(executor, dirpath):
+		if executor is None:
+			future = Future()
+			future.set_result(_scan_dir(dirpath))
+
+			return future
+
+		return executor.submit(_scan_dir, dirpath)
+
+	def _walk(executor, future, depth, seen):
+		files, subdirs = future.result()
+
+		for f in files:
+			if (
+				not _is_excluded(f.path)
+				and not any(
+					f.path.relative_to(path).match(glob)
+					for glob in exclude_globs
+				)
+			):
+				yield f
+
+		if depth < max_depth:
+			# Guard against symlink loops.
+			subdirs = [
+				(dirpath, key)
+				for dirpath, key in subdirs
+				if key not in seen
+			]
+			seen.update(key for _, key in subdirs)
+
+			# Scan all subdirectories ahead of walking them in order.
+			futures = [
+				_submit(executor, dirpath)
+				for dirpath, _ in subdirs
+			]
+
+			for subdir_future in futures:
+				yield from _walk(executor, subdir_future, depth + 1, seen)
+
+	root_stat = path.stat()
+	seen = {(root_stat.st_dev, root_stat.st_ino)}
+
+	if threads and threads > 1:
+		with ThreadPoolExecutor(max_workers=threads) as executor:
+			yield from _walk(executor, _submit(executor, path), 0, seen)
+	else:
+		yield from _walk(None, _submit(None, path), 0, seen)
+
+
+def filter_files_by_dates(
+	files,
+	*,
+	creation_dates=None,
+	modification_dates=None,
+):
+	def _match_date(files, attr, period):
+		for f in files:
+			if pendulum.from_timestamp(getattr(f, attr)) in period:
+				yield f
+
+	for period in creation_dates or []:
+		files = _match_date(files, 'created', period)
+
+	for period in modification_dates or []:
+		files = _match_date(files, 'modified', period)
+
+	return files
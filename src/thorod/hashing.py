@@ -0,0 +1,1396 @@
+"""Reading torrent data for hashing."""
+
+import base64
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import itertools
+import json
+import mmap
+import os
+import platform
+import queue
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5, sha1
+
+from . import stats
+from .progress import (
+	EVENT_INTERVAL,
+	ProgressReporter,
+	chain_listeners,
+)
+
+DeviceRun = namedtuple(
+	'DeviceRun',
+	[
+		'dev',
+		'offset',
+		'size',
+		'indexes',
+	]
+)
+
+StreamSource = namedtuple(
+	'StreamSource',
+	[
+		'path',
+		'size',
+		'chunks',
+	]
+)
+StreamSource.__doc__ = """A file to hash from an iterable of byte chunks.
+
+path is relative to the torrent's top directory, and size is the file's length in bytes.
+"""
+
+IO_MODES = [
+	'buffered',
+	'fadvise',
+	'direct',
+]
+
+# Size of reads for hashing, independent of piece size.
+BLOCK_SIZE = 1024 * 1024
+
+# Seconds between saving hashing checkpoints.
+CHECKPOINT_INTERVAL = 60
+
+# O_DIRECT requires buffers, offsets, and lengths aligned to the logical block size.
+DIRECT_IO_ALIGNMENT = 4096
+
+# Larger than the page cache folios created by readahead.
+FADVISE_DROP_OVERLAP = 8 * 1024 * 1024
+
+# Windows opens files in text mode without it.
+O_BINARY = getattr(os, 'O_BINARY', 0)
+
+# Files up to this size are read whole with a single read.
+SMALL_FILE_SIZE = 64 * 1024
+
+# Most small files read ahead of hashing by each reader given more than one reader for its device,
+# fewer if they would take more than the memory left by the buffer pool.
+SMALL_FILE_READ_AHEAD = 32
+
+# Lowest CPU priority.
+LOW_PRIORITY_NICE = 19
+
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_SET_SYSCALLS = {
+	'aarch64': 30,
+	'armv7l': 314,
+	'i686': 289,
+	'x86_64': 251,
+}
+
+PROT_READ = 0x1
+MAP_SHARED = 0x01
+MAP_FAILED = ctypes.c_void_p(-1).value
+
+RESIDENCY_TABLE = bytes(i & 1 for i in range(256))
+UNCACHED_PAGES_RE = re.compile(b'\x00+')
+
+
+def _load_libc():
+	libc_name = ctypes.util.find_library('c')
+
+	if libc_name is None:
+		return None
+
+	try:
+		libc = ctypes.CDLL(libc_name, use_errno=True)
+		libc.mincore
+	except (AttributeError, OSError):
+		return None
+
+	libc.mmap.restype = ctypes.c_void_p
+	libc.mmap.argtypes = [
+		ctypes.c_void_p,
+		ctypes.c_size_t,
+		ctypes.c_int,
+		ctypes.c_int,
+		ctypes.c_int,
+		ctypes.c_int64,
+	]
+	libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+	libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+
+	return libc
+
+
+_libc = _load_libc()
+
+
+class BufferPool:
+	"""A fixed number of reusable read buffers.
+
+	Buffers are anonymous memory maps, so they are page-aligned for direct I/O.
+	"""
+
+	def __init__(self, buffer_size, count):
+		self.buffer_size = buffer_size
+		self.count = count
+		self._buffers = queue.LifoQueue()
+
+		for _ in range(count):
+			self._buffers.put(mmap.mmap(-1, buffer_size))
+
+	@contextlib.contextmanager
+	def buffer(self):
+		"""Borrow a buffer, waiting for one to be returned if none are free."""
+
+		buffer = self._buffers.get()
+
+		try:
+			yield buffer
+		finally:
+			self._buffers.put(buffer)
+
+
+class RateLimiter:
+	"""A token bucket limiting bytes read per second across threads.
+
+	Up to a second's worth of reads can burst.
+	Larger reads are allowed, with callers waiting off the debt afterwards.
+	"""
+
+	def __init__(self, rate):
+		self.rate = rate
+		self._tokens = rate
+		self._last = time.monotonic()
+		self._lock = threading.Lock()
+
+	def consume(self, size):
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+			self._last = now
+			self._tokens -= size
+
+			wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+		if wait:
+			time.sleep(wait)
+
+
+def lower_thread_priority():
+	"""Give the calling thread the lowest CPU priority and idle I/O priority where supported.
+
+	On Linux, both apply only to the calling thread.
+	"""
+
+	with contextlib.suppress(AttributeError, OSError):
+		os.setpriority(os.PRIO_PROCESS, 0, LOW_PRIORITY_NICE)
+
+	syscall = IOPRIO_SET_SYSCALLS.get(platform.machine())
+	if (
+		_libc is not None
+		and platform.system() == 'Linux'
+		and syscall is not None
+	):
+		_libc.syscall(syscall, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+
+
+class PageCacheResidency:
+	"""Which pages of a file were in the page cache before it was read.
+
+	Residency is recorded with mincore(2) a window ahead of the ranges asked about,
+	so pages pulled in by kernel readahead aren't mistaken for previously cached ones.
+	Where mincore is unavailable, all pages are treated as uncached.
+	"""
+
+	WINDOW_SIZE = 64 * 1024 * 1024
+
+	def __init__(self, fd):
+		self.fd = fd
+		self.file_size = os.fstat(fd).st_size
+		self._windows = {}
+
+	def _snapshot(self, index):
+		start = index * self.WINDOW_SIZE
+		length = min(self.WINDOW_SIZE, self.file_size - start)
+
+		if length <= 0:
+			return b''
+
+		return _mincore(self.fd, start, length)
+
+	def uncached_ranges(self, offset, size):
+		"""Yield (offset, length) ranges within the given range that weren't cached."""
+
+		first = offset // self.WINDOW_SIZE
+		last = (offset + size - 1) // self.WINDOW_SIZE
+
+		for index in range(first, last + 2):
+			if index not in self._windows:
+				self._windows[index] = self._snapshot(index)
+
+		for index in [i for i in self._windows if i < first]:
+			del self._windows[index]
+
+		for index in range(first, last + 1):
+			window_start = index * self.WINDOW_SIZE
+			start = max(offset, window_start)
+			end = min(offset + size, window_start + self.WINDOW_SIZE)
+			vec = self._windows[index]
+
+			if vec is None:
+				yield start, end - start
+				continue
+
+			first_page = (start - window_start) // mmap.PAGESIZE
+			last_page = (end - window_start - 1) // mmap.PAGESIZE
+			pages = vec[first_page:last_page + 1]
+
+			for match in UNCACHED_PAGES_RE.finditer(pages):
+				range_start = max(start, window_start + (first_page + match.start()) * mmap.PAGESIZE)
+				range_end = min(end, window_start + (first_page + match.end()) * mmap.PAGESIZE)
+
+				yield range_start, range_end - range_start
+
+
+def _mincore(fd, offset, length):
+	"""Get the page cache residency vector of a file range, or None if unavailable."""
+
+	if _libc is None:
+		return None
+
+	address = _libc.mmap(None, length, PROT_READ, MAP_SHARED, fd, offset)
+	if address in [None, MAP_FAILED]:
+		return None
+
+	try:
+		vec = (ctypes.c_ubyte * ((length + mmap.PAGESIZE - 1) // mmap.PAGESIZE))()
+
+		if _libc.mincore(ctypes.c_void_p(address), length, vec) != 0:
+			return None
+
+		# Only the least significant bit is defined.
+		return bytes(vec).translate(RESIDENCY_TABLE)
+	finally:
+		_libc.munmap(ctypes.c_void_p(address), length)
+
+
+def _read_buffered(filepath, buffer, offset):
+	with open(filepath, 'rb', buffering=0) as f:
+		f.seek(offset)
+
+		while True:
+			size = f.readinto(buffer)
+
+			if not size:
+				break
+
+			yield buffer[:size]
+
+
+def _read_direct(filepath, buffer, offset):
+	if len(buffer) % DIRECT_IO_ALIGNMENT:
+		raise ValueError(
+			f"Block size must be a multiple of {DIRECT_IO_ALIGNMENT} for direct I/O."
+		)
+
+	try:
+		fd = os.open(filepath, os.O_RDONLY | os.O_DIRECT)
+	except OSError as e:
+		# Not all filesystems support O_DIRECT.
+		if e.errno == errno.EINVAL:
+			yield from _read_fadvise(filepath, buffer, offset)
+			return
+
+		raise
+
+	try:
+		# Direct reads must start at an aligned offset.
+		skip = offset % DIRECT_IO_ALIGNMENT
+		offset -= skip
+
+		while True:
+			size = os.preadv(fd, [buffer], offset)
+
+			if size <= skip:
+				break
+
+			yield buffer[skip:size]
+
+			skip = 0
+
+			offset += size
+
+			# Direct reads only come up short at the end of the file.
+			if size < len(buffer):
+				break
+	finally:
+		os.close(fd)
+
+
+def _read_fadvise(filepath, buffer, offset):
+	fd = os.open(filepath, os.O_RDONLY)
+
+	try:
+		os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+		residency = PageCacheResidency(fd)
+
+		while True:
+			size = 0
+			while size < len(buffer):
+				read = os.preadv(fd, [buffer[size:]], offset + size)
+
+				if not read:
+					break
+
+				size += read
+
+			if not size:
+				break
+
+			# Large folios straddling a range aren't dropped until fully covered,
+			# so the ranges dropped overlap those read before.
+			drop_offset = max(0, offset - FADVISE_DROP_OVERLAP)
+			for start, length in residency.uncached_ranges(drop_offset, offset + size - drop_offset):
+				os.posix_fadvise(fd, start, length, os.POSIX_FADV_DONTNEED)
+
+			yield buffer[:size]
+
+			offset += size
+
+			if size < len(buffer):
+				break
+	finally:
+		os.close(fd)
+
+
+def read_file(filepath, buffer, *, io_mode='buffered', offset=0):
+	"""Read a file from offset into buffer, yielding a view of the data read each time it is filled.
+
+	The ``fadvise`` mode drops data read from the page cache unless it was already cached.
+	The ``direct`` mode bypasses the page cache with O_DIRECT,
+	falling back to ``fadvise`` on filesystems not supporting it.
+	It requires a page-aligned buffer like those from :class:`BufferPool`.
+	Views are only valid until the next one is yielded.
+	"""
+
+	if (
+		io_mode != 'buffered'
+		and not hasattr(os, 'posix_fadvise')
+	):
+		io_mode = 'buffered'
+
+	if (
+		io_mode == 'direct'
+		and not hasattr(os, 'O_DIRECT')
+	):
+		io_mode = 'fadvise'
+
+	buffer = memoryview(buffer)
+
+	if io_mode == 'buffered':
+		return _read_buffered(filepath, buffer, offset)
+	elif io_mode == 'fadvise':
+		return _read_fadvise(filepath, buffer, offset)
+	elif io_mode == 'direct':
+		return _read_direct(filepath, buffer, offset)
+
+	raise ValueError(f"'{io_mode}' is not a valid I/O mode.")
+
+
+def read_range(filepath, offset, length, buffer):
+	"""Read length bytes of a file from offset into buffer, yielding views of the data read."""
+
+	buffer = memoryview(buffer)
+
+	with open(filepath, 'rb', buffering=0) as f:
+		f.seek(offset)
+
+		while length:
+			size = f.readinto(buffer[:min(length, len(buffer))])
+
+			if not size:
+				raise ValueError(f"'{filepath}' changed while hashing.")
+
+			yield buffer[:size]
+
+			length -= size
+
+
+def read_small_file(filepath, size, buffer=None):
+	"""Read a small file whole, usually with a single read.
+
+	One byte more than size is read so a file that grew is noticed without another read.
+	With a buffer of at least size + 1 bytes, the file is read into it and a view of the data returned.
+	"""
+
+	if buffer is not None:
+		view = memoryview(buffer)[:size + 1]
+		length = 0
+
+		with open(filepath, 'rb', buffering=0) as f:
+			# Reads only come up short at the end of the file on local filesystems.
+			while length < size:
+				read = f.readinto(view[length:])
+
+				if not read:
+					break
+
+				length += read
+
+		return view[:length]
+
+	fd = os.open(filepath, os.O_RDONLY | O_BINARY)
+
+	try:
+		data = os.read(fd, size + 1)
+
+		# Reads only come up short at the end of the file on local filesystems.
+		while len(data) < size:
+			chunk = os.read(fd, size + 1 - len(data))
+
+			if not chunk:
+				break
+
+			data += chunk
+
+		return data
+	finally:
+		os.close(fd)
+
+
+def find_holes(filepath, size):
+	"""Find the holes in a sparse file with SEEK_HOLE and SEEK_DATA.
+
+	Returns a list of [start, end] offsets, empty where holes can't be found.
+	"""
+
+	if not hasattr(os, 'SEEK_HOLE'):
+		return []
+
+	holes = []
+	fd = os.open(filepath, os.O_RDONLY)
+
+	try:
+		offset = 0
+		while offset < size:
+			try:
+				start = os.lseek(fd, offset, os.SEEK_HOLE)
+			except OSError as e:
+				if e.errno in [errno.EINVAL, errno.ENOTSUP]:
+					return []
+
+				raise
+
+			if start >= size:
+				break
+
+			try:
+				end = min(os.lseek(fd, start, os.SEEK_DATA), size)
+			except OSError as e:
+				# No data after the hole.
+				if e.errno != errno.ENXIO:
+					raise
+
+				end = size
+
+			holes.append([start, end])
+			offset = end
+	finally:
+		os.close(fd)
+
+	return holes
+
+
+def piece_padding(files, piece_size):
+	"""Get the BEP 47 padding after each file needed for the next file to start on a piece boundary."""
+
+	return [
+		(-f.size) % piece_size
+		for f in files[:-1]
+	] + [0] * len(files[-1:])
+
+
+def group_device_runs(files, padding=None):
+	"""Group consecutive files on the same device into runs read by one reader.
+
+	With padding, every file starts on a piece boundary,
+	so each is a run of its own that can be read independently.
+	"""
+
+	# Built as lists, as replacing a tuple for each file is slow with many files.
+	runs = []
+	offset = 0
+
+	for index, f in enumerate(files):
+		size = f.size + (padding[index] if padding else 0)
+
+		if (
+			runs
+			and not padding
+			and (
+				runs[-1][0] == f.dev
+				or f.size == 0
+			)
+		):
+			runs[-1][2] += size
+			runs[-1][3].append(index)
+		else:
+			runs.append([f.dev, offset, size, [index]])
+
+		offset += size
+
+	return [DeviceRun(*run) for run in runs]
+
+
+def files_fingerprint(files, piece_size, align=False):
+	"""Identify a file list, its sizes and modification times, the piece size, and alignment."""
+
+	fingerprint = sha1(f'{piece_size}:{align}'.encode())
+
+	for f in files:
+		fingerprint.update(os.fsencode(str(f.path)) + b'\0')
+		fingerprint.update(f'{f.size}:{f.modified!r}\0'.encode())
+
+	return fingerprint.hexdigest()
+
+
+def load_checkpoint(filepath, fingerprint):
+	"""Load a hashing checkpoint, or None if there isn't one.
+
+	Raises ValueError if it was made for different files or piece size.
+	"""
+
+	try:
+		state = json.loads(filepath.read_text())
+	except FileNotFoundError:
+		return None
+
+	if state.get('fingerprint') != fingerprint:
+		raise ValueError(
+			f"Checkpoint '{filepath}' doesn't match the files being hashed."
+		)
+
+	state['pieces'] = base64.b64decode(state['pieces'])
+
+	return state
+
+
+def save_checkpoint(filepath, state):
+	temp_path = filepath.with_name(filepath.name + '.tmp')
+	temp_path.write_text(
+		json.dumps(
+			dict(state, pieces=base64.b64encode(state['pieces']).decode('ascii'))
+		)
+	)
+	os.replace(temp_path, filepath)
+
+
+def hash_pieces(
+	files,
+	piece_size,
+	*,
+	include_md5=False,
+	io_mode='buffered',
+	block_size=BLOCK_SIZE,
+	max_memory=None,
+	device_workers=None,
+	max_read_rate=None,
+	max_cpu_workers=None,
+	low_priority=False,
+	align=False,
+	known_pieces=None,
+	duplicates=None,
+	checkpoint=None,
+	checkpoint_interval=CHECKPOINT_INTERVAL,
+	resume=False,
+	on_progress=None,
+	progress_interval=EVENT_INTERVAL,
+):
+	"""Hash files as one contiguous stream of pieces.
+
+	Consecutive files on the same device are read sequentially by one reader,
+	while readers for different devices run concurrently.
+	device_workers maps device IDs to the number of readers for that device,
+	with the None key setting the default of 1.
+
+	Files are read in blocks of block_size into buffers from a pool
+	holding at most max_memory bytes, regardless of piece size.
+	Readers wait for a free buffer when there are more readers than buffers.
+	Small files read ahead by spare readers of a device take what max_memory leaves after the pool,
+	and aren't read ahead if it leaves no room.
+	Pieces spanning runs read by different readers
+	are hashed afterwards by reading their fragments again.
+
+	max_read_rate limits bytes read per second across all readers,
+	max_cpu_workers limits the readers hashing at once,
+	and low_priority runs hashing in threads with the lowest CPU and I/O priority.
+
+	on_progress is called with a :class:`~thorod.progress.ProgressEvent`
+	at most every progress_interval seconds and once hashing finishes.
+	It's called from a hashing thread, so exceptions it raises stop hashing.
+
+	With align, each file is followed by zeroed BEP 47 padding up to a piece boundary,
+	so files are hashed independently and can be read concurrently on the same device.
+
+	known_pieces maps piece indexes to digests already known, e.g. from another torrent.
+	Known pieces within a single file aren't read unless needed for include_md5.
+
+	duplicates maps the indexes of files to the index of an earlier file with the same content.
+	Pieces within a duplicate at the same offset within a piece as in the earlier file,
+	which is all of them with align, aren't read and get the earlier file's digests.
+
+	With a checkpoint path, progress is saved there every checkpoint_interval seconds
+	and when hashing is interrupted, and removed once hashing finishes.
+	With resume, hashing continues from a saved checkpoint.
+
+	Returns the piece digests, file lengths, and file md5 hashes if include_md5.
+	"""
+
+	if block_size < 1:
+		raise ValueError("Block size must be at least 1 byte.")
+
+	device_workers = device_workers or {}
+	padding = piece_padding(files, piece_size) if align else [0] * len(files)
+	sizes = [f.size + pad for f, pad in zip(files, padding)]
+	total_size = sum(sizes)
+	num_pieces = -(-total_size // piece_size)
+	runs = group_device_runs(files, padding if align else None)
+	fingerprint = files_fingerprint(files, piece_size, align) if checkpoint is not None else None
+
+	state = None
+	if (
+		checkpoint is not None
+		and resume
+	):
+		state = load_checkpoint(checkpoint, fingerprint)
+
+	if state is None:
+		pieces = bytearray(20 * num_pieces)
+		lengths = [0] * len(files)
+		md5sums = [None] * len(files)
+		# Per run, the position in its files and the offset in that file to continue from.
+		positions = [[0, 0] for _ in runs]
+		# Per piece spanning runs, the torrent offset, file, file offset, and length of each fragment.
+		fragments = {}
+	else:
+		pieces = bytearray(state['pieces'])
+		lengths = state['lengths']
+		md5sums = state['md5sums']
+		positions = state['positions']
+		fragments = {}
+		for piece_index, offset, filepath, file_offset, length in state['fragments']:
+			fragments.setdefault(piece_index, {})[offset] = (filepath, file_offset, length)
+
+	def set_digest(index, digest):
+		pieces[index * 20:(index + 1) * 20] = digest
+
+	# Per file, the holes in it, hashed as zeros without reading them.
+	holes = [
+		find_holes(f.path, f.size)
+		if f.allocated is None or f.allocated < f.size
+		else []
+		for f in files
+	]
+
+	zero_length = max(
+		[*padding, *(end - start for file_holes in holes for start, end in file_holes)],
+		default=0,
+	)
+	zeros = memoryview(bytes(min(block_size, zero_length) or 1))
+	zero_digests = {}
+
+	def zero_digest(length):
+		if length not in zero_digests:
+			piece_hash = sha1()
+			for start in range(0, length, len(zeros)):
+				piece_hash.update(zeros[:length - start])
+
+			zero_digests[length] = piece_hash.digest()
+
+		return zero_digests[length]
+
+	# Torrent offsets of holes, merged with padding and adjacent holes in other files.
+	zero_spans = []
+	file_offset = 0
+	for index, f in enumerate(files):
+		for start, end in holes[index] + [[f.size, sizes[index]]]:
+			if start == end:
+				continue
+
+			if (
+				zero_spans
+				and zero_spans[-1][1] == file_offset + start
+			):
+				zero_spans[-1][1] = file_offset + end
+			else:
+				zero_spans.append([file_offset + start, file_offset + end])
+
+		file_offset += sizes[index]
+
+	# Pieces entirely within holes and padding are known without hashing them.
+	known_pieces = dict(known_pieces or {})
+	for start, end in zero_spans:
+		for piece_index in range(-(-start // piece_size), -(-end // piece_size)):
+			piece_end = min((piece_index + 1) * piece_size, total_size)
+
+			if piece_end <= end:
+				known_pieces.setdefault(
+					piece_index,
+					zero_digest(piece_end - piece_index * piece_size),
+				)
+
+	for piece_index, digest in known_pieces.items():
+		set_digest(piece_index, digest)
+
+	duplicates = duplicates or {}
+	offsets = list(itertools.accumulate([0] + sizes))
+
+	# Pieces within duplicates mapped to the same piece within the file they duplicate.
+	copied_pieces = {}
+	for index, original in duplicates.items():
+		shift = offsets[original] - offsets[index]
+
+		if shift % piece_size:
+			continue
+
+		for piece_index in range(
+			-(-offsets[index] // piece_size),
+			(offsets[index] + sizes[index]) // piece_size,
+		):
+			original_index = piece_index + shift // piece_size
+
+			# Padding past the end of the file must be in both.
+			if (original_index + 1) * piece_size <= offsets[original] + sizes[original]:
+				copied_pieces[piece_index] = original_index
+
+	# Per file, the spans of known and copied pieces within it to skip reading.
+	skips = [[] for _ in files]
+	file_offset = 0
+	for index, f in enumerate(files):
+		first = -(-file_offset // piece_size)
+		last = (file_offset + sizes[index]) // piece_size
+
+		for piece_index in range(first, last):
+			if not (
+				piece_index in copied_pieces
+				or (
+					piece_index in known_pieces
+					and not include_md5
+				)
+			):
+				continue
+
+			start = piece_index * piece_size - file_offset
+			end = min(start + piece_size, f.size)
+
+			if (
+				skips[index]
+				and skips[index][-1][1] == start
+			):
+				skips[index][-1][1] = end
+			else:
+				skips[index].append([start, end])
+
+		file_offset += sizes[index]
+
+	lock = threading.Lock()
+	stopping = threading.Event()
+	rate_limiter = RateLimiter(max_read_rate) if max_read_rate else None
+	cpu_workers = threading.BoundedSemaphore(max_cpu_workers) if max_cpu_workers else None
+	next_checkpoint = time.monotonic() + checkpoint_interval
+
+	def save():
+		save_checkpoint(
+			checkpoint,
+			{
+				'fingerprint': fingerprint,
+				'pieces': bytes(pieces),
+				'lengths': lengths,
+				'md5sums': md5sums,
+				'positions': positions,
+				'fragments': [
+					[piece_index, offset, str(filepath), file_offset, length]
+					for piece_index, parts in fragments.items()
+					for offset, (filepath, file_offset, length) in parts.items()
+				],
+			},
+		)
+
+	def tick():
+		nonlocal next_checkpoint
+
+		reporter.tick()
+
+		if (
+			checkpoint is not None
+			and time.monotonic() >= next_checkpoint
+		):
+			with lock:
+				save()
+				next_checkpoint = time.monotonic() + checkpoint_interval
+
+	@contextlib.contextmanager
+	def waiting(worker):
+		start = time.monotonic()
+
+		try:
+			yield
+		finally:
+			reporter.wait_time[worker] += time.monotonic() - start
+
+	def hash_run(worker, run_index, buffer):
+		run = runs[run_index]
+		position, file_offset = positions[run_index]
+		offset = run.offset + sum(sizes[index] for index in run.indexes[:position]) + file_offset
+		piece_hash = None
+
+		# Small files read ahead by position in the run.
+		read_ahead = {}
+		read_ahead_position = position
+
+		try:
+			for position in range(position, len(run.indexes)):
+				if stopping.is_set():
+					return
+
+				while (
+					run.dev in small_file_readers
+					and read_ahead_position < min(position + small_file_read_ahead, len(run.indexes))
+				):
+					index = run.indexes[read_ahead_position]
+
+					if is_small(index):
+						read_ahead[read_ahead_position] = small_file_readers[run.dev].submit(
+							read_small_file,
+							files[index].path,
+							files[index].size,
+						)
+
+					read_ahead_position += 1
+
+				offset, piece_hash = hash_file(
+					worker,
+					run_index,
+					position,
+					offset,
+					piece_hash,
+					file_offset,
+					buffer,
+					read_ahead.pop(position, None),
+				)
+				file_offset = 0
+		finally:
+			for future in read_ahead.values():
+				future.cancel()
+
+	def hash_file(worker, run_index, position, offset, piece_hash, file_offset, buffer, read_ahead):
+		index = runs[run_index].indexes[position]
+		f = files[index]
+		md5sum = md5() if include_md5 else None
+		file_start = time.perf_counter()
+
+		# md5 hashes can't be resumed, so data before the offset is only hashed for them.
+		length = 0 if include_md5 else file_offset
+
+		if (
+			read_ahead is not None
+			and length == 0
+		):
+			segments = read_ahead_segments(read_ahead)
+		elif (
+			length == 0
+			and is_small(index)
+		):
+			segments = read_small_segments(index, buffer)
+		else:
+			segments = read_segments(index, buffer, length)
+
+		if command_stats is not None:
+			segments = command_stats.blocks('read', segments)
+
+		for file_position, block, zero in segments:
+			if stopping.is_set():
+				return offset, piece_hash
+
+			if file_position > length:
+				# Skip known pieces.
+				skipped = file_position - length
+				offset += skipped
+				length += skipped
+				reporter.skipped_bytes[worker] += skipped
+
+				with lock:
+					positions[run_index] = [position, length]
+
+			if length + len(block) > f.size:
+				raise ValueError(f"'{f.path}' changed while hashing.")
+
+			if length < file_offset:
+				head = block[:file_offset - length]
+				md5sum.update(head)
+				length += len(head)
+				block = block[len(head):]
+
+				if not block:
+					continue
+
+			if (
+				rate_limiter is not None
+				and not zero
+			):
+				with waiting(worker):
+					rate_limiter.consume(len(block))
+
+			if cpu_workers is not None:
+				with waiting(worker):
+					cpu_workers.acquire()
+
+			try:
+				# Timed without stats.stage, as its overhead adds up with many small files.
+				if command_stats is not None:
+					hash_start = time.perf_counter()
+
+				if include_md5:
+					md5sum.update(block)
+
+					if command_stats is not None:
+						md5_end = time.perf_counter()
+						command_stats.add('md5', hash_start, md5_end, len(block), event=False)
+						hash_start = md5_end
+
+				offset, piece_hash = hash_block(
+					run_index,
+					position,
+					f,
+					block,
+					offset,
+					length,
+					piece_hash,
+				)
+
+				if command_stats is not None:
+					command_stats.add('sha1', hash_start, time.perf_counter(), len(block), event=False)
+			finally:
+				if cpu_workers is not None:
+					cpu_workers.release()
+
+			reporter.read_bytes[worker] += len(block)
+			length += len(block)
+			tick()
+
+		if (
+			skips[index]
+			and skips[index][-1][0] <= length < skips[index][-1][1] == f.size
+		):
+			# A known last piece was skipped.
+			skipped = f.size - length
+			offset += skipped
+			length += skipped
+			reporter.skipped_bytes[worker] += skipped
+
+		if length != f.size:
+			raise ValueError(f"'{f.path}' changed while hashing.")
+
+		# Padding completes the piece the file ends in, unless it was known.
+		if piece_hash is not None:
+			for start in range(0, padding[index], len(zeros)):
+				piece_hash.update(zeros[:padding[index] - start])
+
+		offset += padding[index]
+		reporter.skipped_bytes[worker] += padding[index]
+
+		with lock:
+			if (
+				padding[index]
+				and piece_hash is not None
+			):
+				set_digest(offset // piece_size - 1, piece_hash.digest())
+				piece_hash = None
+
+			lengths[index] = length
+
+			if include_md5:
+				md5sums[index] = md5sum.hexdigest()
+
+			# A piece continuing into the next file is resumed from its start.
+			if piece_hash is None:
+				positions[run_index] = [position + 1, 0]
+
+		reporter.files[worker] += 1
+
+		if command_stats is not None:
+			command_stats.add_event('file', file_start, time.perf_counter(), bytes=f.size, path=str(f.path))
+
+		return offset, piece_hash
+
+	def is_small(index):
+		f = files[index]
+
+		return (
+			io_mode == 'buffered'
+			and 0 < f.size <= small_file_size
+			and not skips[index]
+			and not holes[index]
+		)
+
+	def read_small_segments(index, buffer):
+		yield 0, read_small_file(files[index].path, files[index].size, buffer), False
+
+	def read_ahead_segments(future):
+		yield 0, future.result(), False
+
+	def read_segments(index, buffer, start):
+		"""Read a file from start, skipping known pieces and substituting zeros for holes.
+
+		Yields the file offset of each block, the block, and whether it's from a hole.
+		"""
+
+		f = files[index]
+		position = start
+		file_holes = deque(holes[index])
+
+		for skip_start, skip_end in skips[index] + [[f.size, f.size]]:
+			if skip_end <= position:
+				continue
+
+			while position < skip_start:
+				while (
+					file_holes
+					and file_holes[0][1] <= position
+				):
+					file_holes.popleft()
+
+				if (
+					file_holes
+					and file_holes[0][0] <= position
+				):
+					end = min(file_holes[0][1], skip_start)
+
+					while position < end:
+						block = zeros[:end - position]
+						yield position, block, True
+						position += len(block)
+
+					continue
+
+				end = min(file_holes[0][0], skip_start) if file_holes else skip_start
+
+				for block in read_file(f.path, buffer, io_mode=io_mode, offset=position):
+					if end < f.size:
+						block = block[:end - position]
+
+					yield position, block, False
+
+					position += len(block)
+
+					if position >= end:
+						break
+
+				if position < end:
+					# The file is shorter than expected.
+					return
+
+			position = max(position, skip_end)
+
+	def hash_block(run_index, position, f, block, offset, length, piece_hash):
+		run = runs[run_index]
+		end = run.offset + run.size
+
+		while block:
+			piece_index = offset // piece_size
+			piece_start = piece_index * piece_size
+			piece_end = min(piece_start + piece_size, total_size)
+			part = block[:piece_end - offset]
+
+			if (
+				piece_start >= run.offset
+				and piece_end <= end
+			):
+				if piece_hash is None:
+					piece_hash = sha1()
+
+				piece_hash.update(part)
+
+				if offset + len(part) == piece_end:
+					with lock:
+						set_digest(piece_index, piece_hash.digest())
+						positions[run_index] = [position, length + len(part)]
+
+					piece_hash = None
+			else:
+				with lock:
+					fragments.setdefault(piece_index, {})[offset] = (f.path, length, len(part))
+					positions[run_index] = [position, length + len(part)]
+
+			offset += len(part)
+			length += len(part)
+			block = block[len(part):]
+
+		return offset, piece_hash
+
+	def read_runs(worker, run_indexes):
+		if low_priority:
+			lower_thread_priority()
+
+		try:
+			while not stopping.is_set():
+				try:
+					run_index = run_indexes.popleft()
+				except IndexError:
+					return
+
+				try:
+					start = time.monotonic()
+					with pool.buffer() as buffer:
+						reporter.wait_time[worker] += time.monotonic() - start
+						hash_run(worker, run_index, buffer)
+				except BaseException:
+					stopping.set()
+					raise
+		finally:
+			reporter.active[worker] = False
+
+	def hash_fragments():
+		if low_priority:
+			lower_thread_priority()
+
+		with pool.buffer() as buffer:
+			for piece_index, parts in sorted(fragments.items()):
+				if piece_index in known_pieces:
+					continue
+
+				piece_hash = sha1()
+
+				for offset in sorted(parts):
+					filepath, file_offset, length = parts[offset]
+
+					for block in read_range(filepath, file_offset, length, buffer):
+						if rate_limiter is not None:
+							with waiting(0):
+								rate_limiter.consume(len(block))
+
+						piece_hash.update(block)
+
+				set_digest(piece_index, piece_hash.digest())
+
+	device_runs = {}
+	for run_index, run in enumerate(runs):
+		device_runs.setdefault(run.dev, deque()).append(run_index)
+
+	readers = [
+		run_indexes
+		for dev, run_indexes in device_runs.items()
+		for _ in range(min(len(run_indexes), device_workers.get(dev, device_workers.get(None, 1))))
+	]
+
+	if max_memory is None:
+		pool = BufferPool(block_size, max(len(readers), 1))
+	elif max_memory < block_size:
+		raise ValueError("Maximum memory must be at least the block size.")
+	else:
+		pool = BufferPool(block_size, min(len(readers), max_memory // block_size) or 1)
+
+	# Small files are read whole into a reader's buffer, with a byte to spare to notice growth.
+	small_file_size = min(SMALL_FILE_SIZE, block_size - 1)
+
+	# Consecutive files on a device are one run read by one reader,
+	# so the device's other readers read its small files ahead instead.
+	# Reading ahead would compete with other processes at normal priority.
+	read_ahead_workers = {}
+	read_ahead_readers = 0
+	if (
+		io_mode == 'buffered'
+		and not low_priority
+	):
+		for dev, run_indexes in device_runs.items():
+			workers = device_workers.get(dev, device_workers.get(None, 1))
+			spare_workers = workers - min(len(run_indexes), workers)
+
+			if (
+				spare_workers
+				and any(is_small(index) for run_index in run_indexes for index in runs[run_index].indexes)
+			):
+				read_ahead_workers[dev] = spare_workers
+				read_ahead_readers += workers - spare_workers
+
+	# Files read ahead are held outside the pool, so count against max_memory.
+	# Only readers holding a pool buffer read ahead.
+	small_file_read_ahead = SMALL_FILE_READ_AHEAD
+	if (
+		read_ahead_workers
+		and max_memory is not None
+	):
+		small_file_read_ahead = min(
+			SMALL_FILE_READ_AHEAD,
+			(max_memory - pool.count * block_size)
+			// (min(read_ahead_readers, pool.count) * (small_file_size + 1)),
+		)
+
+	small_file_readers = {}
+	if small_file_read_ahead:
+		for dev, workers in read_ahead_workers.items():
+			small_file_readers[dev] = ThreadPoolExecutor(max_workers=workers)
+
+	command_stats = stats.STATS
+
+	# Resumed data is complete, but isn't counted towards rates.
+	reporter = ProgressReporter(
+		chain_listeners(on_progress, command_stats and command_stats.update_progress),
+		total_bytes=total_size,
+		total_files=len(files),
+		num_workers=max(len(readers), 1),
+		completed_bytes=sum(
+			sum(sizes[index] for index in run.indexes[:position]) + file_offset
+			for run, (position, file_offset) in zip(runs, positions)
+		),
+		completed_files=sum(position for position, _ in positions),
+		queue_depth=lambda: sum(len(run_indexes) for run_indexes in device_runs.values()),
+		interval=progress_interval,
+	)
+
+	try:
+		# Lowered priorities can't be raised again, so are kept to worker threads.
+		if (
+			len(readers) <= 1
+			and not low_priority
+		):
+			for worker, run_indexes in enumerate(readers):
+				read_runs(worker, run_indexes)
+
+			hash_fragments()
+		else:
+			with ThreadPoolExecutor(max_workers=max(len(readers), 1)) as executor:
+				futures = [
+					executor.submit(read_runs, worker, run_indexes)
+					for worker, run_indexes in enumerate(readers)
+				]
+
+				try:
+					for future in futures:
+						future.result()
+				except BaseException:
+					# Stop readers before waiting on them when interrupted.
+					stopping.set()
+					raise
+
+				executor.submit(hash_fragments).result()
+	except BaseException:
+		if checkpoint is not None:
+			with lock:
+				save()
+
+		raise
+	finally:
+		for executor in small_file_readers.values():
+			executor.shutdown()
+
+	# In order, as a duplicate's original may be a duplicate itself.
+	for piece_index, original_index in sorted(copied_pieces.items()):
+		if piece_index not in known_pieces:
+			set_digest(piece_index, pieces[original_index * 20:(original_index + 1) * 20])
+
+	# Duplicates may have been partly skipped.
+	if include_md5:
+		for index, original in sorted(duplicates.items()):
+			md5sums[index] = md5sums[original]
+
+	if checkpoint is not None:
+		with contextlib.suppress(FileNotFoundError):
+			checkpoint.unlink()
+
+	reporter.finish()
+
+	return pieces, lengths, md5sums
+
+
+def hash_streams(
+	sources,
+	piece_size,
+	*,
+	include_md5=False,
+	align=False,
+	on_progress=None,
+	progress_interval=EVENT_INTERVAL,
+):
+	"""Hash files given as iterables of byte chunks as one contiguous stream of pieces.
+
+	sources have path, size, and chunks attributes.
+	Chunks are hashed as they're produced, so only the current chunk is held in memory.
+
+	Returns the piece digests, file lengths, and file md5 hashes if include_md5.
+	"""
+
+	padding = piece_padding(sources, piece_size) if align else [0] * len(sources)
+	pieces = bytearray()
+	lengths = []
+	md5sums = []
+
+	command_stats = stats.STATS
+	reporter = ProgressReporter(
+		chain_listeners(on_progress, command_stats and command_stats.update_progress),
+		total_bytes=sum(s.size for s in sources) + sum(padding),
+		total_files=len(sources),
+		num_workers=1,
+		interval=progress_interval,
+	)
+
+	zeros = bytes(min(BLOCK_SIZE, max(padding, default=0)) or 1)
+	piece_hash = sha1()
+	piece_length = 0
+
+	def update(data):
+		nonlocal piece_hash, piece_length
+
+		while data:
+			part = data[:piece_size - piece_length]
+			piece_hash.update(part)
+			piece_length += len(part)
+			data = data[len(part):]
+
+			if piece_length == piece_size:
+				pieces.extend(piece_hash.digest())
+				piece_hash = sha1()
+				piece_length = 0
+
+	for s, pad in zip(sources, padding):
+		md5sum = md5() if include_md5 else None
+		length = 0
+
+		for chunk in s.chunks:
+			chunk = memoryview(chunk).cast('B')
+			length += len(chunk)
+
+			if length > s.size:
+				raise ValueError(f"'{s.path}' is larger than its size of {s.size} bytes.")
+
+			if include_md5:
+				with stats.stage('md5', len(chunk), event=False):
+					md5sum.update(chunk)
+
+			with stats.stage('sha1', len(chunk), event=False):
+				update(chunk)
+			reporter.read_bytes[0] += len(chunk)
+			reporter.tick()
+
+		if length != s.size:
+			raise ValueError(f"'{s.path}' is {length} bytes, not its size of {s.size} bytes.")
+
+		for start in range(0, pad, len(zeros)):
+			update(zeros[:pad - start])
+
+		reporter.skipped_bytes[0] += pad
+		reporter.files[0] += 1
+
+		lengths.append(length)
+		md5sums.append(md5sum.hexdigest() if include_md5 else None)
+
+	if piece_length:
+		pieces.extend(piece_hash.digest())
+
+	reporter.finish()
+
+	return pieces, lengths, md5sums
@@ -0,0 +1,242 @@
+"""Find torrents matching data on disk for cross-seeding."""
+
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .constants import MATCH_CHECK_SIZE
+from .core import read_torrent_file
+from .hashing import BLOCK_SIZE
+from .reuse import (
+	hash_piece,
+	piece_digests,
+	torrent_file_layout,
+)
+from .stats import (
+	add_error,
+	stage,
+)
+
+TorrentMatch = namedtuple(
+	'TorrentMatch',
+	[
+		'torrent',
+		'data_path',
+	]
+)
+TorrentMatch.__doc__ = """A torrent with local data confirmed by hashing.
+
+The data path is the file of a single file torrent,
+or the directory holding the files of a multi-file torrent, which may be named differently.
+"""
+
+MatchResults = namedtuple(
+	'MatchResults',
+	[
+		'matches',
+		'torrents',
+		'candidates',
+		'unreadable',
+	]
+)
+
+
+class LocalFiles:
+	"""Local files indexed by size and by path.
+
+	Paths are kept as strings, shared between both indexes, to keep memory down for millions of files.
+	Empty files are left out, as they match any empty file.
+	"""
+
+	def __init__(self, files):
+		self.paths_by_size = {}
+		self.sizes = {}
+
+		for f in files:
+			if not f.size:
+				continue
+
+			path = str(f.path)
+			self.paths_by_size.setdefault(f.size, []).append(path)
+			self.sizes[path] = f.size
+
+	def __len__(self):
+		return len(self.sizes)
+
+	def find_data_paths(self, layout):
+		"""Find local paths of a torrent's data by the sizes and relative paths of its files.
+
+		The file with the least common size anchors the search.
+		Each local file of that size ending with the same relative path gives a data path,
+		kept if the torrent's other files are under it with the same sizes.
+		Any local file of the right size is a data path for a single file torrent.
+		"""
+
+		files = [
+			(path, length)
+			for path, length, _ in layout
+			if length
+		]
+
+		if (
+			not files
+			or any(length not in self.paths_by_size for _, length in files)
+		):
+			return []
+
+		anchor_path, anchor_length = min(files, key=lambda f: len(self.paths_by_size[f[1]]))
+
+		if not anchor_path:
+			return [Path(path) for path in self.paths_by_size[anchor_length]]
+
+		# Compared as strings, as making paths of millions of candidates is slow.
+		anchor_suffix = os.sep + os.sep.join(anchor_path)
+		files = [
+			(os.sep + os.sep.join(file_path), length)
+			for file_path, length in files
+		]
+
+		data_paths = []
+		for path in self.paths_by_size[anchor_length]:
+			if not path.endswith(anchor_suffix):
+				continue
+
+			data_path = path[:-len(anchor_suffix)]
+
+			if all(
+				self.sizes.get(data_path + file_path) == length
+				for file_path, length in files
+			):
+				data_paths.append(Path(data_path))
+
+		return data_paths
+
+
+def choose_check_pieces(layout, piece_size, count):
+	"""Choose pieces from the middle of the largest files, one per file.
+
+	The starts of files are often alike, e.g. headers of the same format,
+	so middle pieces tell different data of the same size apart.
+	"""
+
+	pieces = []
+
+	for _, length, offset in sorted(layout, key=lambda f: f[1], reverse=True):
+		if (
+			len(pieces) == count
+			or not length
+		):
+			break
+
+		piece_index = (offset + length // 2) // piece_size
+
+		if piece_index not in pieces:
+			pieces.append(piece_index)
+
+	return pieces
+
+
+def confirm_match(torrent, layout, total_size, piece_size, known_pieces, data_paths):
+	"""Hash the known pieces from each data path in turn, returning the first match or None."""
+
+	offsets = [offset for _, _, offset in layout]
+	buffer = bytearray(min(piece_size, BLOCK_SIZE))
+
+	for data_path in data_paths:
+		paths = [
+			data_path.joinpath(*path)
+			for path, _, _ in layout
+		]
+
+		try:
+			with stage('check', len(known_pieces) * piece_size):
+				matched = all(
+					hash_piece(paths, layout, offsets, total_size, piece_size, piece_index, buffer) == digest
+					for piece_index, digest in known_pieces.items()
+				)
+		except (OSError, ValueError):
+			# Removed or changed since scanning.
+			continue
+
+		if matched:
+			return TorrentMatch(torrent, data_path)
+
+	return None
+
+
+def match_torrents(filepaths, local_files, *, check_size=MATCH_CHECK_SIZE, max_jobs=None):
+	"""Find the torrents with data among local files.
+
+	Candidates are found by file sizes and relative paths without reading any data,
+	then confirmed by hashing a few pieces, with max_jobs torrents checked concurrently.
+	Torrents are read while earlier candidates are checked,
+	with a bounded number waiting so memory stays flat for any number of torrents.
+	"""
+
+	max_jobs = max_jobs or os.cpu_count()
+	matches = []
+	torrents = 0
+	candidates = 0
+	unreadable = []
+
+	with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+		pending = deque()
+
+		for filepath in filepaths:
+			try:
+				info = read_torrent_file(filepath)['info']
+
+				with stage('find'):
+					layout = torrent_file_layout(info)
+					data_paths = local_files.find_data_paths(layout)
+
+				piece_size = info['piece length']
+				pieces = piece_digests(info)
+			except (OSError, TypeError, ValueError, KeyError):
+				add_error()
+				unreadable.append(filepath)
+				continue
+
+			torrents += 1
+
+			if not data_paths:
+				continue
+
+			candidates += 1
+
+			if 'files' in info:
+				total_size = sum(f['length'] for f in info['files'])
+			else:
+				total_size = info['length']
+
+			known_pieces = {
+				piece_index: pieces[piece_index * 20:(piece_index + 1) * 20]
+				for piece_index in choose_check_pieces(layout, piece_size, check_size)
+			}
+
+			pending.append(
+				executor.submit(
+					confirm_match,
+					filepath,
+					layout,
+					total_size,
+					piece_size,
+					known_pieces,
+					data_paths,
+				)
+			)
+
+			while len(pending) > 2 * max_jobs:
+				match = pending.popleft().result()
+
+				if match is not None:
+					matches.append(match)
+
+		for future in pending:
+			match = future.result()
+
+			if match is not None:
+				matches.append(match)
+
+	return MatchResults(matches, torrents, candidates, unreadable)
@@ -0,0 +1,117 @@
+"""Write metrics for the Prometheus node exporter's textfile collector."""
+
+import os
+import threading
+import time
+
+# Seconds between writing metrics.
+METRICS_INTERVAL = 15
+
+
+def _escape(value):
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+	return ','.join(
+		f'{key}="{_escape(value)}"'
+		for key, value in labels.items()
+	)
+
+
+def generate_metrics(stats, labels, *, finished=False):
+	"""Generate metrics in the Prometheus text format from the stats of a running command."""
+
+	metrics = []
+
+	def add(name, help_, type_, samples):
+		metrics.append(f'# HELP thorod_{name} {help_}')
+		metrics.append(f'# TYPE thorod_{name} {type_}')
+
+		for sample_labels, value in samples:
+			metrics.append(f'thorod_{name}{{{_labels({**labels, **sample_labels})}}} {value}')
+
+	progress = stats.progress
+
+	if progress is not None:
+		add('hashed_bytes', "Bytes hashed of the current torrent.", 'gauge', [({}, progress.completed_bytes)])
+		add('total_bytes', "Bytes to hash of the current torrent.", 'gauge', [({}, progress.total_bytes)])
+		add('hashed_files', "Files hashed of the current torrent.", 'gauge', [({}, progress.completed_files)])
+		add('total_files', "Files to hash of the current torrent.", 'gauge', [({}, progress.total_files)])
+		add(
+			'bytes_per_second',
+			"Hashing throughput over the last couple of seconds.",
+			'gauge',
+			[({}, progress.bytes_per_second or 0)],
+		)
+
+		if progress.finished:
+			eta = 0
+		elif progress.bytes_per_second:
+			eta = (progress.total_bytes - progress.completed_bytes) / progress.bytes_per_second
+		else:
+			eta = 'NaN'
+
+		add('eta_seconds', "Estimated seconds until the current torrent is hashed.", 'gauge', [({}, eta)])
+
+	add('errors_total', "Errors, e.g. failed torrents.", 'counter', [({}, stats.errors)])
+
+	# Copied as hashing workers add to them.
+	stages = [
+		(name, list(stage))
+		for name, stage in list(stats.stages.items())
+	]
+	add(
+		'stage_seconds_total',
+		"Seconds spent in each stage, summed across hashing workers.",
+		'counter',
+		[({'stage': name}, seconds) for name, (_, seconds, _) in stages],
+	)
+	add(
+		'stage_bytes_total',
+		"Bytes processed by each stage.",
+		'counter',
+		[({'stage': name}, size) for name, (_, _, size) in stages],
+	)
+
+	add('elapsed_seconds', "Seconds since the command started.", 'gauge', [({}, time.perf_counter() - stats.start)])
+	add('finished', "Whether the command has finished.", 'gauge', [({}, int(finished))])
+	add('last_update_timestamp_seconds', "When these metrics were written.", 'gauge', [({}, time.time())])
+
+	return '\n'.join(metrics) + '\n'
+
+
+class MetricsWriter:
+	"""Periodically write the metrics of a running command to a file in a background thread.
+
+	The file is replaced atomically, so the textfile collector never reads a partial file.
+	"""
+
+	def __init__(self, filepath, stats, *, labels=None, interval=METRICS_INTERVAL):
+		self.filepath = filepath
+		self.stats = stats
+		self.labels = labels or {}
+		self.interval = interval
+
+		self._stopping = threading.Event()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+
+	def __enter__(self):
+		self.write()
+		self._thread.start()
+
+		return self
+
+	def __exit__(self, *exc_info):
+		self._stopping.set()
+		self._thread.join()
+		self.write(finished=True)
+
+	def _run(self):
+		while not self._stopping.wait(self.interval):
+			self.write()
+
+	def write(self, *, finished=False):
+		temp_path = self.filepath.with_name(f'.{self.filepath.name}.tmp')
+		temp_path.write_text(generate_metrics(self.stats, self.labels, finished=finished))
+		os.replace(temp_path, self.filepath)
@@ -18,11 +18,13 @@ from tbm_utils import (
 	humanize_filesize,
 )
 
-from .config import CONFIG_PATH
+from .config import ABBRS, CONFIG_PATH
 from .constants import DEFAULT_ABBRS
+from .stats import stage
 from .utils import (
 	calculate_torrent_size,
 	hash_info_dict,
+	is_padding_file,
 )
 
 
@@ -62,7 +64,8 @@ class HashingSpeedColumn(ProgressColumn):
 	max_refresh = 0.5
 
 	def render(self, task):
-		speed = task.speed
+		# Hashers report the rate over the last couple of seconds.
+		speed = task.fields.get('read_rate', task.speed)
 		if speed is None:
 			return Text("?", style="bold red")
 		hashing_speed = humanize_filesize(speed)
@@ -81,6 +84,117 @@ PROGRESS = Progress(
 )
 
 
+class ProgressBar:
+	"""A hashing progress listener showing events in a rich progress bar."""
+
+	def __init__(self, progress=PROGRESS, description="Hashing"):
+		self.progress = progress
+		self.description = description
+		self.task = None
+
+	def __call__(self, event):
+		if self.task is None:
+			self.task = self.progress.add_task(
+				self.description,
+				total=event.total_bytes,
+			)
+
+		self.progress.update(
+			self.task,
+			completed=event.completed_bytes,
+			read_rate=event.bytes_per_second,
+		)
+
+
+def generate_bench_outputs(results):
+	outputs = ['\n']
+
+	bench_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+
+	for column in [
+		'Dataset',
+		'I/O Mode',
+		'Workers',
+		'Piece Size',
+		'Files',
+		'Size',
+		'Rate',
+		'Files/s',
+		'Peak RSS',
+		'CPU',
+	]:
+		bench_table.add_column(column, style='cyan', justify='right', no_wrap=True)
+
+	bench_table.add_row(None)
+	for result in results:
+		bench_table.add_row(
+			result.dataset,
+			result.io_mode,
+			str(result.workers),
+			humanize_filesize(result.piece_size),
+			str(result.files),
+			humanize_filesize(result.size, precision=2),
+			f"{humanize_filesize(result.bytes_per_second, precision=2)}/s",
+			f"{result.files_per_second:.0f}",
+			'?' if result.peak_rss is None else humanize_filesize(result.peak_rss, precision=2),
+			'?' if result.cpu_utilization is None else f"{result.cpu_utilization:.0%}",
+		)
+
+	outputs.append(bench_table)
+
+	return outputs
+
+
+def generate_stats_outputs(stats):
+	outputs = ['\n']
+
+	stats_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+
+	for column in [
+		'Stage',
+		'Calls',
+		'Time',
+		'Bytes',
+		'Rate',
+	]:
+		stats_table.add_column(column, style='cyan', justify='right', no_wrap=True)
+
+	stats_table.add_row(None)
+	for name, (calls, seconds, size) in stats.stages.items():
+		stats_table.add_row(
+			name,
+			str(calls),
+			f"{seconds:.3f}s",
+			humanize_filesize(size, precision=2) if size else '',
+			f"{humanize_filesize(size / seconds, precision=2)}/s" if size and seconds else '',
+		)
+
+	stats_table.add_row(None)
+	stats_table.add_row('total', '', f"{stats.elapsed:.3f}s", '', '', style='bold')
+	stats_table.add_row(
+		'peak RSS',
+		'',
+		'',
+		'?' if stats.peak_rss is None else humanize_filesize(stats.peak_rss, precision=2),
+		'',
+		style='bold',
+	)
+
+	outputs.append(stats_table)
+
+	return outputs
+
+
 def generate_abbreviations_outputs(conf):
 	outputs = ['\n']
 
@@ -115,11 +229,11 @@ def generate_abbreviations_outputs(conf):
 	auto_abbrs_table.add_row(None)
 	auto_abbrs_table.add_row(
 		'open',
-		'All default trackers in a random tiered order.',
+		'All default trackers in a random tiered order, except those found unreachable.',
 	)
 	auto_abbrs_table.add_row(
 		'random',
-		'A single random default tracker.',
+		'A single random default tracker, except those found unreachable.',
 	)
 
 	outputs.extend(['\n', auto_abbrs_table])
@@ -167,6 +281,46 @@ def generate_abbreviations_outputs(conf):
 	return outputs
 
 
+def generate_tracker_check_outputs(checks):
+	outputs = ['\n']
+
+	abbrs = {
+		tracker: abbr
+		for abbr, tracker in ABBRS.items()
+	}
+
+	check_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+
+	for column in [
+		'Abbreviation',
+		'Tracker',
+		'Status',
+	]:
+		check_table.add_column(column, style='cyan')
+
+	check_table.add_row(None)
+	for check in checks:
+		if check.reachable:
+			status = Text(f"{check.latency * 1000:.0f} ms", style='green')
+		else:
+			status = Text(check.error, style='red')
+
+		check_table.add_row(
+			abbrs.get(check.tracker, ''),
+			check.tracker,
+			status,
+		)
+
+	outputs.append(check_table)
+
+	return outputs
+
+
 def generate_magnet_link(torrent_info):
 	torrent_name = torrent_info['info']['name']
 	info_hash = hash_info_dict(torrent_info['info'])
@@ -206,6 +360,221 @@ def generate_magnet_outputs(magnet_link):
 	return outputs
 
 
+def generate_diff_outputs(diff, show_files=False):
+	outputs = ['\n']
+
+	diff_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+	diff_table.add_column(
+		'Diff',
+		style='yellow',
+		no_wrap=True,
+	)
+	diff_table.add_column(style='cyan')
+
+	reusable = diff.reusable_bytes / diff.total_bytes if diff.total_bytes else 0
+	unverified = diff.unverified_bytes / diff.total_bytes if diff.total_bytes else 0
+
+	diff_table.add_row(None)
+	diff_table.add_row('Unchanged Files', str(len(diff.unchanged_files)))
+	diff_table.add_row('Unverified Files', str(len(diff.unverified_files)))
+	diff_table.add_row('Changed Files', str(len(diff.changed_files)))
+	diff_table.add_row('Added Files', str(len(diff.added_files)))
+	diff_table.add_row('Removed Files', str(len(diff.removed_files)))
+	diff_table.add_row('Identical Pieces', f"{diff.identical_pieces} / {diff.total_pieces}")
+	diff_table.add_row(
+		'Reusable',
+		f"{humanize_filesize(diff.reusable_bytes, precision=2)} / "
+		f"{humanize_filesize(diff.total_bytes, precision=2)} ({reusable:.1%})",
+	)
+	diff_table.add_row(
+		'Unverified',
+		f"{humanize_filesize(diff.unverified_bytes, precision=2)} / "
+		f"{humanize_filesize(diff.total_bytes, precision=2)} ({unverified:.1%})",
+	)
+
+	outputs.append(diff_table)
+
+	if show_files:
+		files_table = Table(
+			box=None,
+			show_footer=False,
+			show_edge=False,
+			header_style="bold yellow underline",
+		)
+		files_table.add_column(
+			'Files',
+			style='yellow',
+			no_wrap=True,
+		)
+		files_table.add_column(style='cyan')
+		files_table.add_row(None)
+
+		for marker, style, paths in [
+			('?', 'cyan', diff.unverified_files),
+			('~', 'yellow', diff.changed_files),
+			('+', 'green', diff.added_files),
+			('-', 'red', diff.removed_files),
+		]:
+			for path in paths:
+				files_table.add_row(
+					Text(marker, style=style),
+					str(
+						PurePath(
+							*(
+								part.decode('utf8', 'replace') if isinstance(part, bytes) else part
+								for part in path
+							)
+						)
+					),
+				)
+
+		outputs.extend(['\n', files_table])
+
+	return outputs
+
+
+def generate_match_outputs(results):
+	outputs = ['\n']
+
+	match_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+	match_table.add_column(
+		'Match',
+		style='yellow',
+		no_wrap=True,
+	)
+	match_table.add_column(style='cyan')
+
+	match_table.add_row(None)
+	match_table.add_row('Torrents', str(results.torrents))
+	match_table.add_row('Candidates', str(results.candidates))
+	match_table.add_row('Matched', str(len(results.matches)))
+	match_table.add_row('Unreadable', str(len(results.unreadable)))
+
+	outputs.append(match_table)
+
+	if results.matches:
+		matches_table = Table(
+			box=None,
+			show_footer=False,
+			show_edge=False,
+			header_style="bold yellow underline",
+		)
+		matches_table.add_column('Torrent', style='yellow')
+		matches_table.add_column('Data', style='cyan')
+		matches_table.add_row(None)
+
+		for match in results.matches:
+			matches_table.add_row(str(match.torrent), str(match.data_path))
+
+		outputs.extend(['\n', matches_table])
+
+	if results.unreadable:
+		unreadable_table = Table(
+			box=None,
+			show_footer=False,
+			show_edge=False,
+			header_style="bold yellow underline",
+		)
+		unreadable_table.add_column('Unreadable', style='red')
+		unreadable_table.add_row(None)
+
+		for filepath in results.unreadable:
+			unreadable_table.add_row(str(filepath))
+
+		outputs.extend(['\n', unreadable_table])
+
+	return outputs
+
+
+def generate_piece_size_outputs(plan):
+	outputs = ['\n']
+
+	plan_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+
+	for column in [
+		'Piece Size',
+		'Pieces',
+		'Torrent Size',
+		'Cross-File Pieces',
+		'Hashing Overhead',
+	]:
+		plan_table.add_column(column, style='cyan', justify='right', no_wrap=True)
+
+	plan_table.add_row(None)
+	for candidate in plan.candidates:
+		plan_table.add_row(
+			humanize_filesize(candidate.piece_size),
+			str(candidate.piece_count),
+			humanize_filesize(candidate.torrent_size, precision=2),
+			str(candidate.cross_file_pieces),
+			f"{candidate.hashing_overhead:.2f}s",
+			style='bold green' if candidate.piece_size == plan.piece_size else None,
+		)
+
+	outputs.append(plan_table)
+
+	reasons_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+	reasons_table.add_column(
+		'Piece Size Plan',
+		style='cyan',
+	)
+	reasons_table.add_row(None)
+	reasons_table.add_row(
+		f"Data size {humanize_filesize(plan.data_size, precision=2)}, "
+		f"estimated hashing time {humanize_duration(plan.hashing_time)}."
+	)
+
+	for reason in plan.reasons:
+		reasons_table.add_row(reason)
+
+	reasons_table.add_row(f"Using {humanize_filesize(plan.piece_size)} pieces.")
+
+	outputs.extend(['\n', reasons_table])
+
+	return outputs
+
+
+def generate_skipped_outputs(skipped):
+	outputs = ['\n']
+
+	skipped_table = Table(
+		box=None,
+		show_footer=False,
+		show_edge=False,
+		header_style="bold yellow underline",
+	)
+	skipped_table.add_column('Skipped', style='cyan')
+	skipped_table.add_column('Error', style='red')
+	skipped_table.add_row(None)
+
+	for filepath, error in skipped:
+		skipped_table.add_row(str(filepath), error)
+
+	outputs.append(skipped_table)
+
+	return outputs
+
+
 def generate_summary_outputs(torrent_info, show_files=False):
 	outputs = ['\n']
 
@@ -290,6 +659,9 @@ def generate_summary_outputs(torrent_info, show_files=False):
 		file_infos = []
 		if 'files' in torrent_info['info']:
 			for f in torrent_info['info']['files']:
+				if is_padding_file(f):
+					continue
+
 				file_infos.append(
 					(
 						humanize_filesize(f['length'], precision=2),
@@ -350,5 +722,6 @@ def generate_summary_outputs(torrent_info, show_files=False):
 
 @cast_to_list
 def render(outputs, **kwargs):
-	for output in outputs:
-		CONSOLE.print(output, **kwargs)
+	with stage('render'):
+		for output in outputs:
+			CONSOLE.print(output, **kwargs)
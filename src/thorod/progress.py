@@ -0,0 +1,174 @@
+"""Progress events for hashing, independent of how they are shown."""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# Seconds between progress events.
+EVENT_INTERVAL = 0.2
+
+# Seconds rates are measured over.
+RATE_WINDOW = 2
+
+ProgressEvent = namedtuple(
+	'ProgressEvent',
+	[
+		'completed_bytes',
+		'total_bytes',
+		'completed_files',
+		'total_files',
+		'bytes_per_second',
+		'files_per_second',
+		'queue_depth',
+		'worker_utilization',
+		'elapsed',
+		'finished',
+	]
+)
+ProgressEvent.__doc__ = """Hashing progress.
+
+Rates are measured over the last RATE_WINDOW seconds and exclude data not read,
+like resumed or reused pieces.
+queue_depth is the number of file runs waiting for a reader.
+worker_utilization is the fraction of time each worker spent reading or hashing
+rather than waiting on throttling or buffers since the last event,
+and is 0 for workers with nothing left to read.
+"""
+
+
+class ProgressReporter:
+	"""Collect hashing progress from workers and emit throttled progress events.
+
+	Each worker only updates its own counters, so updating them needs no locks.
+	Events are emitted by whichever worker calls :meth:`tick` once the interval has passed,
+	so exceptions raised by the listener, e.g. to cancel hashing, propagate to that worker.
+	"""
+
+	def __init__(
+		self,
+		listener,
+		*,
+		total_bytes,
+		total_files,
+		num_workers,
+		completed_bytes=0,
+		completed_files=0,
+		queue_depth=None,
+		interval=EVENT_INTERVAL,
+	):
+		self.listener = listener
+		self.total_bytes = total_bytes
+		self.total_files = total_files
+		self.interval = interval
+
+		self.read_bytes = [0] * num_workers
+		self.skipped_bytes = [0] * num_workers
+		self.files = [0] * num_workers
+		self.wait_time = [0.0] * num_workers
+		self.active = [True] * num_workers
+
+		self._base_bytes = completed_bytes
+		self._base_files = completed_files
+		self._queue_depth = queue_depth
+		self._lock = threading.Lock()
+		self._start = time.monotonic()
+		self._next = self._start
+		self._samples = deque([(self._start, 0, 0)])
+		self._last_wait = [0.0] * num_workers
+		self._last_time = self._start
+
+	@property
+	def completed_bytes(self):
+		return self._base_bytes + sum(self.read_bytes) + sum(self.skipped_bytes)
+
+	@property
+	def completed_files(self):
+		return self._base_files + sum(self.files)
+
+	def emit(self, *, finished=False):
+		"""Emit a progress event now."""
+
+		if self.listener is None:
+			return
+
+		now = time.monotonic()
+		read_bytes = sum(self.read_bytes)
+		files = sum(self.files)
+
+		self._samples.append((now, read_bytes, files))
+		while now - self._samples[0][0] > RATE_WINDOW:
+			self._samples.popleft()
+
+		first_time, first_bytes, first_files = self._samples[0]
+		elapsed = now - first_time
+
+		if elapsed:
+			bytes_per_second = (read_bytes - first_bytes) / elapsed
+			files_per_second = (files - first_files) / elapsed
+		else:
+			bytes_per_second = files_per_second = None
+
+		interval = now - self._last_time
+		wait_time = list(self.wait_time)
+		worker_utilization = tuple(
+			max(0.0, 1 - (wait - last_wait) / interval) if active and interval else 0.0
+			for wait, last_wait, active in zip(wait_time, self._last_wait, self.active)
+		)
+		self._last_wait = wait_time
+		self._last_time = now
+
+		self.listener(
+			ProgressEvent(
+				self.completed_bytes,
+				self.total_bytes,
+				self.completed_files,
+				self.total_files,
+				bytes_per_second,
+				files_per_second,
+				self._queue_depth() if self._queue_depth is not None else 0,
+				worker_utilization,
+				now - self._start,
+				finished,
+			)
+		)
+
+	def tick(self):
+		"""Emit a progress event if the interval has passed and no other worker is emitting."""
+
+		if (
+			time.monotonic() >= self._next
+			and self._lock.acquire(blocking=False)
+		):
+			try:
+				self._next = time.monotonic() + self.interval
+				self.emit()
+			finally:
+				self._lock.release()
+
+	def finish(self):
+		"""Emit the final progress event."""
+
+		with self._lock:
+			self.emit(finished=True)
+
+
+def chain_listeners(*listeners):
+	"""Combine listeners into one calling each in turn, ignoring any that are None."""
+
+	listeners = [
+		listener
+		for listener in listeners
+		if listener is not None
+	]
+
+	if not listeners:
+		return None
+
+	if len(listeners) == 1:
+		return listeners[0]
+
+	def listener(event):
+		for listener in listeners:
+			listener(event)
+
+	return listener
@@ -0,0 +1,177 @@
+"""Reuse piece hashes from existing torrents for the same data."""
+
+import bisect
+import random
+from hashlib import sha1
+
+from .hashing import (
+	BLOCK_SIZE,
+	piece_padding,
+	read_range,
+)
+from .utils import (
+	get_file_path,
+	is_padding_file,
+)
+
+
+def torrent_file_layout(info_dict):
+	"""Get the path, length, and data offset of each file in an info dict.
+
+	Single file torrents have an empty path, as their name may differ.
+	"""
+
+	if 'files' not in info_dict:
+		return [((), info_dict['length'], 0)]
+
+	layout = []
+	offset = 0
+
+	for f in info_dict['files']:
+		if not is_padding_file(f):
+			layout.append((tuple(f['path']), f['length'], offset))
+
+		offset += f['length']
+
+	return layout
+
+
+def piece_digests(info_dict):
+	"""Get the pieces of an info dict as bytes."""
+
+	pieces = info_dict['pieces']
+
+	if isinstance(pieces, str):
+		# Decoded as text when it happens to be valid UTF-8.
+		pieces = pieces.encode('utf8')
+	elif not isinstance(pieces, bytes):
+		# Created in memory as a bytearray.
+		pieces = bytes(pieces)
+
+	return pieces
+
+
+def file_layout(files, piece_size, *, base_path=None, align=False):
+	"""Get the path, length, and data offset of each file to be hashed."""
+
+	padding = piece_padding(files, piece_size) if align else [0] * len(files)
+
+	layout = []
+	offset = 0
+
+	for f, pad in zip(files, padding):
+		path = () if base_path is None else tuple(get_file_path(f.path, base_path))
+		layout.append((path, f.size, offset))
+
+		offset += f.size + pad
+
+	return layout, offset
+
+
+def find_reusable_pieces(layout, total_size, piece_size, torrent_infos):
+	"""Find the digests of pieces that existing torrents have for the same files.
+
+	All pieces are reused from a torrent with the same file layout.
+	Otherwise, pieces entirely within a file with the same path and length
+	are reused if the file starts at the same offset within a piece.
+	"""
+
+	known_pieces = {}
+
+	for torrent_info in torrent_infos:
+		info = torrent_info['info']
+
+		if info['piece length'] != piece_size:
+			continue
+
+		pieces = piece_digests(info)
+		torrent_layout = torrent_file_layout(info)
+
+		if (
+			torrent_layout == layout
+			and len(pieces) == 20 * -(-total_size // piece_size)
+		):
+			for piece_index in range(len(pieces) // 20):
+				known_pieces[piece_index] = pieces[piece_index * 20:(piece_index + 1) * 20]
+
+			continue
+
+		torrent_offsets = {
+			(path, length): offset
+			for path, length, offset in torrent_layout
+		}
+
+		for path, length, offset in layout:
+			torrent_offset = torrent_offsets.get((path, length))
+
+			if (
+				torrent_offset is None
+				or (torrent_offset - offset) % piece_size
+			):
+				continue
+
+			shift = (torrent_offset - offset) // piece_size
+			first = -(-offset // piece_size)
+			last = (offset + length) // piece_size
+
+			for piece_index in range(first, last):
+				start = (piece_index + shift) * 20
+				known_pieces.setdefault(piece_index, pieces[start:start + 20])
+
+	return known_pieces
+
+
+def hash_piece(paths, layout, offsets, total_size, piece_size, piece_index, buffer):
+	"""Hash a piece from the files of a layout, with padding between files zeroed.
+
+	offsets are the data offsets of the layout, for finding the first file in the piece.
+	"""
+
+	piece_start = piece_index * piece_size
+	piece_end = min(piece_start + piece_size, total_size)
+	piece_hash = sha1()
+	position = piece_start
+
+	for index in range(max(bisect.bisect_right(offsets, piece_start) - 1, 0), len(paths)):
+		_, length, offset = layout[index]
+
+		if offset >= piece_end:
+			break
+
+		start = max(piece_start, offset)
+		end = min(piece_end, offset + length)
+
+		if start >= end:
+			continue
+
+		piece_hash.update(bytes(start - position))
+
+		for block in read_range(paths[index], start - offset, end - start, buffer):
+			piece_hash.update(block)
+
+		position = end
+
+	piece_hash.update(bytes(piece_end - position))
+
+	return piece_hash.digest()
+
+
+def check_pieces(files, layout, total_size, piece_size, known_pieces, sample_size):
+	"""Hash a random sample of known pieces from disk.
+
+	Returns the indexes of sampled pieces not matching their known digest.
+	"""
+
+	sample = random.sample(sorted(known_pieces), min(sample_size, len(known_pieces)))
+	paths = [f.path for f in files]
+	offsets = [offset for _, _, offset in layout]
+	buffer = bytearray(min(piece_size, BLOCK_SIZE))
+	mismatched = []
+
+	for piece_index in sample:
+		piece_hash = hash_piece(paths, layout, offsets, total_size, piece_size, piece_index, buffer)
+
+		if piece_hash != known_pieces[piece_index]:
+			mismatched.append(piece_index)
+
+	return mismatched
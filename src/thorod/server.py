@@ -0,0 +1,462 @@
+"""A long-running job server keeping caches warm between calls."""
+
+import contextlib
+import functools
+import itertools
+import json
+import re
+import socket
+import socketserver
+import stat
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from tbm_utils import parse_args
+
+from .__about__ import __title__, __version__
+from .config import read_config_file
+from .core import (
+	JobCancelled,
+	create_torrent_info,
+	read_torrent_file,
+	write_torrent_file,
+	xseed_torrents,
+)
+from .output import (
+	generate_magnet_link,
+	render,
+)
+from .stats import add_error
+from .utils import (
+	calculate_torrent_size,
+	hash_info_dict,
+	is_padding_file,
+)
+
+JOB_COMMANDS = {
+	'create',
+	'info',
+	'magnet',
+	'xseed',
+}
+
+JOB_PATH_RE = re.compile(r'^/jobs/(\d+)$')
+
+LOOPBACK_HOSTS = {'127.0.0.1', '::1', 'localhost'}
+WILDCARD_HOSTS = {'', '0.0.0.0', '::'}
+
+# Number of finished jobs kept around for status queries.
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+	"""A submitted command.
+
+	Jobs are hashing progress listeners, tracking progress and checking for cancellation.
+	"""
+
+	def __init__(self, job_id, argv, args):
+		self.id = job_id
+		self.argv = argv
+		self.args = args
+		self.status = 'queued'
+		self.progress = None
+		self.result = None
+		self.error = None
+		self.future = None
+		self._cancelled = threading.Event()
+
+	@property
+	def finished(self):
+		return self.status in ['cancelled', 'done', 'failed']
+
+	def __call__(self, event):
+		if self._cancelled.is_set():
+			raise JobCancelled
+
+		self.progress = event
+
+	def cancel(self):
+		self._cancelled.set()
+
+		if (
+			self.future is not None
+			and self.future.cancel()
+		):
+			self.status = 'cancelled'
+
+	def wait(self):
+		if self.future is not None:
+			with contextlib.suppress(Exception):
+				self.future.result()
+
+	def to_dict(self):
+		return {
+			'id': self.id,
+			'command': self.args._command,
+			'argv': self.argv,
+			'status': self.status,
+			'progress': None if self.progress is None else self.progress._asdict(),
+			'result': self.result,
+			'error': self.error,
+		}
+
+
+class JobManager:
+	def __init__(self, *, max_jobs=None, cache_size=128):
+		self.conf = read_config_file()
+		self.jobs = OrderedDict()
+		self.pool = ThreadPoolExecutor(max_workers=max_jobs)
+
+		self._ids = itertools.count(1)
+		self._lock = threading.Lock()
+		self._read_torrent_file = functools.lru_cache(maxsize=cache_size)(
+			lambda filepath, mtime: read_torrent_file(filepath)
+		)
+
+	def cancel(self, job_id):
+		job = self.jobs[job_id]
+		job.cancel()
+
+		return job
+
+	def load_torrent(self, filepath):
+		return self._read_torrent_file(filepath, filepath.stat().st_mtime_ns)
+
+	def parse(self, argv):
+		# Imported here as cli imports the commands that import this module.
+		from .cli import process_args, raise_parser_errors, thorod
+
+		if (
+			not argv
+			or argv[0] not in JOB_COMMANDS
+		):
+			raise ValueError(f"Command must be one of {', '.join(sorted(JOB_COMMANDS))}.")
+
+		# argparse reports errors by printing and exiting.
+		with raise_parser_errors():
+			parsed = parse_args(thorod, argv)
+
+		return process_args(parsed, conf=self.conf)
+
+	def shutdown(self):
+		for job in list(self.jobs.values()):
+			job.cancel()
+
+		self.pool.shutdown(wait=True)
+
+	def submit(self, argv):
+		args = self.parse(argv)
+
+		with self._lock:
+			job = Job(next(self._ids), argv, args)
+			self.jobs[job.id] = job
+			self._prune()
+
+		job.future = self.pool.submit(self._run, job)
+
+		return job
+
+	def _prune(self):
+		finished = [
+			job_id
+			for job_id, job in self.jobs.items()
+			if job.finished
+		]
+
+		for job_id in finished[:-MAX_FINISHED_JOBS]:
+			del self.jobs[job_id]
+
+	def _run(self, job):
+		if job.finished:
+			return
+
+		job.status = 'running'
+
+		try:
+			job.result = getattr(self, f'_run_{job.args._command}')(job, job.args)
+		except JobCancelled:
+			job.status = 'cancelled'
+		except SystemExit as e:
+			job.error = str(e.code).strip()
+			job.status = 'failed'
+			add_error()
+		except Exception as e:
+			job.error = str(e)
+			job.status = 'failed'
+			add_error()
+		else:
+			job.status = 'done'
+
+	def _run_create(self, job, args):
+		torrent_info = create_torrent_info(args, on_progress=job)
+		write_torrent_file(args.output, torrent_info)
+
+		return summarize_torrent(torrent_info, output=args.output, show_files=args.show_files)
+
+	def _run_info(self, job, args):
+		torrent_info = self.load_torrent(args.torrent)
+
+		return summarize_torrent(torrent_info, show_files=args.show_files)
+
+	def _run_magnet(self, job, args):
+		torrent_info = self.load_torrent(args.torrent)
+
+		return {'magnet': generate_magnet_link(torrent_info)}
+
+	def _run_xseed(self, job, args):
+		if args.torrent.is_dir():
+			skipped = []
+			written = [
+				{
+					'torrent': str(filepath),
+					'output': str(output),
+				}
+				for filepath, output, _ in xseed_torrents(args, read=self.load_torrent, skipped=skipped)
+			]
+
+			return written + [
+				{
+					'torrent': str(filepath),
+					'error': error,
+				}
+				for filepath, error in skipped
+			]
+
+		summaries = []
+		for _, output, xseed_info in xseed_torrents(args, read=self.load_torrent):
+			if xseed_info is None:
+				xseed_info = self.load_torrent(output)
+
+			summaries.append(summarize_torrent(xseed_info, output=output))
+
+		return summaries if 'profile' in args else summaries[0]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+	server_version = f'{__title__}/{__version__}'
+
+	def address_string(self):
+		# Unix socket clients have no address.
+		if isinstance(self.client_address, tuple):
+			return super().address_string()
+
+		return 'unix'
+
+	def parse_request(self):
+		if not super().parse_request():
+			return False
+
+		# Pages on other sites can reach a local server by DNS rebinding,
+		# but can't make browsers send a Host header naming it.
+		allowed_hosts = self.server.allowed_hosts
+
+		if (
+			allowed_hosts is not None
+			and self.headers.get('Host', '').lower() not in allowed_hosts
+		):
+			self.send_json(HTTPStatus.FORBIDDEN, {'error': "Host not allowed."})
+			return False
+
+		return True
+
+	def do_DELETE(self):
+		match = JOB_PATH_RE.match(self.path)
+
+		if match is None:
+			self.send_json(HTTPStatus.NOT_FOUND, {'error': "Not found."})
+		else:
+			try:
+				job = self.server.manager.cancel(int(match.group(1)))
+			except KeyError:
+				self.send_json(HTTPStatus.NOT_FOUND, {'error': "Job not found."})
+			else:
+				self.send_json(HTTPStatus.OK, job.to_dict())
+
+	def do_GET(self):
+		manager = self.server.manager
+		match = JOB_PATH_RE.match(self.path)
+
+		if self.path == '/jobs':
+			self.send_json(
+				HTTPStatus.OK,
+				[
+					job.to_dict()
+					for job in list(manager.jobs.values())
+				]
+			)
+		elif match is not None:
+			job = manager.jobs.get(int(match.group(1)))
+
+			if job is None:
+				self.send_json(HTTPStatus.NOT_FOUND, {'error': "Job not found."})
+			else:
+				self.send_json(HTTPStatus.OK, job.to_dict())
+		else:
+			self.send_json(HTTPStatus.NOT_FOUND, {'error': "Not found."})
+
+	def do_POST(self):
+		if self.path != '/jobs':
+			self.send_json(HTTPStatus.NOT_FOUND, {'error': "Not found."})
+			return
+
+		# Requiring JSON makes browsers send a CORS preflight for cross-site requests,
+		# which is never answered, so pages on other sites can't submit jobs.
+		content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+		if content_type != 'application/json':
+			self.send_json(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {'error': "Content-Type must be application/json."})
+			return
+
+		try:
+			length = int(self.headers.get('Content-Length', 0))
+			request = json.loads(self.rfile.read(length) or b'{}')
+			argv = request.get('argv') if isinstance(request, dict) else None
+
+			if (
+				not isinstance(argv, list)
+				or not all(isinstance(arg, str) for arg in argv)
+			):
+				raise ValueError("'argv' must be a list of strings.")
+
+			job = self.server.manager.submit(argv)
+		except ValueError as e:
+			self.send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+		else:
+			if request.get('wait'):
+				job.wait()
+				self.send_json(HTTPStatus.OK, job.to_dict())
+			else:
+				self.send_json(HTTPStatus.ACCEPTED, job.to_dict())
+
+	def send_json(self, status, obj):
+		body = json.dumps(obj, default=str).encode()
+
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+	def server_bind(self):
+		super().server_bind()
+
+		self.allowed_hosts = get_allowed_hosts(self.server_address[0], self.server_port)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+	# Only local users with access to the socket file can connect.
+	allowed_hosts = None
+
+
+def get_allowed_hosts(host, port):
+	"""Get the Host header values naming a server listening on host and port.
+
+	Any loopback name is allowed for servers on loopback or all addresses,
+	as well as this machine's names for the latter.
+	"""
+
+	hosts = {host}
+
+	if host in LOOPBACK_HOSTS | WILDCARD_HOSTS:
+		hosts |= LOOPBACK_HOSTS
+
+	if host in WILDCARD_HOSTS:
+		hosts |= {socket.gethostname(), socket.getfqdn()}
+
+	return {
+		f'[{h}]:{port}' if ':' in h else f'{h}:{port}'
+		for h in hosts
+		if h not in WILDCARD_HOSTS
+	}
+
+
+def summarize_torrent(torrent_info, *, output=None, show_files=False):
+	info = torrent_info['info']
+
+	if 'announce-list' in torrent_info:
+		announce_list = torrent_info['announce-list']
+	elif 'announce' in torrent_info:
+		announce_list = [[torrent_info['announce']]]
+	else:
+		announce_list = []
+
+	summary = {
+		'info_hash': hash_info_dict(info),
+		'name': info['name'],
+		'data_size': calculate_torrent_size(torrent_info),
+		'piece_size': info['piece length'],
+		'private': info.get('private') == 1,
+		'creation_date': torrent_info.get('creation date'),
+		'created_by': torrent_info.get('created by'),
+		'comment': torrent_info.get('comment'),
+		'source': info.get('source'),
+		'trackers': announce_list,
+		'magnet': generate_magnet_link(torrent_info),
+	}
+
+	if output is not None:
+		summary['output'] = str(output)
+
+	if show_files:
+		files = info.get('files') or [
+			{
+				'path': [info['name']],
+				'length': info['length'],
+			}
+		]
+
+		summary['files'] = [
+			{
+				'path': '/'.join(f['path']),
+				'length': f['length'],
+			}
+			for f in files
+			if not is_padding_file(f)
+		]
+
+	return summary
+
+
+def serve(args):
+	manager = JobManager(
+		max_jobs=args.max_jobs,
+		cache_size=args.cache_size,
+	)
+
+	if args.socket is not None:
+		# Remove a stale socket left behind by a previous server.
+		if (
+			args.socket.exists()
+			and stat.S_ISSOCK(args.socket.stat().st_mode)
+		):
+			args.socket.unlink()
+
+		httpd = ThreadingUnixHTTPServer(str(args.socket), RequestHandler)
+		address = args.socket
+	else:
+		httpd = ThreadingHTTPServer((args.host, args.port), RequestHandler)
+		address = f'http://{args.host}:{httpd.server_port}'
+
+	httpd.manager = manager
+
+	render(f"\nServing on {address}\n", style="bold yellow")
+
+	try:
+		httpd.serve_forever()
+	finally:
+		httpd.server_close()
+		manager.shutdown()
+
+		if args.socket is not None:
+			with contextlib.suppress(FileNotFoundError):
+				args.socket.unlink()
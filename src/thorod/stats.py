@@ -0,0 +1,160 @@
+"""Time the stages of a command for --stats and --trace."""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+	import resource
+except ImportError:  # Windows.
+	resource = None
+
+from .constants import KIB
+
+# Stats for the running command, or None when not collecting them.
+STATS = None
+
+
+def get_peak_rss():
+	"""Get the peak resident set size of the process in bytes, or None if unavailable."""
+
+	if resource is None:
+		return None
+
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+
+	# Reported in KiB on Linux and bytes on macOS.
+	return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * KIB
+
+
+class Stats:
+	"""Time and bytes of each stage of a command, with Chrome trace events."""
+
+	def __init__(self, *, trace=False):
+		self.start = time.perf_counter()
+		self.elapsed = None
+		self.peak_rss = None
+		self.stages = {}
+		self.events = [] if trace else None
+		self.progress = None
+		self.errors = 0
+
+		self._lock = threading.Lock()
+
+	def add(self, name, start, end, size=0, *, event=True):
+		"""Add a call to a stage, also tracing it unless event is False.
+
+		Calls too frequent to trace individually, like reading a block, are added with event=False.
+		"""
+
+		with self._lock:
+			stage = self.stages.setdefault(name, [0, 0.0, 0])
+			stage[0] += 1
+			stage[1] += end - start
+			stage[2] += size
+
+		if event:
+			self.add_event(name, start, end, bytes=size)
+
+	def add_event(self, name, start, end, **event_args):
+		"""Trace an event without adding it to a stage."""
+
+		if self.events is None:
+			return
+
+		with self._lock:
+			self.events.append(
+				{
+					'name': name,
+					'ph': 'X',
+					'ts': (start - self.start) * 1e6,
+					'dur': (end - start) * 1e6,
+					'pid': os.getpid(),
+					'tid': threading.get_ident(),
+					'args': event_args,
+				}
+			)
+
+	def update_progress(self, event):
+		"""Keep the latest hashing progress event, as a progress listener."""
+
+		self.progress = event
+
+	def finish(self):
+		self.elapsed = time.perf_counter() - self.start
+		self.peak_rss = get_peak_rss()
+
+	def blocks(self, name, blocks):
+		"""Time getting each (position, block, ...) item from an iterable, e.g. reading it."""
+
+		blocks = iter(blocks)
+
+		while True:
+			start = time.perf_counter()
+
+			try:
+				item = next(blocks)
+			except StopIteration:
+				return
+
+			self.add(name, start, time.perf_counter(), len(item[1]), event=False)
+
+			yield item
+
+	def write_trace(self, filepath):
+		"""Write trace events in the Chrome trace format, viewable in Perfetto or chrome://tracing."""
+
+		with open(filepath, 'w') as f:
+			json.dump(
+				{
+					'traceEvents': self.events,
+					'displayTimeUnit': 'ms',
+				},
+				f,
+			)
+
+
+@contextlib.contextmanager
+def stage(name, size=0, *, event=True):
+	"""Time a stage of the running command if collecting stats."""
+
+	stats = STATS
+
+	if stats is None:
+		yield
+		return
+
+	start = time.perf_counter()
+
+	try:
+		yield
+	finally:
+		stats.add(name, start, time.perf_counter(), size, event=event)
+
+
+def add_error():
+	"""Count an error, e.g. a failed job, of the running command if collecting stats."""
+
+	stats = STATS
+
+	if stats is not None:
+		with stats._lock:
+			stats.errors += 1
+
+
+@contextlib.contextmanager
+def collect_stats(*, trace=False):
+	"""Collect stats for stages run within the context."""
+
+	global STATS
+
+	STATS = Stats(trace=trace)
+
+	try:
+		yield STATS
+	finally:
+		STATS.finish()
+		STATS = None
@@ -0,0 +1,283 @@
+"""Check trackers are reachable, caching the results for the open and random abbreviations."""
+
+import asyncio
+import json
+import os
+import random
+import ssl
+import struct
+import time
+import urllib.parse
+from collections import namedtuple
+from pathlib import Path
+
+import appdirs
+
+from .__about__ import __author__, __title__, __version__
+
+TRACKER_CACHE_PATH = Path(appdirs.user_cache_dir(__title__, __author__), 'trackers.json')
+
+# Seconds to wait for a tracker to respond.
+TRACKER_TIMEOUT = 10
+
+# Seconds a check is used for before a tracker is unchecked again.
+TRACKER_CHECK_TTL = 24 * 60 * 60
+
+# Seconds between resending UDP connect requests, as UDP packets may be lost.
+UDP_RESEND_INTERVAL = 3
+
+# Bytes of an HTTP announce response read.
+MAX_RESPONSE_SIZE = 64 * 1024
+
+# BEP 15 connect request and response.
+UDP_PROTOCOL_ID = 0x41727101980
+UDP_CONNECT = struct.Struct('>QII')
+UDP_CONNECT_RESPONSE = struct.Struct('>IIQ')
+
+TrackerCheck = namedtuple(
+	'TrackerCheck',
+	[
+		'tracker',
+		'reachable',
+		'latency',
+		'error',
+	]
+)
+
+
+class _UDPConnectProtocol(asyncio.DatagramProtocol):
+	def __init__(self, transaction_id, response):
+		self.transaction_id = transaction_id
+		self.response = response
+
+	def datagram_received(self, data, addr):
+		if (
+			self.response.done()
+			or len(data) < UDP_CONNECT_RESPONSE.size
+		):
+			return
+
+		action, transaction_id, _ = UDP_CONNECT_RESPONSE.unpack_from(data)
+
+		if (
+			action == 0
+			and transaction_id == self.transaction_id
+		):
+			self.response.set_result(None)
+
+	def error_received(self, exc):
+		if not self.response.done():
+			self.response.set_exception(exc)
+
+
+async def _probe_udp(url):
+	"""Send a BEP 15 connect request, resending it until a response."""
+
+	if url.port is None:
+		raise ValueError("No port.")
+
+	loop = asyncio.get_event_loop()
+	transaction_id = random.getrandbits(32)
+	response = loop.create_future()
+
+	transport, _ = await loop.create_datagram_endpoint(
+		lambda: _UDPConnectProtocol(transaction_id, response),
+		remote_addr=(url.hostname, url.port),
+	)
+
+	try:
+		while True:
+			transport.sendto(UDP_CONNECT.pack(UDP_PROTOCOL_ID, 0, transaction_id))
+
+			try:
+				await asyncio.wait_for(asyncio.shield(response), UDP_RESEND_INTERVAL)
+			except asyncio.TimeoutError:
+				continue
+
+			return
+	finally:
+		transport.close()
+
+
+async def _probe_http(url):
+	"""Announce a random info hash as stopped, so no peer is added, and read the response.
+
+	Any response with the keys of a tracker response counts, including a failure reason.
+	The body isn't decoded, as it may be anything.
+	"""
+
+	query = urllib.parse.urlencode(
+		{
+			'info_hash': os.urandom(20),
+			'peer_id': b'-TH0000-' + os.urandom(12),
+			'port': 6881,
+			'uploaded': 0,
+			'downloaded': 0,
+			'left': 0,
+			'compact': 1,
+			'numwant': 0,
+			'event': 'stopped',
+		}
+	)
+	target = f"{url.path or '/'}?{url.query + '&' if url.query else ''}{query}"
+
+	reader, writer = await asyncio.open_connection(
+		url.hostname,
+		url.port or (443 if url.scheme == 'https' else 80),
+		ssl=ssl.create_default_context() if url.scheme == 'https' else None,
+	)
+
+	try:
+		writer.write(
+			(
+				f"GET {target} HTTP/1.0\r\n"
+				f"Host: {url.netloc}\r\n"
+				f"User-Agent: {__title__}/{__version__}\r\n"
+				"Connection: close\r\n"
+				"\r\n"
+			).encode('ascii')
+		)
+
+		response = b''
+		while len(response) < MAX_RESPONSE_SIZE:
+			data = await reader.read(MAX_RESPONSE_SIZE)
+
+			if not data:
+				break
+
+			response += data
+	finally:
+		writer.close()
+
+	status, _, body = response.partition(b'\r\n\r\n')
+	status = status.split(b'\r\n', 1)[0].decode('latin-1')
+
+	if not (
+		body.startswith(b'd')
+		and (
+			b'8:interval' in body
+			or b'14:failure reason' in body
+		)
+	):
+		raise ValueError(f"Not a tracker response: {status or 'no response'}.")
+
+
+async def _check_tracker(tracker, timeout):
+	start = time.perf_counter()
+
+	try:
+		url = urllib.parse.urlsplit(tracker)
+
+		if not url.hostname:
+			raise ValueError("No host.")
+
+		if url.scheme == 'udp':
+			probe = _probe_udp(url)
+		elif url.scheme in ['http', 'https']:
+			probe = _probe_http(url)
+		else:
+			raise ValueError(f"'{url.scheme}' trackers aren't supported.")
+
+		await asyncio.wait_for(probe, timeout)
+	except asyncio.TimeoutError:
+		error = "Timed out."
+	except (OSError, ValueError, UnicodeError) as e:
+		error = str(e) or type(e).__name__
+	else:
+		return TrackerCheck(tracker, True, time.perf_counter() - start, None)
+
+	return TrackerCheck(tracker, False, None, error)
+
+
+def check_trackers(trackers, *, timeout=TRACKER_TIMEOUT):
+	"""Check trackers are reachable, all at once.
+
+	UDP trackers are sent a BEP 15 connect request, and HTTP trackers an announce.
+	"""
+
+	async def check_all():
+		return await asyncio.gather(
+			*(
+				_check_tracker(tracker, timeout)
+				for tracker in trackers
+			)
+		)
+
+	loop = asyncio.new_event_loop()
+
+	try:
+		return loop.run_until_complete(check_all())
+	finally:
+		loop.close()
+
+
+def _read_cache(filepath):
+	try:
+		cache = json.loads(filepath.read_text())
+	except (OSError, ValueError):
+		return {}
+
+	return cache if isinstance(cache, dict) else {}
+
+
+def read_tracker_cache(*, filepath=TRACKER_CACHE_PATH, ttl=TRACKER_CHECK_TTL):
+	"""Get whether trackers were reachable, for those checked within ttl seconds."""
+
+	now = time.time()
+
+	return {
+		tracker: bool(check.get('reachable', True))
+		for tracker, check in _read_cache(filepath).items()
+		if (
+			isinstance(check, dict)
+			and now - check.get('checked', 0) < ttl
+		)
+	}
+
+
+def write_tracker_cache(checks, *, filepath=TRACKER_CACHE_PATH, ttl=TRACKER_CHECK_TTL):
+	"""Add tracker checks to the cache, dropping expired ones.
+
+	The file is replaced atomically, as commands may read it at any time.
+	"""
+
+	now = time.time()
+
+	cache = {
+		tracker: check
+		for tracker, check in _read_cache(filepath).items()
+		if (
+			isinstance(check, dict)
+			and now - check.get('checked', 0) < ttl
+		)
+	}
+
+	for check in checks:
+		cache[check.tracker] = {
+			'reachable': check.reachable,
+			'error': check.error,
+			'checked': now,
+		}
+
+	filepath.parent.mkdir(parents=True, exist_ok=True)
+	temp_path = filepath.with_name(f'.{filepath.name}.tmp')
+	temp_path.write_text(json.dumps(cache, indent=2, sort_keys=True))
+	os.replace(temp_path, filepath)
+
+
+def usable_trackers(trackers, cache=None):
+	"""Leave out trackers found unreachable by a check within the TTL.
+
+	All trackers are kept if none are left, so open and random always give trackers.
+	"""
+
+	if cache is None:
+		cache = read_tracker_cache()
+
+	usable = [
+		tracker
+		for tracker in trackers
+		if cache.get(tracker, True)
+	]
+
+	return usable or list(trackers)
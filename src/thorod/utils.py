@@ -1,34 +1,99 @@
+import itertools
+import math
 import os
 import random
 import string
+from collections import namedtuple
 from hashlib import sha1
 
+from tbm_utils import humanize_filesize
+
 from . import bencode
-from .constants import PIECE_SIZE_VALUES
+from .constants import (
+	COPYING_RATE,
+	HASHING_RATE,
+	MAX_TORRENT_SIZE,
+	PIECE_OVERHEAD,
+	PIECE_SIZE_VALUES,
+)
+
+PieceSizeCandidate = namedtuple(
+	'PieceSizeCandidate',
+	[
+		'piece_size',
+		'piece_count',
+		'torrent_size',
+		'cross_file_pieces',
+		'hashing_overhead',
+	]
+)
+
+PieceSizePlan = namedtuple(
+	'PieceSizePlan',
+	[
+		'piece_size',
+		'data_size',
+		'hashing_time',
+		'candidates',
+		'reasons',
+	]
+)
 
 
 def calculate_data_size(files):
 	"""Calculate the total size of the input data."""
 
-	return sum(os.path.getsize(f) for f in files)
-
-
-def calculate_piece_size(data_size, *, threshold=2000):
-	for piece_size in PIECE_SIZE_VALUES:
-		if data_size / piece_size < threshold:
-			break
-
-	return piece_size
+	return sum(f.size for f in files)
 
 
 def calculate_torrent_size(torrent_info):
-	"""Calculate the total size of the files in a torrent."""
+	"""Calculate the total size of the files in a torrent, excluding padding files."""
 
 	files = torrent_info.get('info').get('files') or [
 		torrent_info['info']
 	]
 
-	return sum(f['length'] for f in files)
+	return sum(
+		f['length']
+		for f in files
+		if not is_padding_file(f)
+	)
+
+
+def count_cross_file_pieces(offsets, piece_size):
+	"""Count the pieces containing data from more than one file.
+
+	offsets are the offsets of the boundaries between files.
+	"""
+
+	return len(
+		{
+			offset // piece_size
+			for offset in offsets
+			if offset % piece_size
+		}
+	)
+
+
+def estimate_file_list_size(files, base_path=None):
+	"""Estimate the bencoded size of the file list of a torrent."""
+
+	if base_path is not None:
+		prefix_length = len(str(base_path)) + 1
+
+	size = 0
+	for f in files:
+		if base_path is None:
+			parts = [f.path.name]
+		else:
+			parts = str(f.path)[prefix_length:].split(os.sep)
+
+		# d6:lengthi<length>e4:pathl<parts>ee
+		size += 20 + len(str(f.size))
+		for part in parts:
+			size += len(str(len(part))) + 1 + len(part.encode('utf8', 'surrogateescape'))
+
+	return size
 
 
 def generate_unique_string():
@@ -48,3 +113,113 @@ def get_file_path(filepath, basedir):
 
 def hash_info_dict(info_dict):
 	return sha1(bencode.dumps(info_dict)).hexdigest()
+
+
+def is_relative_file_path(path):
+	"""Check a path is relative and stays within the directory it's relative to."""
+
+	return (
+		bool(path.parts)
+		and not path.is_absolute()
+		and '..' not in path.parts
+	)
+
+
+def is_padding_file(file_info):
+	"""Check if a file in an info dict is a BEP 47 padding file."""
+
+	return 'p' in file_info.get('attr', '')
+
+
+def plan_piece_size(
+	files,
+	*,
+	base_path=None,
+	threshold=2000,
+	max_torrent_size=MAX_TORRENT_SIZE,
+	piece_size=None,
+):
+	"""Choose a piece size, weighing piece count, torrent size, and hashing overhead.
+
+	The smallest piece size giving fewer pieces than threshold is preferred.
+	Larger piece sizes are used if one would keep the torrent file under max_torrent_size when it isn't,
+	or would save more than 1% (and at least a second) of hashing time
+	in per-piece and cross-file piece overhead in the hashers.
+	"""
+
+	data_size = calculate_data_size(files)
+	hashing_time = data_size / HASHING_RATE
+	file_list_size = estimate_file_list_size(files, base_path)
+	offsets = list(itertools.accumulate(f.size for f in files))[:-1]
+
+	candidates = []
+	for size in PIECE_SIZE_VALUES:
+		piece_count = math.ceil(data_size / size)
+		cross_file_pieces = count_cross_file_pieces(offsets, size)
+
+		candidates.append(
+			PieceSizeCandidate(
+				size,
+				piece_count,
+				# Other keys take up a few hundred bytes at most.
+				file_list_size + 20 * piece_count + 300,
+				cross_file_pieces,
+				piece_count * PIECE_OVERHEAD + cross_file_pieces * size / COPYING_RATE,
+			)
+		)
+
+	reasons = []
+
+	if piece_size is not None:
+		reasons.append("Piece size was set manually.")
+
+		return PieceSizePlan(piece_size, data_size, hashing_time, candidates, reasons)
+
+	eligible = [
+		candidate
+		for candidate in candidates
+		if data_size / candidate.piece_size < threshold
+	]
+
+	if eligible:
+		reasons.append(
+			f"{humanize_filesize(eligible[0].piece_size)} is the smallest piece size "
+			f"giving fewer than {threshold} pieces."
+		)
+	else:
+		eligible = candidates[-1:]
+		reasons.append(
+			f"No piece size gives fewer than {threshold} pieces; "
+			"using the largest."
+		)
+
+	for index, candidate in enumerate(eligible):
+		larger = eligible[index + 1:]
+
+		if (
+			candidate.torrent_size > max_torrent_size
+			and any(c.torrent_size <= max_torrent_size for c in larger)
+		):
+			reasons.append(
+				f"{humanize_filesize(candidate.piece_size)} would make the torrent file larger than "
+				f"{humanize_filesize(max_torrent_size)}."
+			)
+		elif (
+			larger
+			and candidate.hashing_overhead - min(c.hashing_overhead for c in larger) > max(hashing_time / 100, 1)
+		):
+			reasons.append(
+				f"{humanize_filesize(candidate.piece_size)} would add more than 1% to hashing time "
+				"in overhead a larger piece size avoids."
+			)
+		else:
+			chosen = candidate
+			break
+
+	if chosen.torrent_size > max_torrent_size:
+		reasons.append(
+			f"No piece size makes the torrent file smaller than {humanize_filesize(max_torrent_size)}; "
+			f"using {humanize_filesize(chosen.piece_size)}."
+		)
+
+	return PieceSizePlan(chosen.piece_size, data_size, hashing_time, candidates, reasons)
@@ -0,0 +1,384 @@
+"""Create torrents for directories dropped into a watched directory."""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tbm_utils import Namespace
+
+from .core import (
+	JobCancelled,
+	create_torrent_info,
+	write_torrent_file,
+)
+from .discovery import discover_files
+from .output import render
+from .stats import add_error
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_WATCH_MASK = (
+	IN_MODIFY
+	| IN_ATTRIB
+	| IN_CLOSE_WRITE
+	| IN_MOVED_FROM
+	| IN_MOVED_TO
+	| IN_CREATE
+	| IN_DELETE
+	| IN_DELETE_SELF
+	| IN_ONLYDIR
+)
+
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+	"""Detect changed subdirectories using Linux inotify."""
+
+	def __init__(self, path):
+		libc_name = ctypes.util.find_library('c')
+		if libc_name is None:
+			raise OSError("Could not find libc.")
+
+		self._libc = ctypes.CDLL(libc_name, use_errno=True)
+
+		if not hasattr(self._libc, 'inotify_init1'):
+			raise OSError("inotify is not supported.")
+
+		self.path = path
+		self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self._fd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno))
+
+		self._watches = {}
+		self._add_watches(path)
+
+		self._initial = True
+
+	def _add_watch(self, dirpath):
+		wd = self._libc.inotify_add_watch(
+			self._fd,
+			os.fsencode(str(dirpath)),
+			IN_WATCH_MASK,
+		)
+
+		if wd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno), str(dirpath))
+
+		self._watches[wd] = dirpath
+
+	def _add_watches(self, dirpath):
+		self._add_watch(dirpath)
+
+		for root, dirnames, _ in os.walk(dirpath):
+			for dirname in dirnames:
+				self._add_watch(Path(root, dirname))
+
+	def _subdir_name(self, path):
+		parts = path.relative_to(self.path).parts
+
+		if parts and (self.path / parts[0]).is_dir():
+			return parts[0]
+
+		return None
+
+	def changes(self, timeout, *, ignore=()):
+		if self._initial:
+			self._initial = False
+
+			return {
+				entry.name
+				for entry in os.scandir(self.path)
+				if entry.is_dir() and entry.name not in ignore
+			}
+
+		changed = set()
+
+		readable, _, _ = select.select([self._fd], [], [], timeout)
+		if not readable:
+			return changed
+
+		try:
+			data = os.read(self._fd, 64 * 1024)
+		except BlockingIOError:
+			return changed
+
+		pos = 0
+		while pos < len(data):
+			wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, pos)
+			pos += INOTIFY_EVENT.size
+			name = data[pos:pos + length].rstrip(b'\0')
+			pos += length
+
+			if mask & IN_Q_OVERFLOW:
+				# Events were lost; treat everything as changed.
+				self._initial = True
+				return self.changes(timeout, ignore=ignore)
+
+			if mask & IN_IGNORED:
+				self._watches.pop(wd, None)
+				continue
+
+			dirpath = self._watches.get(wd)
+			if dirpath is None:
+				continue
+
+			path = dirpath / os.fsdecode(name) if name else dirpath
+
+			if (
+				mask & IN_ISDIR
+				and mask & (IN_CREATE | IN_MOVED_TO)
+			):
+				try:
+					self._add_watches(path)
+				except OSError:
+					# Removed before it could be watched.
+					pass
+
+			subdir_name = self._subdir_name(path)
+			if (
+				subdir_name is not None
+				and subdir_name not in ignore
+			):
+				changed.add(subdir_name)
+
+		return changed
+
+	def close(self):
+		os.close(self._fd)
+
+
+class PollingWatcher:
+	"""Detect changed subdirectories by comparing file counts, sizes, and modification times."""
+
+	def __init__(self, path):
+		self.path = path
+		self._signatures = {}
+		self._initial = True
+
+	def changes(self, timeout, *, ignore=()):
+		if self._initial:
+			self._initial = False
+		else:
+			time.sleep(timeout)
+
+		changed = set()
+		signatures = {}
+
+		for entry in os.scandir(self.path):
+			if (
+				not entry.is_dir()
+				or entry.name in ignore
+			):
+				continue
+
+			count = size = 0
+			modified = entry.stat().st_mtime
+			for f in discover_files(self.path / entry.name):
+				count += 1
+				size += f.size
+				modified = max(modified, f.modified)
+
+			signatures[entry.name] = (count, size, modified)
+
+			if self._signatures.get(entry.name) != signatures[entry.name]:
+				changed.add(entry.name)
+
+		self._signatures = signatures
+
+		return changed
+
+	def close(self):
+		pass
+
+
+class WatchQueue:
+	"""Directories queued for creation, persisted to a JSON file."""
+
+	def __init__(self, filepath):
+		self.filepath = filepath
+		self._lock = threading.Lock()
+
+		try:
+			state = json.loads(filepath.read_text())
+		except FileNotFoundError:
+			state = {}
+
+		self.pending = state.get('pending', [])
+		self.done = state.get('done', {})
+		self.failed = state.get('failed', {})
+
+	def finish(self, name, *, output=None, error=None):
+		with self._lock:
+			if name in self.pending:
+				self.pending.remove(name)
+
+			if error is None:
+				self.done[name] = output
+			else:
+				self.failed[name] = error
+
+			self._save()
+
+	def push(self, name):
+		with self._lock:
+			self.failed.pop(name, None)
+			self.pending.append(name)
+
+			self._save()
+
+	def _save(self):
+		temp_path = self.filepath.with_name(self.filepath.name + '.tmp')
+		temp_path.write_text(
+			json.dumps(
+				{
+					'pending': self.pending,
+					'done': self.done,
+					'failed': self.failed,
+				},
+				indent=2,
+			)
+		)
+		os.replace(temp_path, self.filepath)
+
+
+def default_output_dir(path):
+	"""Get the directory next to a watched directory that torrents are written to by default.
+
+	It's outside the watched directory, so the watcher doesn't see its own files.
+	"""
+
+	return path.with_name(f'{path.name}-torrents')
+
+
+class Watcher:
+	def __init__(self, args):
+		self.args = args
+		self.output_dir = args.output_dir or default_output_dir(args.input)
+		self.output_dir.mkdir(parents=True, exist_ok=True)
+		state = args.state or self.output_dir / '.thorod-watch.json'
+		self.queue = WatchQueue(state)
+		self.running = set()
+
+		# Subdirectories holding the watcher's own files when set inside the watched directory.
+		self.own_subdirs = set()
+		for path in [self.output_dir, state.parent]:
+			try:
+				parts = path.relative_to(args.input).parts
+			except ValueError:
+				continue
+
+			if parts:
+				self.own_subdirs.add(parts[0])
+
+		self._executor = ThreadPoolExecutor(max_workers=args.max_jobs)
+		self._stopping = threading.Event()
+
+	# Hashing progress listener checking for shutdown.
+	def __call__(self, event):
+		if self._stopping.is_set():
+			raise JobCancelled
+
+	def create(self, name, *, resume=False):
+		args = Namespace(self.args)
+		args.input = self.args.input / name
+		args.output = self.output_dir / f'{name}.torrent'
+		args.resume = resume or self.args.resume
+
+		try:
+			# Jobs still queued at shutdown don't start.
+			if self._stopping.is_set():
+				raise JobCancelled
+
+			torrent_info = create_torrent_info(args, on_progress=self)
+			write_torrent_file(args.output, torrent_info)
+		except JobCancelled:
+			# Left pending to be resumed on restart.
+			pass
+		except (Exception, SystemExit) as e:
+			error = str(e.code if isinstance(e, SystemExit) else e).strip()
+			self.queue.finish(name, error=error)
+			add_error()
+			render(f" Failed {name}: {error}", style="bold red")
+		else:
+			self.queue.finish(name, output=str(args.output))
+			render(f" Created {args.output}", style="cyan")
+		finally:
+			self.running.discard(name)
+
+	def submit(self, name, *, resume=False):
+		self.running.add(name)
+		self._executor.submit(self.create, name, resume=resume)
+
+	def run(self):
+		watcher = None
+		if not self.args.polling:
+			try:
+				watcher = InotifyWatcher(self.args.input)
+			except OSError:
+				pass
+
+		if watcher is None:
+			watcher = PollingWatcher(self.args.input)
+			mode = 'polling'
+		else:
+			mode = 'inotify'
+
+		render(f"\n Watching {self.args.input} ({mode})\n", style="bold yellow")
+
+		for name in self.queue.pending:
+			render(f" Resuming {name}", style="yellow")
+			self.submit(name, resume=True)
+
+		last_changes = {}
+
+		try:
+			while True:
+				ignore = set(self.queue.done) | self.running | self.own_subdirs
+				changes = watcher.changes(self.args.interval, ignore=ignore)
+
+				now = time.monotonic()
+				for name in changes:
+					last_changes[name] = now
+
+				for name, changed in list(last_changes.items()):
+					if name in ignore:
+						del last_changes[name]
+					elif now - changed >= self.args.settle:
+						del last_changes[name]
+
+						if (self.args.input / name).is_dir():
+							render(f" Queued {name}", style="yellow")
+							self.queue.push(name)
+							self.submit(name)
+		finally:
+			self._stopping.set()
+			self._executor.shutdown(wait=True)
+			watcher.close()
+
+
+def watch(args):
+	if not args.input.is_dir():
+		raise ValueError(f"'{args.input}' is not a directory.")
+
+	Watcher(args).run()
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Keep the config and tracker cache written on import out of the user's directories.
+_HOME = tempfile.mkdtemp(prefix='thorod-tests-')
+os.environ['XDG_CONFIG_HOME'] = os.path.join(_HOME, 'config')
+os.environ['XDG_CACHE_HOME'] = os.path.join(_HOME, 'cache')
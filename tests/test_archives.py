@@ -0,0 +1,49 @@
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from thorod.archives import open_archive
+
+
+@pytest.fixture
+def tree(tmp_path):
+	root = tmp_path / 'tree'
+	(root / 'sub').mkdir(parents=True)
+	(root / 'a.bin').write_bytes(b'a' * 3000)
+	(root / 'b.bin').write_bytes(b'b' * 1000)
+	os.link(root / 'a.bin', root / 'sub' / 'a_link.bin')
+
+	return root
+
+
+def _read_archive(filepath):
+	with open_archive(filepath, block_size=1024) as (name, sources):
+		return name, {
+			str(source.path): b''.join(source.chunks)
+			for source in sources
+		}
+
+
+def test_tar_hard_links_match_zip(tmp_path, tree):
+	tar_path = tmp_path / 'tree.tar'
+	with tarfile.open(tar_path, 'w') as archive:
+		archive.add(tree, arcname='tree')
+
+	with tarfile.open(tar_path) as archive:
+		assert any(info.islnk() for info in archive.getmembers())
+
+	zip_path = tmp_path / 'tree.zip'
+	with zipfile.ZipFile(zip_path, 'w') as archive:
+		for dirpath, _, filenames in os.walk(tree):
+			for filename in filenames:
+				filepath = os.path.join(dirpath, filename)
+				archive.write(filepath, os.path.relpath(filepath, tree.parent))
+
+	tar_name, tar_files = _read_archive(tar_path)
+	zip_name, zip_files = _read_archive(zip_path)
+
+	assert tar_name == zip_name == 'tree'
+	assert tar_files == zip_files
+	assert tar_files['sub/a_link.bin'] == b'a' * 3000
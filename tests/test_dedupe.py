@@ -0,0 +1,34 @@
+import os
+
+from thorod.dedupe import SAMPLE_SIZE, find_duplicates
+from thorod.discovery import discover_files
+
+SIZE = 16 * SAMPLE_SIZE
+
+
+def _files(root):
+	return sorted(discover_files(root), key=lambda f: f.path.name)
+
+
+def test_same_size_differing_in_middle(tmp_path):
+	data = os.urandom(SIZE)
+	changed = bytearray(data)
+	# Between the first and second sampled positions.
+	changed[SIZE // 6] ^= 0xff
+
+	(tmp_path / 'a.bin').write_bytes(data)
+	(tmp_path / 'b.bin').write_bytes(bytes(changed))
+
+	assert find_duplicates(_files(tmp_path), by_content=True) == {}
+
+
+def test_same_content(tmp_path):
+	data = os.urandom(SIZE)
+
+	(tmp_path / 'a.bin').write_bytes(data)
+	(tmp_path / 'b.bin').write_bytes(data)
+	(tmp_path / 'c.bin').write_bytes(os.urandom(SIZE))
+	os.link(tmp_path / 'b.bin', tmp_path / 'd.bin')
+
+	assert find_duplicates(_files(tmp_path)) == {3: 1}
+	assert find_duplicates(_files(tmp_path), by_content=True) == {1: 0, 3: 0}
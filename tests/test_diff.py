@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from thorod import create_torrent
+from thorod.diff import diff_torrents
+from thorod.output import generate_diff_outputs
+
+PIECE_SIZE = 16 * 1024
+
+
+@pytest.fixture
+def trees(tmp_path):
+	old = tmp_path / 'old' / 'data'
+	new = tmp_path / 'new' / 'data'
+
+	for root in [old, new]:
+		(root / 'e').mkdir(parents=True)
+
+	files = {
+		'a.bin': os.urandom(5 * PIECE_SIZE + 100),
+		'b.bin': os.urandom(3 * PIECE_SIZE + 200),
+		'e/f.bin': os.urandom(4 * PIECE_SIZE + 300),
+	}
+
+	for name, data in files.items():
+		(old / name).write_bytes(data)
+		(new / name).write_bytes(data)
+
+	return old, new
+
+
+def _info(path):
+	return create_torrent(path, piece_size=PIECE_SIZE)['info']
+
+
+def test_identical(trees):
+	old, _ = trees
+	diff = diff_torrents(_info(old), _info(old))
+
+	assert len(diff.unchanged_files) == 3
+	assert not diff.unverified_files
+	assert diff.reusable_bytes == diff.total_bytes
+	assert diff.unverified_bytes == 0
+
+
+def test_unverified_files_not_reusable(trees):
+	old, new = trees
+	(new / 'a.bin').unlink()
+	f_bin = new / 'e' / 'f.bin'
+	data = bytearray(f_bin.read_bytes())
+	data[2 * PIECE_SIZE] ^= 0xff
+	f_bin.write_bytes(bytes(data))
+
+	diff = diff_torrents(_info(old), _info(new))
+
+	assert diff.removed_files == [('a.bin',)]
+	assert ('e', 'f.bin') not in diff.unchanged_files
+	assert diff.reusable_bytes == sum(
+		new.joinpath(*path).stat().st_size
+		for path in diff.unchanged_files
+	)
+	assert diff.unverified_bytes == sum(
+		new.joinpath(*path).stat().st_size
+		for path in diff.unverified_files
+	)
+	assert diff.reusable_bytes < diff.total_bytes
+
+
+def test_aligned_change_detected(tmp_path, trees):
+	old, new = trees
+	f_bin = new / 'e' / 'f.bin'
+	data = bytearray(f_bin.read_bytes())
+	data[2 * PIECE_SIZE] ^= 0xff
+	f_bin.write_bytes(bytes(data))
+
+	diff = diff_torrents(
+		create_torrent(old, piece_size=PIECE_SIZE, align=True)['info'],
+		create_torrent(new, piece_size=PIECE_SIZE, align=True)['info'],
+	)
+
+	assert diff.changed_files == [('e', 'f.bin')]
+	assert diff.reusable_bytes == diff.total_bytes - f_bin.stat().st_size
+	assert diff.unverified_bytes == 0
+
+
+def test_undecodable_paths():
+	info = {
+		'name': 'data',
+		'piece length': PIECE_SIZE,
+		'pieces': os.urandom(40),
+		'files': [
+			{'length': PIECE_SIZE, 'path': [b'\xff\xfe']},
+			{'length': PIECE_SIZE, 'path': ['a.bin']},
+		],
+	}
+
+	new_info = {
+		**info,
+		'files': [
+			*info['files'],
+			{'length': 1, 'path': [b'\xff\xfd']},
+		],
+	}
+
+	diff = diff_torrents(info, new_info)
+
+	assert diff.unchanged_files == [('a.bin',), (b'\xff\xfe',)]
+	assert diff.added_files == [(b'\xff\xfd',)]
+	assert diff.reusable_bytes == 2 * PIECE_SIZE
+
+	generate_diff_outputs(diff, show_files=True)
+
+
+def test_moved_empty_file_unchanged(trees):
+	old, new = trees
+	(old / 'b.bin').write_bytes(b'')
+	(new / 'b.bin').write_bytes(b'')
+	(new / 'a.bin').write_bytes(os.urandom(PIECE_SIZE + 1))
+
+	diff = diff_torrents(_info(old), _info(new))
+
+	assert diff.changed_files == [('a.bin',)]
+	assert diff.unchanged_files == [('b.bin',)]
+	assert diff.unverified_files == [('e', 'f.bin')]
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from thorod import discovery
+from thorod.discovery import discover_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+	root = tmp_path / 'symd'
+	(root / 'real').mkdir(parents=True)
+	(root / 'locked').mkdir()
+	(root / 'real' / 'x').write_bytes(b'x')
+	(root / 'locked' / 'y').write_bytes(b'y')
+	os.symlink(root / 'real', root / 'link')
+
+	return root
+
+
+@pytest.mark.parametrize('threads', [None, 4])
+def test_directory_symlinks_not_followed(tree, threads):
+	paths = [
+		f.path.relative_to(tree).as_posix()
+		for f in discover_files(tree, threads=threads)
+	]
+
+	assert 'link/x' not in paths
+	assert 'real/x' in paths
+
+
+@pytest.mark.parametrize('threads', [None, 4])
+def test_unreadable_directories_skipped(tree, threads, monkeypatch):
+	scandir = os.scandir
+
+	def _scandir(path):
+		if os.path.basename(path) == 'locked':
+			raise PermissionError(13, "Permission denied", str(path))
+
+		return scandir(path)
+
+	monkeypatch.setattr(discovery.os, 'scandir', _scandir)
+
+	paths = [
+		f.path.relative_to(tree).as_posix()
+		for f in discover_files(tree, threads=threads)
+	]
+
+	assert paths == ['real/x']
@@ -0,0 +1,269 @@
+import os
+from hashlib import md5, sha1
+
+import pytest
+
+from thorod import hashing
+from thorod.dedupe import find_duplicates
+from thorod.discovery import discover_files
+from thorod.hashing import IO_MODES, hash_pieces
+
+PIECE_SIZE = 16 * 1024
+
+
+class Interrupted(Exception):
+	pass
+
+
+def _files(root):
+	return sorted(discover_files(root), key=lambda f: f.path.name)
+
+
+def _expected_pieces(data, piece_size=PIECE_SIZE):
+	return b''.join(
+		sha1(data[start:start + piece_size]).digest()
+		for start in range(0, len(data), piece_size)
+	)
+
+
+def _aligned(datas, piece_size=PIECE_SIZE):
+	return b''.join(
+		data + bytes(-len(data) % piece_size)
+		for data in datas[:-1]
+	) + datas[-1]
+
+
+def _write_files(root, sizes):
+	datas = []
+
+	for i, size in enumerate(sizes):
+		data = os.urandom(size)
+		(root / f'{i:03}.bin').write_bytes(data)
+		datas.append(data)
+
+	return datas
+
+
+def _small_files(root, count=64):
+	data = b''
+
+	for i in range(count):
+		chunk = os.urandom(1000 + i)
+		(root / f'{i:03}.bin').write_bytes(chunk)
+		data += chunk
+
+	return data
+
+
+def _count_read_ahead(monkeypatch):
+	read_ahead = []
+	read_small_file = hashing.read_small_file
+
+	def record(filepath, size, buffer=None):
+		if buffer is None:
+			read_ahead.append(filepath)
+
+		return read_small_file(filepath, size, buffer)
+
+	monkeypatch.setattr(hashing, 'read_small_file', record)
+
+	return read_ahead
+
+
+def test_small_files_read_ahead(tmp_path, monkeypatch):
+	data = _small_files(tmp_path)
+	read_ahead = _count_read_ahead(monkeypatch)
+
+	pieces, _, _ = hash_pieces(
+		_files(tmp_path),
+		PIECE_SIZE,
+		block_size=PIECE_SIZE,
+		device_workers={None: 4},
+	)
+
+	assert bytes(pieces) == _expected_pieces(data)
+	assert read_ahead
+
+
+def test_small_files_not_read_ahead_past_max_memory(tmp_path, monkeypatch):
+	data = _small_files(tmp_path)
+	read_ahead = _count_read_ahead(monkeypatch)
+
+	pieces, _, _ = hash_pieces(
+		_files(tmp_path),
+		PIECE_SIZE,
+		block_size=PIECE_SIZE,
+		max_memory=PIECE_SIZE,
+		device_workers={None: 4},
+	)
+
+	assert bytes(pieces) == _expected_pieces(data)
+	assert not read_ahead
+
+
+@pytest.mark.parametrize('io_mode', IO_MODES)
+def test_io_modes(tmp_path, io_mode):
+	datas = _write_files(tmp_path, [5 * PIECE_SIZE + 100, 100 * 1024, 7, 3 * PIECE_SIZE])
+
+	pieces, lengths, md5sums = hash_pieces(
+		_files(tmp_path),
+		PIECE_SIZE,
+		include_md5=True,
+		io_mode=io_mode,
+		block_size=8192,
+	)
+
+	assert bytes(pieces) == _expected_pieces(b''.join(datas))
+	assert lengths == [len(data) for data in datas]
+	assert md5sums == [md5(data).hexdigest() for data in datas]
+
+
+@pytest.mark.parametrize('align', [False, True])
+def test_sparse_file(tmp_path, align):
+	(tmp_path / '000.bin').write_bytes(os.urandom(PIECE_SIZE + 100))
+
+	sparse_size = 64 * PIECE_SIZE + 300
+	with open(tmp_path / '001.bin', 'wb') as f:
+		f.truncate(sparse_size)
+		f.seek(20 * PIECE_SIZE + 50)
+		f.write(os.urandom(PIECE_SIZE))
+
+	(tmp_path / '002.bin').write_bytes(os.urandom(200))
+
+	datas = [(tmp_path / f'{i:03}.bin').read_bytes() for i in range(3)]
+	expected = _aligned(datas) if align else b''.join(datas)
+
+	pieces, lengths, _ = hash_pieces(_files(tmp_path), PIECE_SIZE, align=align)
+
+	assert bytes(pieces) == _expected_pieces(expected)
+	assert lengths == [len(data) for data in datas]
+
+
+def test_align(tmp_path):
+	datas = _write_files(tmp_path, [PIECE_SIZE + 1, PIECE_SIZE, 0, 3, 2 * PIECE_SIZE + 5])
+
+	pieces, lengths, _ = hash_pieces(_files(tmp_path), PIECE_SIZE, align=True)
+
+	assert bytes(pieces) == _expected_pieces(_aligned(datas))
+	assert lengths == [len(data) for data in datas]
+
+
+@pytest.mark.parametrize('align', [False, True])
+def test_duplicates_and_hardlinks(tmp_path, monkeypatch, align):
+	data = os.urandom(5 * PIECE_SIZE + 100)
+	# The last file isn't padded, so its last piece differs from the duplicates'.
+	datas = [data, os.urandom(PIECE_SIZE + 7), data, data, os.urandom(10)]
+
+	for i, d in enumerate(datas):
+		if i != 3:
+			(tmp_path / f'{i:03}.bin').write_bytes(d)
+	os.link(tmp_path / '002.bin', tmp_path / '003.bin')
+
+	files = _files(tmp_path)
+	# The hardlink maps to a duplicate, not its original, and comes first.
+	duplicates = {**find_duplicates(files), 2: 0}
+
+	read_paths = []
+	read_file = hashing.read_file
+
+	def record(filepath, *args, **kwargs):
+		read_paths.append(filepath.name)
+
+		return read_file(filepath, *args, **kwargs)
+
+	monkeypatch.setattr(hashing, 'read_file', record)
+
+	pieces, lengths, md5sums = hash_pieces(
+		files,
+		PIECE_SIZE,
+		include_md5=True,
+		align=align,
+		duplicates=duplicates,
+	)
+
+	assert duplicates == {2: 0, 3: 2}
+	assert bytes(pieces) == _expected_pieces(_aligned(datas) if align else b''.join(datas))
+	assert lengths == [len(d) for d in datas]
+	assert md5sums == [md5(d).hexdigest() for d in datas]
+
+	if align:
+		assert '002.bin' not in read_paths
+		assert '003.bin' not in read_paths
+
+
+def test_device_runs(tmp_path):
+	datas = _write_files(tmp_path, [3 * PIECE_SIZE + 100, 2 * PIECE_SIZE + 7, 500, 4 * PIECE_SIZE + 1])
+	files = [
+		f._replace(dev=i % 2)
+		for i, f in enumerate(_files(tmp_path))
+	]
+
+	pieces, _, _ = hash_pieces(files, PIECE_SIZE, device_workers={None: 2})
+
+	assert bytes(pieces) == _expected_pieces(b''.join(datas))
+
+
+@pytest.mark.parametrize('align', [False, True])
+def test_resume(tmp_path, align):
+	root = tmp_path / 'data'
+	root.mkdir()
+	datas = _write_files(root, [5 * PIECE_SIZE + 100, 200, 7 * PIECE_SIZE + 3])
+	files = _files(root)
+	checkpoint = tmp_path / 'checkpoint.json'
+	events = []
+
+	def interrupt(event):
+		events.append(event)
+
+		if event.completed_bytes > 6 * PIECE_SIZE:
+			raise Interrupted
+
+	with pytest.raises(Interrupted):
+		hash_pieces(
+			files,
+			PIECE_SIZE,
+			block_size=4096,
+			align=align,
+			checkpoint=checkpoint,
+			on_progress=interrupt,
+			progress_interval=0,
+		)
+
+	assert checkpoint.exists()
+
+	events.clear()
+	pieces, lengths, _ = hash_pieces(
+		files,
+		PIECE_SIZE,
+		block_size=4096,
+		align=align,
+		checkpoint=checkpoint,
+		resume=True,
+		on_progress=events.append,
+		progress_interval=0,
+	)
+
+	assert bytes(pieces) == _expected_pieces(_aligned(datas) if align else b''.join(datas))
+	assert lengths == [len(data) for data in datas]
+	assert events[0].completed_bytes > 5 * PIECE_SIZE
+	assert not checkpoint.exists()
+
+
+def test_resume_different_files(tmp_path):
+	root = tmp_path / 'data'
+	root.mkdir()
+	_write_files(root, [3 * PIECE_SIZE])
+	checkpoint = tmp_path / 'checkpoint.json'
+
+	with pytest.raises(Interrupted):
+		hash_pieces(
+			_files(root),
+			PIECE_SIZE,
+			block_size=4096,
+			checkpoint=checkpoint,
+			on_progress=lambda event: (_ for _ in ()).throw(Interrupted),
+			progress_interval=0,
+		)
+
+	with pytest.raises(ValueError, match="doesn't match"):
+		hash_pieces(_files(root), 2 * PIECE_SIZE, checkpoint=checkpoint, resume=True)
@@ -0,0 +1,51 @@
+from pathlib import PurePath
+
+from thorod.constants import KIB, MIB
+from thorod.discovery import FileEntry
+from thorod.utils import plan_piece_size
+
+
+def _files(count, size):
+	return [
+		FileEntry(PurePath('data', f'{i:06}.bin'), size, 0, 0, 0, i, size)
+		for i in range(count)
+	]
+
+
+def test_many_small_files():
+	plan = plan_piece_size(_files(50000, 1 * MIB), base_path=PurePath('data'))
+
+	assert plan.piece_size == 32 * MIB
+
+
+def test_many_files():
+	plan = plan_piece_size(_files(5000, 10 * MIB), base_path=PurePath('data'))
+
+	assert plan.piece_size == 32 * MIB
+
+
+def test_many_tiny_files():
+	plan = plan_piece_size(_files(100000, 1 * KIB), base_path=PurePath('data'))
+
+	assert plan.piece_size == 64 * KIB
+
+
+def test_larger_piece_size_for_torrent_size():
+	plan = plan_piece_size(
+		_files(10, 100 * MIB),
+		base_path=PurePath('data'),
+		max_torrent_size=20 * KIB,
+	)
+
+	assert plan.piece_size == 2 * MIB
+
+
+def test_file_list_over_torrent_size():
+	plan = plan_piece_size(
+		_files(50000, 1 * MIB),
+		base_path=PurePath('data'),
+		max_torrent_size=100 * KIB,
+	)
+
+	assert plan.piece_size == 32 * MIB
+	assert "No piece size makes the torrent file smaller" in plan.reasons[-1]
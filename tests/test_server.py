@@ -0,0 +1,113 @@
+import http.client
+import json
+import sys
+import threading
+
+import pytest
+
+from thorod.server import JobManager, RequestHandler, ThreadingHTTPServer
+
+
+@pytest.fixture
+def manager():
+	manager = JobManager(max_jobs=1)
+	yield manager
+	manager.shutdown()
+
+
+def test_parse_error(manager):
+	with pytest.raises(ValueError, match="required: TORRENT"):
+		manager.parse(['info'])
+
+
+def test_parse_help_and_version(manager):
+	with pytest.raises(ValueError, match="thorod info"):
+		manager.parse(['info', '-h'])
+
+	with pytest.raises(ValueError, match=r"^thorod \d"):
+		manager.parse(['info', '-V'])
+
+
+def test_parse_leaves_streams_alone(manager):
+	stdout = sys.stdout
+	stderr = sys.stderr
+	swapped = []
+	parsing = threading.Event()
+	done = threading.Event()
+
+	def watch_streams():
+		parsing.set()
+
+		while not done.is_set():
+			if (
+				sys.stdout is not stdout
+				or sys.stderr is not stderr
+			):
+				swapped.append(True)
+
+	thread = threading.Thread(target=watch_streams)
+	thread.start()
+	parsing.wait()
+
+	try:
+		for _ in range(200):
+			with pytest.raises(ValueError):
+				manager.parse(['info', '--nope'])
+	finally:
+		done.set()
+		thread.join()
+
+	assert not swapped
+
+
+@pytest.fixture
+def server(manager):
+	httpd = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+	httpd.manager = manager
+	thread = threading.Thread(target=httpd.serve_forever)
+	thread.start()
+
+	yield httpd
+
+	httpd.shutdown()
+	httpd.server_close()
+	thread.join()
+
+
+def _post(server, body, headers):
+	connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+
+	try:
+		connection.request('POST', '/jobs', body=body, headers=headers)
+		response = connection.getresponse()
+
+		return response.status, json.loads(response.read())
+	finally:
+		connection.close()
+
+
+def test_post_requires_json(server):
+	body = json.dumps({'argv': ['info']})
+
+	status, response = _post(server, body, {'Content-Type': 'text/plain'})
+
+	assert status == 415
+	assert "application/json" in response['error']
+
+	status, response = _post(server, body, {'Content-Type': 'application/json; charset=utf-8'})
+
+	assert status == 400
+	assert "required: TORRENT" in response['error']
+
+
+def test_post_requires_host(server):
+	body = json.dumps({'argv': ['info']})
+	headers = {'Content-Type': 'application/json'}
+
+	status, _ = _post(server, body, {**headers, 'Host': f'attacker.example:{server.server_port}'})
+
+	assert status == 403
+
+	status, _ = _post(server, body, {**headers, 'Host': f'localhost:{server.server_port}'})
+
+	assert status == 400
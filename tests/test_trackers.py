@@ -0,0 +1,160 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from thorod import cli
+from thorod.trackers import (
+	UDP_CONNECT,
+	UDP_CONNECT_RESPONSE,
+	UDP_PROTOCOL_ID,
+	TrackerCheck,
+	check_trackers,
+	read_tracker_cache,
+	usable_trackers,
+	write_tracker_cache,
+)
+
+
+@pytest.fixture
+def udp_tracker():
+	"""A stand-in UDP tracker answering BEP 15 connect requests."""
+
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.bind(('127.0.0.1', 0))
+	sock.settimeout(0.1)
+	stopping = threading.Event()
+
+	def serve():
+		while not stopping.is_set():
+			try:
+				data, addr = sock.recvfrom(2048)
+			except socket.timeout:
+				continue
+
+			protocol_id, action, transaction_id = UDP_CONNECT.unpack_from(data)
+
+			if (
+				protocol_id == UDP_PROTOCOL_ID
+				and action == 0
+			):
+				sock.sendto(UDP_CONNECT_RESPONSE.pack(0, transaction_id, 1234), addr)
+
+	thread = threading.Thread(target=serve)
+	thread.start()
+
+	yield f'udp://127.0.0.1:{sock.getsockname()[1]}/announce'
+
+	stopping.set()
+	thread.join()
+	sock.close()
+
+
+@pytest.fixture
+def silent_udp_tracker():
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	sock.bind(('127.0.0.1', 0))
+
+	yield f'udp://127.0.0.1:{sock.getsockname()[1]}/announce'
+
+	sock.close()
+
+
+@pytest.fixture
+def http_server():
+	"""A stand-in HTTP tracker at /announce, and a web page anywhere else."""
+
+	class Handler(BaseHTTPRequestHandler):
+		def do_GET(self):
+			if (
+				self.path.startswith('/announce?')
+				and 'info_hash=' in self.path
+			):
+				body = b'd14:failure reason17:unregistered hashe'
+			else:
+				body = b'<html></html>'
+
+			self.send_response(200)
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, *args):
+			pass
+
+	server = HTTPServer(('127.0.0.1', 0), Handler)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.start()
+
+	yield f'http://127.0.0.1:{server.server_port}'
+
+	server.shutdown()
+	server.server_close()
+	thread.join()
+
+
+def test_check_trackers(udp_tracker, silent_udp_tracker, http_server):
+	checks = check_trackers(
+		[
+			udp_tracker,
+			silent_udp_tracker,
+			f'{http_server}/announce',
+			f'{http_server}/page',
+			'wss://127.0.0.1/announce',
+		],
+		timeout=0.5,
+	)
+	results = {check.tracker: check for check in checks}
+
+	assert results[udp_tracker].reachable
+	assert results[f'{http_server}/announce'].reachable
+
+	assert not results[silent_udp_tracker].reachable
+	assert results[silent_udp_tracker].error == "Timed out."
+
+	assert not results[f'{http_server}/page'].reachable
+	assert "Not a tracker response" in results[f'{http_server}/page'].error
+
+	assert not results['wss://127.0.0.1/announce'].reachable
+	assert "aren't supported" in results['wss://127.0.0.1/announce'].error
+
+
+def test_tracker_cache(tmp_path):
+	filepath = tmp_path / 'trackers.json'
+	write_tracker_cache(
+		[
+			TrackerCheck('udp://a:1', True, 0.1, None),
+			TrackerCheck('udp://b:1', False, None, "Timed out."),
+		],
+		filepath=filepath,
+	)
+
+	assert read_tracker_cache(filepath=filepath) == {'udp://a:1': True, 'udp://b:1': False}
+	assert read_tracker_cache(filepath=filepath, ttl=0) == {}
+
+
+def test_usable_trackers():
+	trackers = ['udp://a:1', 'udp://b:1', 'udp://c:1']
+
+	assert usable_trackers(trackers, {'udp://b:1': False}) == ['udp://a:1', 'udp://c:1']
+	assert usable_trackers(trackers, dict.fromkeys(trackers, False)) == trackers
+
+
+@pytest.fixture
+def default_trackers(monkeypatch):
+	trackers = ['udp://a:1', 'udp://b:1', 'udp://c:1']
+	monkeypatch.setattr(cli, 'DEFAULT_TRACKERS', trackers)
+	monkeypatch.setattr(cli, 'usable_trackers', lambda trackers: usable_trackers(trackers, {'udp://b:1': False}))
+
+	return trackers
+
+
+def test_open_skips_unreachable(default_trackers):
+	assert cli.replace_abbreviations(['open']) == [['udp://a:1'], ['udp://c:1']]
+
+
+def test_random_skips_unreachable(default_trackers):
+	for _ in range(20):
+		announce_list = cli.replace_abbreviations(['random^random^random'])
+
+		assert sorted(announce_list[0]) == ['udp://a:1', 'udp://c:1']
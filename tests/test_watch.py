@@ -0,0 +1,84 @@
+import json
+import time
+
+import pytest
+from tbm_utils import parse_args
+
+from thorod import watch
+from thorod.cli import process_args, thorod
+from thorod.watch import PollingWatcher, Watcher
+
+
+@pytest.fixture
+def watched(tmp_path):
+	path = tmp_path / 'drop'
+	(path / 'a').mkdir(parents=True)
+	(path / 'a' / 'x.bin').write_bytes(b'x' * 1000)
+
+	return path
+
+
+@pytest.fixture
+def created(monkeypatch):
+	calls = []
+
+	def create_torrent_info(args, *, on_progress=None):
+		calls.append(args)
+
+		return {'info': {}}
+
+	monkeypatch.setattr(watch, 'create_torrent_info', create_torrent_info)
+	monkeypatch.setattr(watch, 'write_torrent_file', lambda filepath, torrent_info: filepath.touch())
+
+	return calls
+
+
+def _args(*argv):
+	return process_args(parse_args(thorod, ['watch', *argv, '--polling']))
+
+
+def test_default_files_outside_watched_dir(watched):
+	watcher = Watcher(_args(str(watched)))
+
+	assert watcher.output_dir == watched.parent / 'drop-torrents'
+	assert watcher.queue.filepath.parent == watcher.output_dir
+	assert not watcher.own_subdirs
+
+
+def test_own_subdirs_ignored(watched):
+	watcher = Watcher(_args(str(watched), '--output-dir', str(watched / 'torrents')))
+
+	assert watcher.own_subdirs == {'torrents'}
+
+
+def test_pending_resumed_with_checkpoint(watched, created, monkeypatch):
+	args = _args(str(watched))
+	state = watched.parent / 'drop-torrents' / '.thorod-watch.json'
+	state.parent.mkdir()
+	state.write_text(json.dumps({'pending': ['a']}))
+
+	def changes(self, timeout, *, ignore=()):
+		deadline = time.monotonic() + 5
+		while created == [] and time.monotonic() < deadline:
+			time.sleep(0.01)
+
+		raise KeyboardInterrupt
+
+	monkeypatch.setattr(PollingWatcher, 'changes', changes)
+
+	with pytest.raises(KeyboardInterrupt):
+		Watcher(args).run()
+
+	assert [call.resume for call in created] == [True]
+	assert json.loads(state.read_text())['pending'] == []
+
+
+def test_queued_jobs_cancelled_at_shutdown(watched, created):
+	watcher = Watcher(_args(str(watched)))
+	watcher.queue.push('a')
+	watcher._stopping.set()
+
+	watcher.create('a')
+
+	assert created == []
+	assert watcher.queue.pending == ['a']
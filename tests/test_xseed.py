@@ -0,0 +1,94 @@
+import pytest
+from tbm_utils import parse_args
+
+from thorod import bencode, create_torrent
+from thorod.cli import process_args, thorod
+from thorod.commands import do_xseed
+from thorod.core import xseed_torrents
+
+
+@pytest.fixture
+def torrent(tmp_path):
+	data = tmp_path / 'data'
+	data.mkdir()
+	(data / 'a.bin').write_bytes(b'a' * 1000)
+	(data / 'b.bin').write_bytes(b'b' * 2000)
+
+	filepath = tmp_path / 'data.torrent'
+	create_torrent(data, output=filepath)
+
+	return filepath
+
+
+@pytest.mark.parametrize('splice', [False, True])
+def test_profile_nested_tiers(tmp_path, torrent, splice):
+	profile = tmp_path / 'profile.toml'
+	output = tmp_path / 'out.torrent'
+	profile.write_text(
+		'[[targets]]\n'
+		'trackers = [["udp://x:1/announce", "udp://y:1/announce"], "udp://z:1/announce"]\n'
+		f'output = "{output}"\n'
+	)
+
+	argv = ['xseed', str(torrent), '--profile', str(profile)]
+	if splice:
+		argv.append('--splice')
+
+	do_xseed(process_args(parse_args(thorod, argv)))
+
+	torrent_info = bencode.loads(output.read_bytes())
+
+	assert torrent_info['announce'] == 'udp://x:1/announce'
+	assert torrent_info['announce-list'] == [
+		['udp://x:1/announce', 'udp://y:1/announce'],
+		['udp://z:1/announce'],
+	]
+
+
+def test_profile_flat_tiers(tmp_path, torrent):
+	profile = tmp_path / 'profile.toml'
+	output = tmp_path / 'out.torrent'
+	profile.write_text(
+		'[[targets]]\n'
+		'trackers = ["udp://x:1/announce^udp://y:1/announce", "udp://z:1/announce"]\n'
+		f'output = "{output}"\n'
+	)
+
+	do_xseed(process_args(parse_args(thorod, ['xseed', str(torrent), '--profile', str(profile)])))
+
+	assert bencode.loads(output.read_bytes())['announce-list'] == [
+		['udp://x:1/announce', 'udp://y:1/announce'],
+		['udp://z:1/announce'],
+	]
+
+
+@pytest.mark.parametrize('splice', [False, True])
+def test_directory_skips_bad_torrents(tmp_path, torrent, splice):
+	torrents = tmp_path / 'torrents'
+	torrents.mkdir()
+	torrent.rename(torrents / 'b.torrent')
+	(torrents / 'a.torrent').write_bytes(b'garbage')
+	(torrents / 'c.torrent').write_bytes(b'd4:infoi1ee')
+
+	argv = ['xseed', str(torrents), 'udp://x:1/announce']
+	if splice:
+		argv.append('--splice')
+
+	args = process_args(parse_args(thorod, argv))
+	skipped = []
+	written = list(xseed_torrents(args, skipped=skipped))
+
+	assert [filepath.name for filepath, _, _ in written] == ['b.torrent']
+	assert sorted(output.name for output in args.output.iterdir()) == ['b.torrent']
+	assert [filepath.name for filepath, _ in skipped] == ['a.torrent', 'c.torrent']
+	assert all(str(filepath) in error for filepath, error in skipped)
+
+
+def test_single_torrent_error(tmp_path):
+	filepath = tmp_path / 'bad.torrent'
+	filepath.write_bytes(b'd4:infoi1ee')
+
+	args = process_args(parse_args(thorod, ['xseed', str(filepath), 'udp://x:1/announce']))
+
+	with pytest.raises(ValueError, match="bad.torrent is not a valid torrent file"):
+		list(xseed_torrents(args))